@@ -1,14 +1,27 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from contextlib import asynccontextmanager
 import logging
-from models import ExtractRequest, ExtractResponse, ExtractData
+from models import ExtractRequest, ExtractResponse, BatchExtractRequest, BatchJobResponse
 from config import config, Config
-from services.document_processor import DocumentProcessor
 from services.ocr_service import OCRService
-from services.extraction_service import ExtractionService
-from services.reconciliation_service import ReconciliationService
+from services.ocr_backends import create_ocr_backend
+from services.ocr_scheduler import OCRScheduler
+from services.page_pipeline import PagePipeline
+from services.document_pipeline import DocumentPipeline
+from services.batch_service import BatchJobManager, BatchQueueFullError
+from services.http_client import HTTPClient
+from services.cpu_pool import CPUPool
+from services.result_cache import ResultCache
+from services.page_cache import PageCache
+from services.page_tiler import PageTiler
+from services.content_crop import ContentCropper
+from services.document_body import DocumentTooLargeError, UnsupportedDocumentError
+from services.document_processor import DocumentProcessor, ImageEncoding
+from services.upload_reader import UploadReader
+from services import metrics
 
 # Configure logging
 logging.basicConfig(
@@ -17,11 +30,25 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start batch workers and the CPU pool; release shared resources on shutdown"""
+    CPUPool.start()
+    if batch_manager is not None:
+        batch_manager.start()
+    yield
+    if batch_manager is not None:
+        await batch_manager.stop()
+    await HTTPClient.close()
+    CPUPool.shutdown()
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title=config.API_TITLE,
     version=config.API_VERSION,
-    description=config.API_DESCRIPTION
+    description=config.API_DESCRIPTION,
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -33,14 +60,85 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Initialize result cache
+result_cache = ResultCache(
+    max_entries=config.RESULT_CACHE_MAX_ENTRIES,
+    ttl_seconds=config.RESULT_CACHE_TTL,
+    disk_dir=config.RESULT_CACHE_DIR or None,
+    disk_max_bytes=config.RESULT_CACHE_MAX_DISK_BYTES
+) if config.RESULT_CACHE_ENABLED else None
+
 # Initialize services
 try:
     Config.validate()
-    ocr_service = OCRService(api_key=config.GEMINI_API_KEY, model_name=config.GEMINI_MODEL)
+    ocr_scheduler = OCRScheduler(
+        requests_per_minute=config.OCR_RPM_LIMIT,
+        tokens_per_minute=config.OCR_TPM_LIMIT,
+        min_concurrency=config.OCR_MIN_CONCURRENCY,
+        max_concurrency=config.OCR_MAX_CONCURRENCY,
+        initial_concurrency=config.OCR_INITIAL_CONCURRENCY,
+        target_latency=config.OCR_TARGET_LATENCY,
+        max_retries=config.OCR_MAX_RETRIES,
+        retry_base_delay=config.OCR_RETRY_BASE_DELAY,
+        retry_max_delay=config.OCR_RETRY_MAX_DELAY,
+        call_deadline=config.OCR_CALL_DEADLINE,
+        expected_output_tokens=config.OCR_EXPECTED_OUTPUT_TOKENS
+    ) if config.OCR_SCHEDULER_ENABLED else None
+    ocr_service = OCRService(
+        backend=create_ocr_backend(config.GEMINI_MODEL),
+        scheduler=ocr_scheduler,
+        output_format=config.OCR_OUTPUT_FORMAT
+    )
+    page_cache = PageCache(
+        max_entries=config.PAGE_CACHE_MAX_ENTRIES,
+        hash_mode=config.PAGE_CACHE_HASH
+    ) if config.PAGE_CACHE_ENABLED else None
+    # Stronger models re-run only the pages whose totals don't reconcile
+    cascade_services = [
+        OCRService(
+            backend=create_ocr_backend(model_name),
+            scheduler=ocr_scheduler,
+            output_format=config.OCR_OUTPUT_FORMAT
+        )
+        for model_name in config.OCR_CASCADE_MODELS
+    ]
+    page_tiler = PageTiler(
+        max_aspect=config.TILE_MAX_ASPECT,
+        max_lines=config.TILE_MAX_LINES,
+        overlap=config.TILE_OVERLAP,
+        max_bands=config.TILE_MAX_BANDS
+    ) if config.TILE_ENABLED else None
+    content_cropper = ContentCropper(
+        padding=config.CROP_PADDING,
+        min_saving=config.CROP_MIN_SAVING,
+        table_only=config.CROP_TABLE_ONLY,
+        encoding=ImageEncoding.from_config(),
+        measure_bytes=config.CROP_MEASURE_BYTES
+    ) if config.CROP_ENABLED else None
+    page_pipeline = PagePipeline(
+        ocr_service,
+        page_cache=page_cache,
+        cascade_services=cascade_services,
+        page_tiler=page_tiler,
+        content_cropper=content_cropper
+    )
+    document_pipeline = DocumentPipeline(page_pipeline, result_cache=result_cache)
+    batch_manager = BatchJobManager(
+        document_pipeline,
+        workers=config.BATCH_WORKERS,
+        max_documents=config.BATCH_MAX_DOCUMENTS,
+        job_ttl_seconds=config.BATCH_JOB_TTL,
+        max_queued=config.BATCH_MAX_QUEUED
+    )
     logger.info("Services initialized successfully")
 except ValueError as e:
     logger.error(f"Configuration error: {e}")
+    ocr_scheduler = None
     ocr_service = None
+    page_cache = None
+    page_pipeline = None
+    document_pipeline = None
+    batch_manager = None
 
 
 @app.get("/health")
@@ -52,6 +150,19 @@ async def health_check():
         "version": config.API_VERSION
     }
 
+@app.get("/cache/stats")
+async def cache_stats():
+    """Result and page cache hit/miss counters"""
+    return {
+        "results": {"enabled": False} if result_cache is None else {"enabled": True, **result_cache.stats()},
+        "pages": {"enabled": False} if page_cache is None else {"enabled": True, **page_cache.stats()}
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Stage latency histograms, counters and in-flight gauges in Prometheus text format"""
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
@@ -70,84 +181,212 @@ async def extract_bill_data(request: ExtractRequest):
     Returns:
         ExtractResponse with extracted data or error
     """
+    logger.info(f"Received extraction request for document: {request.document}")
+    
+    # Validate OCR service is initialized
+    if ocr_service is None:
+        raise HTTPException(
+            status_code=500,
+            detail="OCR service not initialized. Please check GEMINI_API_KEY configuration."
+        )
+    
+    return await _tracked_extraction(
+        lambda: document_pipeline.extract(str(request.document)), "extract", request.include_timings
+    )
+
+
+async def _tracked_extraction(run, endpoint: str, include_timings: bool) -> ExtractResponse:
+    """Run an extraction under the request metrics, attaching timings if asked for"""
+    timings = metrics.RequestTimings() if include_timings else None
+    token = metrics.current_timings.set(timings)
     try:
-        logger.info(f"Received extraction request for document: {request.document}")
-        
-        # Validate OCR service is initialized
-        if ocr_service is None:
-            raise HTTPException(
-                status_code=500,
-                detail="OCR service not initialized. Please check GEMINI_API_KEY configuration."
-            )
-        
-        # Step 1: Download all pages
-        images = DocumentProcessor.download_all_pages(str(request.document))
-        if not images:
-            return ExtractResponse(
-                is_success=False,
-                error="Failed to download document from provided URL"
-            )
-        
-        logger.info(f"Processing {len(images)} page(s)")
-        
-        # Step 2 & 3: Process each page
-        all_pagewise_items = []
-        
-        for page_num, image in enumerate(images, start=1):
-            # Preprocess image
-            image = DocumentProcessor.preprocess_image(image, config.MAX_IMAGE_SIZE)
-            
-            # Extract data using OCR
-            ocr_data = ocr_service.extract_bill_data(image)
-            
-            # Check for OCR errors
-            if "error" in ocr_data and not ocr_data.get("line_items"):
-                logger.warning(f"OCR extraction failed for page {page_num}: {ocr_data['error']}")
-                continue
-            
-            # Transform to structured line items
-            pagewise_items = ExtractionService.transform_to_line_items(ocr_data)
-            
-            if pagewise_items and pagewise_items[0].bill_items:
-                # Update page number
-                pagewise_items[0].page_no = str(page_num)
-                all_pagewise_items.extend(pagewise_items)
-        
-        if not all_pagewise_items:
-            return ExtractResponse(
-                is_success=False,
-                error="No line items could be extracted from the document"
-            )
-        
-        # Step 4: Calculate reconciled amount across all pages
-        reconciled_amount = ReconciliationService.calculate_total(all_pagewise_items)
-        total_item_count = ReconciliationService.count_items(all_pagewise_items)
+        with metrics.IN_FLIGHT.track_inprogress(kind="requests"), metrics.timed("total"):
+            response = await run()
+    finally:
+        metrics.current_timings.reset(token)
+    
+    metrics.REQUESTS.inc(endpoint=endpoint, outcome="success" if response.is_success else "failure")
+    if timings is not None:
+        response = response.model_copy(update={"timings": timings.as_milliseconds()})
+    return response
+
+
+@app.post("/extract-bill-data/stream")
+async def extract_bill_data_stream(
+    request: ExtractRequest,
+    format: str = Query("ndjson", pattern="^(ndjson|sse)$", description="ndjson or sse")
+):
+    """
+    Extract line items, streaming each page as soon as it is processed
+    
+    Emits one ``page`` record per page (in completion order, identified by
+    ``page_no``) followed by a ``summary`` record with ``total_item_count``
+    and ``reconciled_amount``.
+    
+    Args:
+        request: ExtractRequest containing document URL
+        format: ndjson (application/x-ndjson) or sse (text/event-stream)
         
-        # Step 5: Prepare response
-        extract_data = ExtractData(
-            pagewise_line_items=all_pagewise_items,
-            total_item_count=total_item_count,
-            reconciled_amount=reconciled_amount
+    Returns:
+        StreamingResponse of page and summary records
+    """
+    logger.info(f"Received streaming extraction request for document: {request.document}")
+    
+    # Validate OCR service is initialized
+    if ocr_service is None:
+        raise HTTPException(
+            status_code=500,
+            detail="OCR service not initialized. Please check GEMINI_API_KEY configuration."
         )
+    
+    sse = format == "sse"
+    records = DocumentPipeline.stream_records(
+        _tracked_events(document_pipeline.iter_extract(str(request.document)), "stream"), sse=sse
+    )
+    return StreamingResponse(
+        records,
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def _tracked_events(events, endpoint: str, content=None):
+    """Count a streamed extraction by outcome once its summary is produced (then free `content`)"""
+    try:
+        with metrics.IN_FLIGHT.track_inprogress(kind="requests"), metrics.timed("total"):
+            async for event in events:
+                if isinstance(event, ExtractResponse):
+                    metrics.REQUESTS.inc(endpoint=endpoint, outcome="success" if event.is_success else "failure")
+                yield event
+    finally:
+        if content is not None:
+            DocumentProcessor.release(content)
+
+
+_UPLOAD_BODY = {
+    "required": True,
+    "content": {
+        "multipart/form-data": {
+            "schema": {
+                "type": "object",
+                "properties": {"file": {"type": "string", "format": "binary"}},
+                "required": ["file"]
+            }
+        },
+        "application/pdf": {"schema": {"type": "string", "format": "binary"}},
+        "image/*": {"schema": {"type": "string", "format": "binary"}}
+    }
+}
+
+
+@app.post("/extract-bill-data/upload", response_model=ExtractResponse, openapi_extra={"requestBody": _UPLOAD_BODY})
+async def extract_bill_data_upload(
+    request: Request,
+    format: str = Query("json", pattern="^(json|ndjson|sse)$", description="json, ndjson or sse"),
+    include_timings: bool = Query(False, description="Return a per-stage timing breakdown (json only)")
+):
+    """
+    Extract line items from an uploaded document instead of a URL
+    
+    Accepts a multipart/form-data upload (field ``file``) or a raw
+    application/pdf or image/* request body. The body is streamed into the
+    pipeline under the same size cap and spooling as URL downloads.
+    
+    Args:
+        request: Incoming request carrying the document
+        format: json (ExtractResponse) or a page stream like /extract-bill-data/stream
+        include_timings: Attach per-stage timings to the json response
         
-        logger.info(
-            f"Extraction successful: {len(images)} page(s), {total_item_count} items, "
-            f"total amount: {reconciled_amount}"
+    Returns:
+        ExtractResponse, or a StreamingResponse of page and summary records
+    """
+    # Validate OCR service is initialized
+    if ocr_service is None:
+        raise HTTPException(
+            status_code=500,
+            detail="OCR service not initialized. Please check GEMINI_API_KEY configuration."
         )
-        
-        return ExtractResponse(
-            is_success=True,
-            data=extract_data
+    
+    try:
+        content, content_type, filename = await UploadReader.read(
+            request.stream(),
+            request.headers.get("content-type", ""),
+            max_bytes=config.DOWNLOAD_MAX_BYTES,
+            spool_threshold=config.DOWNLOAD_SPOOL_THRESHOLD
         )
+    except DocumentTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UnsupportedDocumentError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    
+    source = filename or "upload"
+    if format == "json":
+        return await _tracked_extraction(
+            lambda: document_pipeline.extract_content(content, content_type, source, release=True),
+            "upload",
+            include_timings
+        )
+    
+    sse = format == "sse"
+    records = DocumentPipeline.stream_records(
+        _tracked_events(document_pipeline.iter_extract_content(content, content_type, source), "upload", content),
+        sse=sse
+    )
+    return StreamingResponse(
+        records,
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.post("/batch-extract", response_model=BatchJobResponse, status_code=202)
+async def submit_batch(request: BatchExtractRequest):
+    """
+    Queue many documents for extraction and return a job id to poll
+    
+    Args:
+        request: BatchExtractRequest containing document URLs
         
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Unexpected error during extraction: {e}", exc_info=True)
-        return ExtractResponse(
-            is_success=False,
-            error=f"Internal server error: {str(e)}"
+    Returns:
+        BatchJobResponse with the job id and initial counts
+    """
+    if batch_manager is None:
+        raise HTTPException(
+            status_code=500,
+            detail="OCR service not initialized. Please check GEMINI_API_KEY configuration."
         )
+    
+    try:
+        job = batch_manager.submit([str(document) for document in request.documents])
+    except ValueError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except BatchQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "60"})
+    
+    return batch_manager.get_status(job.job_id, limit=0)
+
+
+@app.get("/batch-extract/{job_id}", response_model=BatchJobResponse)
+async def get_batch(
+    job_id: str,
+    offset: int = Query(0, ge=0, description="Index of the first result to return"),
+    limit: int = Query(100, ge=0, le=1000, description="Maximum number of results to return")
+):
+    """
+    Poll a batch job for progress and a page of per-document results
+    
+    Args:
+        job_id: Identifier returned when the batch was submitted
+        offset: Index of the first result to return
+        limit: Maximum number of results to return
+        
+    Returns:
+        BatchJobResponse with counts and results
+    """
+    status = batch_manager.get_status(job_id, offset, limit) if batch_manager is not None else None
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Batch job not found: {job_id}")
+    return status
 
 
 if __name__ == "__main__":
@@ -0,0 +1,199 @@
+"""
+Benchmark upload encodings of page images: format, quality, grayscale and
+binarization.
+
+For every encoding the benchmark reports, over the same pages:
+  * payload bytes per page (after the same preprocessing and cropping as
+    the service)
+  * encode CPU time per page
+  * with --live (needs GEMINI_API_KEY): extraction accuracy against the
+    ground truth (recall / precision of line items matched by amount), and
+    the smallest encoding whose recall stays within --tolerance of the
+    first encoding listed
+
+Pages are synthetic colour "scans" of bills with known items, or a directory
+of recorded ground truth given with --truth: page images (PNG/JPEG) next to a
+same-named .json holding the expected line items (a list, or an object with
+"line_items").
+
+Encodings are written as FORMAT[:QUALITY][:gray|:bw], e.g. png, png:bw,
+jpeg:80:gray, webp:60.
+
+Usage:
+    python benchmarks/bench_encoding.py --output bench_encoding.json
+    python benchmarks/bench_encoding.py --truth recorded_pages/ --live --encodings png png:gray webp:80:gray webp:60:gray
+"""
+import argparse
+import glob
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image  # noqa: E402
+from config import config  # noqa: E402
+from services.content_crop import ContentCropper  # noqa: E402
+from services.document_processor import DocumentProcessor, ImageEncoding  # noqa: E402
+from services.extraction_service import ExtractionService  # noqa: E402
+from synthetic import make_bill_page, make_items, make_scan, score_items  # noqa: E402
+
+DEFAULT_ENCODINGS = [
+    "png", "png:gray", "png:bw",
+    "jpeg:90", "jpeg:75:gray", "jpeg:60:gray",
+    "webp:90", "webp:75:gray", "webp:60:gray"
+]
+
+
+def parse_encoding(label: str) -> ImageEncoding:
+    """Build an ImageEncoding from FORMAT[:QUALITY][:gray|:bw]"""
+    parts = label.lower().split(":")
+    quality = next((int(part) for part in parts[1:] if part.isdigit()), 85)
+    return ImageEncoding(
+        format=parts[0],
+        quality=quality,
+        grayscale="gray" in parts[1:],
+        binarize="bw" in parts[1:]
+    )
+
+
+def load_pages(args) -> List[Tuple[str, Image.Image, List[Dict]]]:
+    """(name, page image, ground-truth items) for every benchmark page"""
+    if args.truth:
+        pages = []
+        for truth_path in sorted(glob.glob(os.path.join(args.truth, "*.json"))):
+            stem = os.path.splitext(truth_path)[0]
+            image_path = next((stem + ext for ext in (".png", ".jpg", ".jpeg") if os.path.exists(stem + ext)), None)
+            if image_path is None:
+                continue
+            with open(truth_path, "r", encoding="utf-8") as f:
+                truth = json.load(f)
+            items = truth["line_items"] if isinstance(truth, dict) else truth
+            pages.append((os.path.basename(stem), Image.open(image_path), items))
+        if not pages:
+            sys.exit(f"No image + .json pairs found in {args.truth}")
+        return pages
+
+    pages = []
+    for page in range(args.pages):
+        items = make_items(args.rows, seed=page)
+        pages.append((f"synthetic-{page + 1}", make_scan(make_bill_page(items, page + 1), seed=page), items))
+    return pages
+
+
+def upload_image(image: Image.Image, cropper) -> Image.Image:
+    """The image the service would encode for a page"""
+    image = DocumentProcessor.preprocess_image(image, config.MAX_IMAGE_SIZE)
+    return cropper.crop(image).image if cropper is not None else image
+
+
+def measure(encoding: ImageEncoding, images: List[Image.Image], repeats: int) -> Dict:
+    """Payload size and encode CPU time of one encoding"""
+    sizes, cpu_times = [], []
+    for image in images:
+        samples = []
+        for _ in range(repeats):
+            start = time.process_time()
+            data = DocumentProcessor.image_to_bytes(
+                image,
+                encoding.format,
+                quality=encoding.quality,
+                grayscale=encoding.grayscale,
+                binarize=encoding.binarize
+            )
+            samples.append(time.process_time() - start)
+        sizes.append(len(data))
+        cpu_times.append(statistics.median(samples))
+    return {
+        "encoding": encoding.label,
+        "mime_type": encoding.mime_type,
+        "mean_bytes": round(statistics.mean(sizes)),
+        "max_bytes": max(sizes),
+        "encode_cpu_ms": round(statistics.mean(cpu_times) * 1000, 2)
+    }
+
+
+def score(encoding: ImageEncoding, pages: List[Tuple[str, Image.Image, List[Dict]]], images: List[Image.Image]) -> Dict:
+    """Extraction accuracy of one encoding against the ground truth (one model call per page)"""
+    from services.ocr_backends import GeminiBackend
+    from services.ocr_service import OCRService
+
+    ocr_service = OCRService(
+        backend=GeminiBackend(api_key=config.GEMINI_API_KEY, model_name=config.GEMINI_MODEL, encoding=encoding),
+        output_format=config.OCR_OUTPUT_FORMAT
+    )
+    scores = []
+    for (name, _, truth), image in zip(pages, images):
+        ocr_data = ocr_service.extract_bill_data(image)
+        extracted = [
+            item.model_dump() for page in ExtractionService.transform_to_line_items(ocr_data) for item in page.bill_items
+        ]
+        scores.append(score_items(extracted, truth))
+    return {
+        "recall": round(statistics.mean(result["recall"] for result in scores), 4),
+        "precision": round(statistics.mean(result["precision"] for result in scores), 4)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--encodings", nargs="+", default=DEFAULT_ENCODINGS, help="Encodings to compare")
+    parser.add_argument("--truth", help="Directory of page images with .json ground truth")
+    parser.add_argument("--pages", type=int, default=5, help="Synthetic pages (without --truth)")
+    parser.add_argument("--rows", type=int, default=30, help="Line items per synthetic page")
+    parser.add_argument("--repeats", type=int, default=3, help="Encodes per page for CPU timing")
+    parser.add_argument("--live", action="store_true", help="Measure accuracy with GEMINI_MODEL")
+    parser.add_argument("--tolerance", type=float, default=0.0,
+                        help="Recall drop (vs. the first encoding) still counted as keeping accuracy")
+    parser.add_argument("--output", help="Write JSON results to this file")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    if args.live and not config.GEMINI_API_KEY:
+        sys.exit("--live needs GEMINI_API_KEY")
+
+    encodings = [parse_encoding(label) for label in args.encodings]
+    pages = load_pages(args)
+    cropper = ContentCropper(padding=config.CROP_PADDING, min_saving=config.CROP_MIN_SAVING,
+                             table_only=config.CROP_TABLE_ONLY) if config.CROP_ENABLED else None
+    images = [upload_image(image, cropper) for _, image, _ in pages]
+
+    results = []
+    for encoding in encodings:
+        result = measure(encoding, images, args.repeats)
+        if args.live:
+            result.update(score(encoding, pages, images))
+        results.append(result)
+        accuracy = f" recall={result['recall']:.3f} precision={result['precision']:.3f}" if args.live else ""
+        print(f"{result['encoding']:14s} bytes={result['mean_bytes']:>9,d} cpu={result['encode_cpu_ms']:7.1f}ms{accuracy}")
+
+    recommended = None
+    if args.live:
+        floor = results[0]["recall"] - args.tolerance
+        keeping = [result for result in results if result["recall"] >= floor]
+        recommended = min(keeping, key=lambda result: result["mean_bytes"])["encoding"]
+        print(f"Smallest encoding keeping recall >= {floor:.3f}: {recommended}")
+
+    report = {
+        "benchmark": "encoding",
+        "pages": len(pages),
+        "source": args.truth or "synthetic",
+        "max_image_size": list(config.MAX_IMAGE_SIZE),
+        "crop": config.CROP_ENABLED,
+        "model": config.GEMINI_MODEL if args.live else None,
+        "results": results,
+        "recommended": recommended
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
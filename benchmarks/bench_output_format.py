@@ -0,0 +1,163 @@
+"""
+Benchmark the model output formats: one JSON object per line item
+("objects", the default) vs. a header row plus value arrays ("compact").
+
+Offline (default), both formats are rendered for the same synthetic pages
+and the benchmark reports, per page size:
+  * response size in characters and approximate output tokens (words,
+    single digits and punctuation each count as one token, which is how
+    Gemini's tokenizer treats JSON figures)
+  * estimated generation time at --tokens-per-second
+  * parse time: json.loads + decode + transformation into LineItem models
+  * whether the decoded items match the ground truth
+
+With --live (needs GEMINI_API_KEY), the synthetic pages are rendered and sent
+to GEMINI_MODEL with each prompt, and real latency, output tokens (counted by
+the model's tokenizer) and accuracy against the ground truth are reported.
+
+Usage:
+    python benchmarks/bench_output_format.py --rows 10 50 300 --output bench_output_format.json
+    python benchmarks/bench_output_format.py --rows 30 100 --live --repeats 3
+"""
+import argparse
+import json
+import logging
+import os
+import re
+import statistics
+import sys
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import config  # noqa: E402
+from services.compact_output import CompactOutput  # noqa: E402
+from services.document_processor import DocumentProcessor  # noqa: E402
+from services.extraction_service import ExtractionService  # noqa: E402
+from services.ocr_service import OCRService  # noqa: E402
+from synthetic import make_bill_page, make_items, score_items, stub_compact_response, stub_response  # noqa: E402
+
+FORMATS = ["objects", "compact"]
+TOKEN_RE = re.compile(r"[A-Za-z]+|\d|[^\sA-Za-z\d]")
+
+
+def approx_tokens(text: str) -> int:
+    """Rough output token count for JSON text"""
+    return len(TOKEN_RE.findall(text))
+
+
+def render(items: List[Dict], output_format: str) -> str:
+    """Response text as each prompt asks for it (objects indented, compact minified)"""
+    if output_format == "compact":
+        return stub_compact_response(items)
+    return json.dumps(json.loads(stub_response(items)), indent=2)
+
+
+def parse(text: str):
+    """Everything the service does with a response after the model call"""
+    ocr_data = CompactOutput.decode(json.loads(OCRService.strip_markdown(text)))
+    return ExtractionService.transform_to_line_items(ocr_data)
+
+
+def accuracy(pages, truth: List[Dict]) -> Dict:
+    """Item-level accuracy of transformed pages against the ground truth"""
+    return score_items([item.model_dump() for page in pages for item in page.bill_items], truth)
+
+
+def run_offline(rows: int, args) -> List[Dict]:
+    truth = make_items(rows)
+    results = []
+    for output_format in FORMATS:
+        text = render(truth, output_format)
+        tokens = approx_tokens(text)
+        timings = []
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            pages = parse(text)
+            timings.append(time.perf_counter() - start)
+        results.append({
+            "rows": rows,
+            "format": output_format,
+            "chars": len(text),
+            "approx_tokens": tokens,
+            "est_generation_seconds": round(tokens / args.tokens_per_second, 2),
+            "parse_ms": round(statistics.median(timings) * 1000, 3),
+            **accuracy(pages, truth)
+        })
+    return results
+
+
+def run_live(rows: int, args) -> List[Dict]:
+    from services.ocr_backends import GeminiBackend
+
+    truth = make_items(rows)
+    image = DocumentProcessor.preprocess_image(make_bill_page(truth).convert("RGB"), config.MAX_IMAGE_SIZE)
+    backend = GeminiBackend(api_key=config.GEMINI_API_KEY, model_name=config.GEMINI_MODEL)
+    results = []
+    for output_format in FORMATS:
+        prompt = OCRService.COMPACT_PROMPT if output_format == "compact" else OCRService.PROMPT
+        latencies, tokens, parse_times, scores = [], [], [], []
+        for _ in range(args.repeats):
+            start = time.perf_counter()
+            text = backend.generate(prompt, image)
+            latencies.append(time.perf_counter() - start)
+            tokens.append(backend.model.count_tokens(text).total_tokens)
+            start = time.perf_counter()
+            try:
+                pages = parse(text)
+            except ValueError:
+                pages = []
+            parse_times.append(time.perf_counter() - start)
+            scores.append(accuracy(pages, truth))
+        results.append({
+            "rows": rows,
+            "format": output_format,
+            "output_tokens": round(statistics.mean(tokens)),
+            "latency_seconds": round(statistics.median(latencies), 3),
+            "parse_ms": round(statistics.median(parse_times) * 1000, 3),
+            "recall": round(statistics.mean(score["recall"] for score in scores), 4),
+            "precision": round(statistics.mean(score["precision"] for score in scores), 4)
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", nargs="+", type=int, default=[10, 50, 300], help="Line items per page")
+    parser.add_argument("--repeats", type=int, default=20, help="Runs per format (live: model calls)")
+    parser.add_argument("--tokens-per-second", type=float, default=150.0,
+                        help="Model output speed for the offline generation time estimate")
+    parser.add_argument("--live", action="store_true", help="Call GEMINI_MODEL instead of using stub responses")
+    parser.add_argument("--output", help="Write JSON results to this file")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    if args.live and not config.GEMINI_API_KEY:
+        sys.exit("--live needs GEMINI_API_KEY")
+
+    results = []
+    for rows in args.rows:
+        for result in (run_live if args.live else run_offline)(rows, args):
+            results.append(result)
+            size = (f"tokens={result['output_tokens']} latency={result['latency_seconds']:.2f}s" if args.live
+                    else f"tokens~{result['approx_tokens']} est_gen={result['est_generation_seconds']:.1f}s")
+            print(f"rows={rows:<4d} {result['format']:8s} {size} parse={result['parse_ms']:.2f}ms "
+                  f"recall={result['recall']:.3f}")
+
+    report = {
+        "benchmark": "output_format",
+        "mode": "live" if args.live else "offline",
+        "model": config.GEMINI_MODEL if args.live else None,
+        "tokens_per_second": None if args.live else args.tokens_per_second,
+        "results": results
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
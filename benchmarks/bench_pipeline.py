@@ -0,0 +1,331 @@
+"""
+End-to-end benchmark of the extraction pipeline on synthetic bills.
+
+Documents are served from a local HTTP server and OCR is answered by the
+offline ReplayBackend (stub response + synthetic latency), so runs are
+reproducible and need no network or API key.
+
+For every scenario (single image, 1/10/100-page PDFs) the benchmark reports:
+  * per-stage latency: download, rasterize, preprocess, encode, ocr,
+    transform, reconcile
+  * peak RSS of the scenario (each scenario runs in its own subprocess)
+  * requests/sec through DocumentPipeline at several concurrency levels
+
+Usage:
+    python benchmarks/bench_pipeline.py --output bench_pipeline.json
+    python benchmarks/bench_pipeline.py --scenarios image pdf_10 --concurrency 1 8 --ocr-latency-ms 800
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import config  # noqa: E402
+from services.cpu_pool import CPUPool  # noqa: E402
+from services.document_processor import DocumentProcessor  # noqa: E402
+from services.document_pipeline import DocumentPipeline  # noqa: E402
+from services.extraction_service import ExtractionService  # noqa: E402
+from services.http_client import HTTPClient  # noqa: E402
+from services.ocr_backends import ReplayBackend  # noqa: E402
+from services.ocr_service import OCRService  # noqa: E402
+from services.page_pipeline import PagePipeline  # noqa: E402
+from services.reconciliation_service import ReconciliationService  # noqa: E402
+from synthetic import make_document, stub_response, make_items  # noqa: E402
+
+SCENARIOS = {
+    "image": {"pages": 1, "fmt": "PNG"},
+    "pdf_1": {"pages": 1, "fmt": "PDF"},
+    "pdf_10": {"pages": 10, "fmt": "PDF"},
+    "pdf_100": {"pages": 100, "fmt": "PDF"},
+}
+
+STAGES = ["download", "rasterize", "preprocess", "encode", "ocr", "transform", "reconcile"]
+
+
+class DocumentServer:
+    """Serves in-memory documents over HTTP on localhost"""
+
+    def __init__(self, documents: Dict[str, tuple]):
+        documents_ref = documents
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                name = self.path.lstrip("/").split("?")[0]
+                if name not in documents_ref:
+                    self.send_error(404)
+                    return
+                content, content_type = documents_ref[name]
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    """Latency summary in milliseconds"""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    return {
+        "count": len(samples),
+        "total_ms": round(sum(samples) * 1000, 3),
+        "mean_ms": round(statistics.mean(samples) * 1000, 3),
+        "p50_ms": round(ordered[len(ordered) // 2] * 1000, 3),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3)
+    }
+
+
+async def measure_stages(url: str, ocr_service: OCRService, repeats: int) -> Dict[str, Dict]:
+    """Run the pipeline stages one after another and time each of them"""
+    timings = {stage: [] for stage in STAGES}
+
+    for _ in range(repeats):
+        start = time.perf_counter()
+        content, content_type = await DocumentProcessor.fetch_document_async(url)
+        timings["download"].append(time.perf_counter() - start)
+
+        pages = DocumentProcessor.iter_pages(
+            content, content_type, url,
+            window=config.RASTER_WINDOW,
+            max_size=config.MAX_IMAGE_SIZE,
+            grayscale=config.PDF_RENDER_GRAYSCALE
+        )
+        all_pagewise_items = []
+        page_num = 0
+        while True:
+            start = time.perf_counter()
+            image = next(pages, None)
+            if image is not None:
+                image.load()
+            timings["rasterize"].append(time.perf_counter() - start)
+            if image is None:
+                break
+            page_num += 1
+
+            start = time.perf_counter()
+            image = DocumentProcessor.preprocess_image(image, config.MAX_IMAGE_SIZE)
+            timings["preprocess"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            DocumentProcessor.image_to_bytes(image)
+            timings["encode"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            ocr_data = ocr_service.extract_bill_data(image)
+            timings["ocr"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            pagewise_items = ExtractionService.transform_to_line_items(ocr_data)
+            for page in pagewise_items:
+                page.page_no = str(page_num)
+            all_pagewise_items.extend(pagewise_items)
+            timings["transform"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        ReconciliationService.calculate_total(all_pagewise_items)
+        ReconciliationService.count_items(all_pagewise_items)
+        timings["reconcile"].append(time.perf_counter() - start)
+
+    return {stage: summarize(samples) for stage, samples in timings.items()}
+
+
+async def measure_throughput(url: str, document_pipeline: DocumentPipeline, concurrency: int,
+                             requests: int, pages: int) -> Dict:
+    """Push `requests` extractions through the pipeline with `concurrency` in flight"""
+    queue: asyncio.Queue = asyncio.Queue()
+    for index in range(requests):
+        # A distinct URL per request, as from independent clients
+        queue.put_nowait(f"{url}?request={index}")
+    latencies = []
+    failures = 0
+
+    async def client():
+        nonlocal failures
+        while not queue.empty():
+            request_url = queue.get_nowait()
+            start = time.perf_counter()
+            response = await document_pipeline.extract(request_url)
+            latencies.append(time.perf_counter() - start)
+            if not response.is_success:
+                failures += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "failures": failures,
+        "seconds": round(elapsed, 3),
+        "requests_per_sec": round(requests / elapsed, 3),
+        "pages_per_sec": round(requests * pages / elapsed, 3),
+        "latency": summarize(latencies)
+    }
+
+
+async def run_scenario_async(args) -> Dict:
+    spec = SCENARIOS[args.scenario]
+    content, _ = make_document(spec["pages"], rows_per_page=args.rows, fmt=spec["fmt"])
+    content_type = "application/pdf" if spec["fmt"] == "PDF" else "image/png"
+
+    # Same CPU offload as the server
+    CPUPool.start()
+
+    # Cache-free services so every request does the full amount of work
+    backend = ReplayBackend(
+        record_dir=tempfile.mkdtemp(prefix="bench-replay-"),
+        model_name=config.GEMINI_MODEL,
+        latency_ms=args.ocr_latency_ms,
+        latency_jitter_ms=args.ocr_jitter_ms,
+        default_response=stub_response(make_items(args.rows)),
+        seed=0
+    )
+    ocr_service = OCRService(backend=backend)
+    # Every client sends the same bytes, so content coalescing is off too
+    document_pipeline = DocumentPipeline(PagePipeline(ocr_service), result_cache=None, coalesce=False)
+
+    with DocumentServer({"document": (content, content_type)}) as server:
+        url = f"{server.base_url}/document"
+        result = {
+            "scenario": args.scenario,
+            "pages": spec["pages"],
+            "format": spec["fmt"],
+            "document_bytes": len(content),
+            "stages": await measure_stages(url, ocr_service, args.stage_repeats),
+            "throughput": []
+        }
+        for concurrency in args.concurrency:
+            requests = max(args.requests, concurrency)
+            result["throughput"].append(
+                await measure_throughput(url, document_pipeline, concurrency, requests, spec["pages"])
+            )
+        await HTTPClient.close()
+    CPUPool.shutdown()
+
+    if result["stages"]["ocr"]["count"] == 0:
+        result["error"] = "No pages were rendered (is poppler installed?)"
+
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    result["peak_rss_mb"] = round(usage.ru_maxrss / 1024, 1)
+    result["peak_child_rss_mb"] = round(children.ru_maxrss / 1024, 1)
+    result["cpu_seconds"] = round(
+        usage.ru_utime + usage.ru_stime + children.ru_utime + children.ru_stime, 3
+    )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=16, help="Requests per concurrency level")
+    parser.add_argument("--stage-repeats", type=int, default=3, help="Sequential runs for stage timings")
+    parser.add_argument("--rows", type=int, default=30, help="Line items per synthetic page")
+    parser.add_argument("--ocr-latency-ms", type=float, default=500.0, help="Stub OCR latency")
+    parser.add_argument("--ocr-jitter-ms", type=float, default=100.0, help="Stub OCR latency jitter")
+    parser.add_argument("--output", help="Write JSON results to this file")
+    parser.add_argument("--scenario", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # Child invocation: run one scenario and print its JSON
+    if args.scenario:
+        import logging
+        logging.disable(logging.INFO)
+        print(json.dumps(asyncio.run(run_scenario_async(args))))
+        return
+
+    results = []
+    for scenario in args.scenarios:
+        command = [
+            sys.executable, os.path.abspath(__file__), "--scenario", scenario,
+            "--concurrency", *map(str, args.concurrency),
+            "--requests", str(args.requests),
+            "--stage-repeats", str(args.stage_repeats),
+            "--rows", str(args.rows),
+            "--ocr-latency-ms", str(args.ocr_latency_ms),
+            "--ocr-jitter-ms", str(args.ocr_jitter_ms)
+        ]
+        proc = subprocess.run(command, capture_output=True, text=True)
+        if proc.returncode != 0:
+            error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "unknown error"
+            print(f"{scenario:8s} FAILED: {error}")
+            results.append({"scenario": scenario, "error": error})
+            continue
+
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        results.append(result)
+        stage_summary = " ".join(
+            f"{stage}={result['stages'][stage].get('mean_ms', 0):.1f}ms" for stage in STAGES
+        )
+        throughput_summary = " ".join(
+            f"c{run['concurrency']}={run['requests_per_sec']:.2f}rps" for run in result["throughput"]
+        )
+        print(f"{scenario:8s} {stage_summary} | {throughput_summary} | peak_rss={result['peak_rss_mb']:.0f}MB")
+        if "error" in result:
+            print(f"{'':8s} WARNING: {result['error']}")
+
+    report = {
+        "benchmark": "pipeline",
+        "timestamp": time.time(),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count()
+        },
+        "settings": {
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "rows_per_page": args.rows,
+            "ocr_latency_ms": args.ocr_latency_ms,
+            "ocr_jitter_ms": args.ocr_jitter_ms,
+            "page_concurrency": config.PAGE_CONCURRENCY,
+            "ocr_max_concurrency": config.OCR_MAX_CONCURRENCY,
+            "raster_window": config.RASTER_WINDOW,
+            "cpu_workers": config.CPU_WORKERS,
+            "max_image_size": list(config.MAX_IMAGE_SIZE)
+        },
+        "scenarios": results
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark PDF rasterization: fixed 200 dpi + LANCZOS downscale vs. rendering
+directly at the OCR target size.
+
+Each mode runs in its own subprocess so CPU time (including the poppler
+child processes) and peak RSS are measured in isolation.
+
+Usage:
+    python benchmarks/bench_rasterize.py --pages 10 --output bench_rasterize.json
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import config  # noqa: E402
+from services.document_processor import DocumentProcessor  # noqa: E402
+from synthetic import make_document  # noqa: E402
+
+
+def run_mode(mode: str, pdf_path: str) -> dict:
+    """Rasterize + preprocess every page with the given mode and report resource usage"""
+    with open(pdf_path, "rb") as f:
+        content = f.read()
+
+    start_wall = time.perf_counter()
+    page_count = 0
+    output_pixels = 0
+
+    if mode == "baseline":
+        from pdf2image import convert_from_bytes
+        for image in convert_from_bytes(content, dpi=200):
+            image = DocumentProcessor.preprocess_image(image.convert("RGB"), config.MAX_IMAGE_SIZE)
+            output_pixels += image.size[0] * image.size[1]
+            page_count += 1
+    else:
+        pages = DocumentProcessor.iter_pages(
+            content,
+            "application/pdf",
+            window=config.RASTER_WINDOW,
+            max_size=config.MAX_IMAGE_SIZE,
+            grayscale=(mode == "target_gray")
+        )
+        for image in pages:
+            image = DocumentProcessor.preprocess_image(image, config.MAX_IMAGE_SIZE)
+            output_pixels += image.size[0] * image.size[1]
+            page_count += 1
+
+    wall = time.perf_counter() - start_wall
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+    return {
+        "mode": mode,
+        "pages": page_count,
+        "wall_seconds": round(wall, 4),
+        "cpu_seconds": round(cpu, 4),
+        "cpu_seconds_per_page": round(cpu / max(page_count, 1), 4),
+        "peak_rss_mb": round(own.ru_maxrss / 1024, 1),
+        "peak_child_rss_mb": round(children.ru_maxrss / 1024, 1),
+        "avg_output_pixels": output_pixels // max(page_count, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=10, help="Pages in the synthetic PDF")
+    parser.add_argument("--output", help="Write JSON results to this file")
+    parser.add_argument("--mode", help=argparse.SUPPRESS)
+    parser.add_argument("--pdf", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # Child invocation: run a single mode and print its JSON
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.pdf)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pdf_path = os.path.join(tmp_dir, "bench.pdf")
+        with open(pdf_path, "wb") as f:
+            f.write(make_document(args.pages, fmt="PDF")[0])
+
+        results = []
+        for mode in ("baseline", "target_rgb", "target_gray"):
+            proc = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--mode", mode, "--pdf", pdf_path],
+                capture_output=True, text=True
+            )
+            if proc.returncode != 0:
+                sys.exit(f"{mode} run failed (is poppler installed?):\n{proc.stderr}")
+            result = json.loads(proc.stdout.strip().splitlines()[-1])
+            results.append(result)
+            print(f"{mode:12s} cpu/page={result['cpu_seconds_per_page']:.3f}s "
+                  f"peak_rss={result['peak_rss_mb']:.0f}MB wall={result['wall_seconds']:.2f}s")
+
+    report = {
+        "benchmark": "rasterize",
+        "pages": args.pages,
+        "max_image_size": list(config.MAX_IMAGE_SIZE),
+        "raster_window": config.RASTER_WINDOW,
+        "results": results
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
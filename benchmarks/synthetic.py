@@ -0,0 +1,153 @@
+"""
+Synthetic bill documents and stub OCR responses for benchmarks.
+"""
+import json
+import random
+from io import BytesIO
+from typing import Dict, List, Tuple
+from PIL import Image, ImageChops, ImageDraw, ImageFilter, ImageFont
+
+ITEM_NAMES = [
+    "Paracetamol 500mg Tab", "Consultation Charges", "Room Rent - General Ward",
+    "CBC Test", "Inj. Ceftriaxone 1g", "Nursing Charges", "X-Ray Chest PA View",
+    "Pantoprazole 40mg Tab", "Dressing Charges", "Saline 500ml", "ECG",
+    "Metformin 500mg Tab", "Lipid Profile", "Surgical Gloves", "Ambulance Charges"
+]
+
+
+def _font(size: int):
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:
+        # Pillow < 10.1 has no scalable default font
+        return ImageFont.load_default()
+
+
+def make_items(rows: int, seed: int = 0) -> List[Dict]:
+    """Ground-truth line items for one page"""
+    rng = random.Random(seed)
+    items = []
+    for row in range(rows):
+        quantity = float(rng.randint(1, 10))
+        rate = round(rng.uniform(5, 2500), 2)
+        items.append({
+            "item_name": f"{ITEM_NAMES[(row + seed) % len(ITEM_NAMES)]} #{row + 1}",
+            "item_quantity": quantity,
+            "item_rate": rate,
+            "item_amount": round(quantity * rate, 2)
+        })
+    return items
+
+
+def make_bill_page(items: List[Dict], page_no: int = 1, size: Tuple[int, int] = (2480, 3508),
+                   mode: str = "L") -> Image.Image:
+    """Render a bill page (A4 at 300 dpi by default) listing the given items"""
+    image = Image.new(mode, size, "white")
+    draw = ImageDraw.Draw(image)
+    scale = size[0] / 2480
+    title_font = _font(int(64 * scale))
+    body_font = _font(int(36 * scale))
+
+    margin = int(150 * scale)
+    row_height = int(60 * scale)
+    columns = [margin, int(1500 * scale), int(1750 * scale), int(2050 * scale)]
+
+    draw.text((margin, margin), "CITY CARE HOSPITAL - FINAL BILL", fill="black", font=title_font)
+    draw.text((margin, margin + int(100 * scale)), f"Page {page_no}", fill="black", font=body_font)
+
+    y = margin + int(250 * scale)
+    for x, header in zip(columns, ["Description", "Qty", "Rate", "Amount"]):
+        draw.text((x, y), header, fill="black", font=body_font)
+    y += row_height
+    draw.line((margin, y, size[0] - margin, y), fill="black", width=max(1, int(3 * scale)))
+    y += int(20 * scale)
+
+    for item in items:
+        if y > size[1] - margin - 2 * row_height:
+            break
+        draw.text((columns[0], y), item["item_name"], fill="black", font=body_font)
+        draw.text((columns[1], y), f"{item['item_quantity']:.0f}", fill="black", font=body_font)
+        draw.text((columns[2], y), f"{item['item_rate']:.2f}", fill="black", font=body_font)
+        draw.text((columns[3], y), f"{item['item_amount']:.2f}", fill="black", font=body_font)
+        y += row_height
+
+    total = round(sum(item["item_amount"] for item in items), 2)
+    draw.text((columns[2], y + row_height), f"TOTAL  {total:.2f}", fill="black", font=body_font)
+    return image
+
+
+def make_scan(page: Image.Image, seed: int = 0) -> Image.Image:
+    """Make a clean rendered page look like a colour scan: tinted paper, sensor noise, slight blur"""
+    rng = random.Random(seed)
+    tint = Image.new("RGB", page.size, (250, 246, 235))
+    scan = ImageChops.multiply(page.convert("RGB"), tint)
+    noise = Image.effect_noise(page.size, 12 + rng.random() * 4).convert("RGB")
+    scan = ImageChops.add(ImageChops.subtract(scan, Image.new("RGB", page.size, (8, 8, 8))), noise, scale=1.0, offset=-120)
+    return scan.filter(ImageFilter.GaussianBlur(0.6))
+
+
+def make_document(pages: int, rows_per_page: int = 30, fmt: str = "PDF",
+                  page_size: Tuple[int, int] = (2480, 3508)) -> Tuple[bytes, List[List[Dict]]]:
+    """
+    Build a synthetic bill document
+
+    Args:
+        pages: Number of pages
+        rows_per_page: Line items per page
+        fmt: "PDF" (multi-page, 300 dpi raster pages), "PNG" or "JPEG" (single page)
+        page_size: Page size in pixels
+
+    Returns:
+        Tuple of (document bytes, ground-truth items per page)
+    """
+    truth = [make_items(rows_per_page, seed=page) for page in range(pages)]
+    images = [make_bill_page(items, page + 1, page_size) for page, items in enumerate(truth)]
+
+    buffer = BytesIO()
+    if fmt == "PDF":
+        images[0].save(buffer, "PDF", resolution=300, save_all=True, append_images=images[1:])
+    else:
+        images[0].save(buffer, fmt)
+    return buffer.getvalue(), truth
+
+
+def stub_response(items: List[Dict], page_type: str = "Bill Detail") -> str:
+    """OCR response text in the format the extraction prompt asks for"""
+    total = round(sum(item["item_amount"] for item in items), 2)
+    return json.dumps({
+        "page_no": "1",
+        "page_type": page_type,
+        "line_items": items,
+        "extracted_total": total,
+        "actual_bill_total": total
+    })
+
+
+def stub_compact_response(items: List[Dict], page_type: str = "Bill Detail") -> str:
+    """OCR response text in the columnar format COMPACT_PROMPT asks for"""
+    total = round(sum(item["item_amount"] for item in items), 2)
+    columns = ["item_name", "item_quantity", "item_rate", "item_amount"]
+    return json.dumps({
+        "page_type": page_type,
+        "columns": columns,
+        "rows": [[item[column] for column in columns] for item in items],
+        "extracted_total": total,
+        "actual_bill_total": total
+    }, separators=(",", ":"))
+
+
+def score_items(extracted: List[Dict], truth: List[Dict]) -> Dict:
+    """Share of ground-truth items found with the exact amount, and of extracted items that are real"""
+    remaining = [round(item["item_amount"], 2) for item in truth]
+    matched = 0
+    for item in extracted:
+        amount = round(float(item["item_amount"]), 2)
+        if amount in remaining:
+            remaining.remove(amount)
+            matched += 1
+    return {
+        "expected_items": len(truth),
+        "extracted_items": len(extracted),
+        "recall": round(matched / max(len(truth), 1), 4),
+        "precision": round(matched / max(len(extracted), 1), 4)
+    }
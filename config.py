@@ -1,3 +1,4 @@
+import hashlib
 import os
 from dotenv import load_dotenv
 
@@ -13,18 +14,129 @@ class Config:
     # Model configuration
     GEMINI_MODEL = "gemini-2.0-flash"
     
+    # Model cascade: stronger models re-run pages whose items don't add up to the printed total
+    OCR_CASCADE_MODELS = [m.strip() for m in os.getenv("OCR_CASCADE_MODELS", "").split(",") if m.strip()]
+    OCR_CASCADE_TOLERANCE = float(os.getenv("OCR_CASCADE_TOLERANCE", "1.0"))  # Percent difference still accepted
+    OCR_OUTPUT_FORMAT = os.getenv("OCR_OUTPUT_FORMAT", "objects")  # "objects" or "compact" (columnar rows)
+    
+    # OCR backend: "gemini", "record" (Gemini + save responses) or "replay" (offline)
+    OCR_BACKEND = os.getenv("OCR_BACKEND", "gemini")
+    OCR_RECORD_DIR = os.getenv("OCR_RECORD_DIR", "recordings")
+    REPLAY_LATENCY_MS = float(os.getenv("REPLAY_LATENCY_MS", "0"))
+    REPLAY_LATENCY_JITTER_MS = float(os.getenv("REPLAY_LATENCY_JITTER_MS", "0"))
+    REPLAY_FAILURE_RATE = float(os.getenv("REPLAY_FAILURE_RATE", "0"))
+    REPLAY_SEED = int(os.getenv("REPLAY_SEED")) if os.getenv("REPLAY_SEED") else None
+    REPLAY_DEFAULT_RESPONSE_FILE = os.getenv("REPLAY_DEFAULT_RESPONSE_FILE", "")  # Served for unrecorded pages
+    
     # Image processing settings
     MAX_IMAGE_SIZE = (2048, 2048)  # Max dimensions for processing
+    RASTER_WINDOW = int(os.getenv("RASTER_WINDOW", "2"))  # PDF pages rendered per poppler call
+    PDF_RENDER_GRAYSCALE = os.getenv("PDF_RENDER_GRAYSCALE", "false").lower() == "true"
+    PDF_TEXT_LAYER_ENABLED = os.getenv("PDF_TEXT_LAYER_ENABLED", "true").lower() == "true"  # Read digital PDFs without OCR
+    PDF_TEXT_LAYER_MIN_WORDS = int(os.getenv("PDF_TEXT_LAYER_MIN_WORDS", "20"))  # Fewer words = scanned page
+    
+    # Tiled extraction of tall or dense pages (overlapping horizontal bands, OCR'd concurrently)
+    TILE_ENABLED = os.getenv("TILE_ENABLED", "true").lower() == "true"
+    TILE_MAX_ASPECT = float(os.getenv("TILE_MAX_ASPECT", "2.0"))  # Taller pages (height/width) are split
+    TILE_MAX_LINES = int(os.getenv("TILE_MAX_LINES", "60"))  # Pages with more text lines are split
+    TILE_OVERLAP = float(os.getenv("TILE_OVERLAP", "0.08"))  # Share of the band height bands overlap by
+    TILE_MAX_BANDS = int(os.getenv("TILE_MAX_BANDS", "8"))
+    
+    # Content-aware cropping of empty margins before upload
+    CROP_ENABLED = os.getenv("CROP_ENABLED", "true").lower() == "true"
+    CROP_PADDING = int(os.getenv("CROP_PADDING", "16"))  # Pixels kept around the content
+    CROP_MIN_SAVING = float(os.getenv("CROP_MIN_SAVING", "0.05"))  # Smaller crops (share of pixels) are skipped
+    CROP_TABLE_ONLY = os.getenv("CROP_TABLE_ONLY", "false").lower() == "true"  # Also cut letterheads/footers
+    CROP_MEASURE_BYTES = os.getenv("CROP_MEASURE_BYTES", "false").lower() == "true"  # Encode with and without the crop for metrics
+    
+    # Encoding of page images uploaded to the model
+    OCR_IMAGE_FORMAT = os.getenv("OCR_IMAGE_FORMAT", "PNG")  # PNG, JPEG or WEBP
+    OCR_IMAGE_QUALITY = int(os.getenv("OCR_IMAGE_QUALITY", "85"))  # JPEG/WebP quality
+    OCR_IMAGE_GRAYSCALE = os.getenv("OCR_IMAGE_GRAYSCALE", "false").lower() == "true"
+    OCR_IMAGE_BINARIZE = os.getenv("OCR_IMAGE_BINARIZE", "false").lower() == "true"  # Black and white (Otsu)
+    
+    # Concurrency settings
+    PAGE_CONCURRENCY = int(os.getenv("PAGE_CONCURRENCY", "4"))  # Pages OCR'd in parallel per request
+    OCR_MAX_CONCURRENCY = int(os.getenv("OCR_MAX_CONCURRENCY", "16"))  # OCR calls in flight process-wide
+    
+    # OCR call scheduling (quota-aware rate limiting, adaptive concurrency, retries)
+    OCR_SCHEDULER_ENABLED = os.getenv("OCR_SCHEDULER_ENABLED", "true").lower() == "true"
+    OCR_RPM_LIMIT = float(os.getenv("OCR_RPM_LIMIT", "0"))  # Requests per minute, 0 = unlimited
+    OCR_TPM_LIMIT = float(os.getenv("OCR_TPM_LIMIT", "0"))  # Tokens per minute, 0 = unlimited
+    OCR_MIN_CONCURRENCY = int(os.getenv("OCR_MIN_CONCURRENCY", "1"))
+    OCR_INITIAL_CONCURRENCY = int(os.getenv("OCR_INITIAL_CONCURRENCY", "4"))
+    OCR_TARGET_LATENCY = float(os.getenv("OCR_TARGET_LATENCY", "20"))  # Seconds; slower calls stop growth
+    OCR_MAX_RETRIES = int(os.getenv("OCR_MAX_RETRIES", "4"))
+    OCR_RETRY_BASE_DELAY = float(os.getenv("OCR_RETRY_BASE_DELAY", "1"))  # Seconds
+    OCR_RETRY_MAX_DELAY = float(os.getenv("OCR_RETRY_MAX_DELAY", "30"))  # Seconds
+    OCR_CALL_DEADLINE = float(os.getenv("OCR_CALL_DEADLINE", "120"))  # Seconds incl. queueing and retries
+    OCR_EXPECTED_OUTPUT_TOKENS = int(os.getenv("OCR_EXPECTED_OUTPUT_TOKENS", "1500"))
+    
+    # Multi-page OCR calls (1 = one page per call)
+    OCR_BATCH_PAGES = int(os.getenv("OCR_BATCH_PAGES", "1"))  # Most pages sent in one Gemini call
+    OCR_BATCH_MAX_PIXELS = int(os.getenv("OCR_BATCH_MAX_PIXELS", str(12_000_000)))  # Pixel budget per call
+    OCR_BATCH_MAX_TOKENS = int(os.getenv("OCR_BATCH_MAX_TOKENS", "16000"))  # Image + expected output tokens per call
+    OCR_BATCH_LINGER_MS = float(os.getenv("OCR_BATCH_LINGER_MS", "50"))  # Wait for more pages before sending a partial batch
+    
+    # Worker processes for rasterization, preprocessing and encoding (0 = run in threads)
+    CPU_WORKERS = int(os.getenv("CPU_WORKERS", str(os.cpu_count() or 1)))
+    
+    # Download settings
+    DOWNLOAD_MAX_BYTES = int(os.getenv("DOWNLOAD_MAX_BYTES", str(50 * 1024 * 1024)))  # 0 = unlimited
+    DOWNLOAD_SPOOL_THRESHOLD = int(os.getenv("DOWNLOAD_SPOOL_THRESHOLD", str(8 * 1024 * 1024)))  # Bytes kept in memory
+    DOWNLOAD_CONNECT_TIMEOUT = float(os.getenv("DOWNLOAD_CONNECT_TIMEOUT", "5"))  # Seconds
+    DOWNLOAD_READ_TIMEOUT = float(os.getenv("DOWNLOAD_READ_TIMEOUT", "30"))  # Seconds
+    HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+    HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    HTTP_MAX_CONNECTIONS_PER_HOST = int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", "10"))
+    HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))  # Seconds
+    
+    # Result cache settings
+    RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+    RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "1024"))
+    RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", str(7 * 24 * 3600)))  # Seconds, 0 = never expire
+    RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", "")  # Empty disables the on-disk tier
+    RESULT_CACHE_MAX_DISK_BYTES = int(os.getenv("RESULT_CACHE_MAX_DISK_BYTES", str(512 * 1024 * 1024)))
+    
+    # Page cache settings
+    PAGE_CACHE_ENABLED = os.getenv("PAGE_CACHE_ENABLED", "true").lower() == "true"
+    PAGE_CACHE_MAX_ENTRIES = int(os.getenv("PAGE_CACHE_MAX_ENTRIES", "4096"))
+    PAGE_CACHE_HASH = os.getenv("PAGE_CACHE_HASH", "exact")  # "exact" or "perceptual"
+    
+    # Blank / duplicate page filter
+    PAGE_FILTER_ENABLED = os.getenv("PAGE_FILTER_ENABLED", "true").lower() == "true"
+    PAGE_BLANK_INK_RATIO = float(os.getenv("PAGE_BLANK_INK_RATIO", "0.0005"))  # Fraction of ink pixels below which a page is blank
+    PAGE_DUPLICATE_DISTANCE = int(os.getenv("PAGE_DUPLICATE_DISTANCE", "8"))  # Max dHash bit difference (of 256) for a duplicate
+    
+    # Batch extraction settings
+    BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "4"))  # Documents extracted concurrently
+    BATCH_MAX_DOCUMENTS = int(os.getenv("BATCH_MAX_DOCUMENTS", "10000"))  # Per job
+    BATCH_MAX_QUEUED = int(os.getenv("BATCH_MAX_QUEUED", "50000"))  # Documents waiting across all jobs
+    BATCH_JOB_TTL = float(os.getenv("BATCH_JOB_TTL", str(24 * 3600)))  # Seconds finished jobs stay pollable
     
     # API settings
     API_TITLE = "Bill Data Extraction API"
     API_VERSION = "1.0.0"
     API_DESCRIPTION = "Extract line item details from bill/invoice images"
     
+    @classmethod
+    def extraction_fingerprint(cls) -> str:
+        """Settings that change which items are extracted from a document, for result cache keys"""
+        settings = [
+            cls.MAX_IMAGE_SIZE, cls.OCR_OUTPUT_FORMAT, cls.OCR_CASCADE_MODELS, cls.OCR_CASCADE_TOLERANCE,
+            cls.PDF_RENDER_GRAYSCALE, cls.PDF_TEXT_LAYER_ENABLED, cls.PDF_TEXT_LAYER_MIN_WORDS,
+            cls.TILE_ENABLED, cls.TILE_MAX_ASPECT, cls.TILE_MAX_LINES, cls.TILE_OVERLAP, cls.TILE_MAX_BANDS,
+            cls.CROP_ENABLED, cls.CROP_PADDING, cls.CROP_MIN_SAVING, cls.CROP_TABLE_ONLY,
+            cls.OCR_IMAGE_FORMAT, cls.OCR_IMAGE_QUALITY, cls.OCR_IMAGE_GRAYSCALE, cls.OCR_IMAGE_BINARIZE,
+            cls.PAGE_FILTER_ENABLED, cls.PAGE_BLANK_INK_RATIO, cls.PAGE_DUPLICATE_DISTANCE
+        ]
+        return hashlib.sha256(repr(settings).encode()).hexdigest()[:16]
+    
     @classmethod
     def validate(cls):
         """Validate required configuration"""
-        if not cls.GEMINI_API_KEY:
+        # Offline replay never calls Gemini
+        if not cls.GEMINI_API_KEY and cls.OCR_BACKEND.lower() != "replay":
             raise ValueError(
                 "GEMINI_API_KEY not found in environment variables. "
                 "Please set it in .env file or environment."
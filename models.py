@@ -1,10 +1,11 @@
 from pydantic import BaseModel, HttpUrl, Field
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 
 class ExtractRequest(BaseModel):
     """Request model for bill extraction"""
     document: HttpUrl = Field(..., description="URL to the bill/invoice image")
+    include_timings: bool = Field(False, description="Return a per-stage timing breakdown")
 
 
 class LineItem(BaseModel):
@@ -33,8 +34,71 @@ class ExtractData(BaseModel):
     )
 
 
+class SkippedPage(BaseModel):
+    """A page that was not sent to OCR"""
+    page_no: str = Field(..., description="Page number")
+    reason: str = Field(..., description="blank or duplicate")
+    duplicate_of: Optional[str] = Field(None, description="Page this one duplicates")
+
+
+class PageSource(BaseModel):
+    """Where a page's line items came from"""
+    page_no: str = Field(..., description="Page number")
+    source: str = Field(..., description="ocr or text_layer")
+    model: Optional[str] = Field(None, description="Model that produced the items (OCR pages)")
+    tier: Optional[int] = Field(None, description="Position of the model in the cascade (0 = first)")
+    total_matches: Optional[bool] = Field(
+        None, description="Whether the items add up to the printed page total (None if no total)"
+    )
+
+
+class ExtractMetadata(BaseModel):
+    """How the document's pages were processed"""
+    skipped_pages: List[SkippedPage] = Field(
+        default_factory=list, description="Pages skipped before OCR and why"
+    )
+    pages: List[PageSource] = Field(
+        default_factory=list, description="Source (and cascade tier) of each page with items"
+    )
+
+
 class ExtractResponse(BaseModel):
     """Response model for bill extraction"""
     is_success: bool = Field(..., description="Whether extraction was successful")
     data: Optional[ExtractData] = Field(None, description="Extracted data if successful")
     error: Optional[str] = Field(None, description="Error message if unsuccessful")
+    timings: Optional[Dict[str, float]] = Field(
+        None, description="Per-stage milliseconds (summed across pages), when requested"
+    )
+    metadata: Optional[ExtractMetadata] = Field(None, description="Processing details for the document")
+
+
+class BatchExtractRequest(BaseModel):
+    """Request model for bulk bill extraction"""
+    documents: List[HttpUrl] = Field(
+        ..., min_length=1, description="URLs of the bill/invoice documents to extract"
+    )
+
+
+class BatchDocumentResult(BaseModel):
+    """Status and result of one document in a batch job"""
+    index: int = Field(..., description="Position of the document in the submitted list")
+    document: str = Field(..., description="URL of the document")
+    status: str = Field(..., description="queued, processing, succeeded or failed")
+    result: Optional[ExtractResponse] = Field(None, description="Extraction result once finished")
+
+
+class BatchJobResponse(BaseModel):
+    """Progress of a batch job with one page of per-document results"""
+    job_id: str = Field(..., description="Identifier used to poll the job")
+    status: str = Field(..., description="queued, running or completed")
+    total: int = Field(..., description="Number of documents in the job")
+    queued: int = Field(..., description="Documents waiting for a worker")
+    processing: int = Field(..., description="Documents currently being extracted")
+    succeeded: int = Field(..., description="Documents extracted successfully")
+    failed: int = Field(..., description="Documents whose extraction failed")
+    offset: int = Field(0, description="Index of the first result in this page")
+    limit: int = Field(0, description="Maximum number of results in this page")
+    results: List[BatchDocumentResult] = Field(
+        default_factory=list, description="Per-document status and results for this page"
+    )
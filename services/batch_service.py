@@ -0,0 +1,214 @@
+import asyncio
+import logging
+import time
+import uuid
+from typing import Dict, List, Optional
+from models import BatchDocumentResult, BatchJobResponse, ExtractResponse
+from services.document_pipeline import DocumentPipeline
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class BatchQueueFullError(Exception):
+    """Accepting a batch would exceed the documents queued across all jobs"""
+
+
+class BatchJob:
+    """State of one submitted batch of documents"""
+
+    def __init__(self, documents: List[str]):
+        self.job_id = uuid.uuid4().hex
+        self.documents = documents
+        self.statuses = ["queued"] * len(documents)
+        self.results: List[Optional[ExtractResponse]] = [None] * len(documents)
+        self.created_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.remaining = len(documents)
+
+    def count(self, status: str) -> int:
+        return self.statuses.count(status)
+
+    @property
+    def status(self) -> str:
+        if self.remaining == 0:
+            return "completed"
+        if self.count("queued") == len(self.documents):
+            return "queued"
+        return "running"
+
+
+class BatchJobManager:
+    """Queues batch documents for an in-process pool of extraction workers"""
+
+    def __init__(
+        self,
+        document_pipeline: DocumentPipeline,
+        workers: int = 4,
+        max_documents: int = 10000,
+        job_ttl_seconds: float = 24 * 3600,
+        max_queued: int = 50000
+    ):
+        """
+        Initialize batch job manager
+
+        Args:
+            document_pipeline: Pipeline used to extract each document
+            workers: Number of documents extracted concurrently
+            max_documents: Maximum number of documents accepted per job
+            job_ttl_seconds: How long finished jobs stay available for polling
+            max_queued: Maximum number of documents waiting across all jobs
+        """
+        self.document_pipeline = document_pipeline
+        self.workers = max(1, workers)
+        self.max_documents = max_documents
+        self.job_ttl_seconds = job_ttl_seconds
+        self.max_queued = max_queued
+
+        self.jobs: Dict[str, BatchJob] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self):
+        """Start the worker tasks (call from the running event loop)"""
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [
+            asyncio.create_task(self._worker(worker_id), name=f"batch-worker-{worker_id}")
+            for worker_id in range(self.workers)
+        ]
+        self._tasks.append(asyncio.create_task(self._expiry_loop(), name="batch-expiry"))
+        logger.info(f"Started {self.workers} batch worker(s)")
+
+    async def stop(self):
+        """Cancel the worker tasks"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, documents: List[str]) -> BatchJob:
+        """
+        Queue a batch of documents for extraction
+
+        Args:
+            documents: Document URLs
+
+        Returns:
+            The created BatchJob
+
+        Raises:
+            ValueError: If the batch exceeds the per-job document limit
+            BatchQueueFullError: If the documents already queued leave no room for the batch
+        """
+        if len(documents) > self.max_documents:
+            raise ValueError(
+                f"Batch contains {len(documents)} documents; the limit is {self.max_documents}"
+            )
+        if self._queue is None:
+            self.start()
+
+        queued = self._queue.qsize()
+        if queued + len(documents) > self.max_queued:
+            raise BatchQueueFullError(
+                f"{queued} documents are already queued; the limit is {self.max_queued}, try again later"
+            )
+
+        job = BatchJob(documents)
+        self.jobs[job.job_id] = job
+        for index in range(len(documents)):
+            self._queue.put_nowait((job.job_id, index))
+
+        logger.info(f"Queued batch job {job.job_id} with {len(documents)} document(s)")
+        return job
+
+    def get_status(self, job_id: str, offset: int = 0, limit: int = 100) -> Optional[BatchJobResponse]:
+        """
+        Build the poll response for a job
+
+        Args:
+            job_id: Job identifier
+            offset: Index of the first per-document result to include
+            limit: Maximum number of per-document results to include
+
+        Returns:
+            BatchJobResponse or None if the job is unknown or expired
+        """
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        if self._expired(job, time.time()):
+            del self.jobs[job_id]
+            return None
+
+        end = min(offset + limit, len(job.documents))
+        results = [
+            BatchDocumentResult(
+                index=index,
+                document=job.documents[index],
+                status=job.statuses[index],
+                result=job.results[index]
+            )
+            for index in range(offset, end)
+        ]
+
+        return BatchJobResponse(
+            job_id=job.job_id,
+            status=job.status,
+            total=len(job.documents),
+            queued=job.count("queued"),
+            processing=job.count("processing"),
+            succeeded=job.count("succeeded"),
+            failed=job.count("failed"),
+            offset=offset,
+            limit=limit,
+            results=results
+        )
+
+    async def _worker(self, worker_id: int):
+        while True:
+            job_id, index = await self._queue.get()
+            try:
+                job = self.jobs.get(job_id)
+                if job is None:
+                    continue
+
+                job.statuses[index] = "processing"
+                try:
+                    with metrics.IN_FLIGHT.track_inprogress(kind="batch_documents"):
+                        response = await self.document_pipeline.extract(job.documents[index])
+                except Exception as e:
+                    logger.error(f"Batch worker {worker_id} failed on job {job_id}[{index}]: {e}")
+                    response = ExtractResponse(is_success=False, error=f"Internal server error: {str(e)}")
+
+                metrics.REQUESTS.inc(endpoint="batch", outcome="success" if response.is_success else "failure")
+                job.results[index] = response
+                job.statuses[index] = "succeeded" if response.is_success else "failed"
+                job.remaining -= 1
+                if job.remaining == 0:
+                    job.finished_at = time.time()
+                    logger.info(
+                        f"Batch job {job_id} completed: {job.count('succeeded')} succeeded, "
+                        f"{job.count('failed')} failed"
+                    )
+            finally:
+                self._queue.task_done()
+
+    def _expired(self, job: BatchJob, now: float) -> bool:
+        return job.finished_at is not None and now - job.finished_at > self.job_ttl_seconds
+
+    def _expire_jobs(self):
+        """Drop finished jobs older than the TTL"""
+        now = time.time()
+        expired = [job_id for job_id, job in self.jobs.items() if self._expired(job, now)]
+        for job_id in expired:
+            del self.jobs[job_id]
+        if expired:
+            logger.info(f"Expired {len(expired)} finished batch job(s)")
+
+    async def _expiry_loop(self):
+        """Purge expired jobs periodically, whether or not new jobs arrive"""
+        while True:
+            await asyncio.sleep(min(60.0, max(1.0, self.job_ttl_seconds)))
+            self._expire_jobs()
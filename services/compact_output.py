@@ -0,0 +1,79 @@
+import logging
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+class CompactOutput:
+    """Columnar model output: one header row plus a value array per line item
+
+    A page is answered as::
+
+        {"page_type": "Pharmacy",
+         "columns": ["item_name", "item_quantity", "item_rate", "item_amount"],
+         "rows": [["Paracetamol 500mg Tab", 2, 1.5, 3], ...],
+         "extracted_total": 3, "actual_bill_total": 3}
+
+    instead of repeating the four key names in every line item. Decoding
+    turns it back into the usual ``line_items`` shape, so caching,
+    reconciliation and transformation are unchanged.
+    """
+
+    COLUMNS = ["item_name", "item_quantity", "item_rate", "item_amount"]
+
+    @staticmethod
+    def decode(data: Any) -> Any:
+        """
+        Convert a columnar page into the line_items shape
+
+        Args:
+            data: Parsed model response for one page
+
+        Returns:
+            The page with ``line_items`` built from ``rows``; anything that
+            is not a columnar page is returned unchanged
+        """
+        if not isinstance(data, dict) or not isinstance(data.get("rows"), list):
+            return data
+
+        columns = data.get("columns")
+        if not isinstance(columns, list) or "item_amount" not in columns:
+            columns = CompactOutput.COLUMNS
+        width = len(columns)
+
+        rows = data["rows"]
+        line_items: List[Dict[str, Any]] = [
+            dict(zip(columns, row)) for row in rows if type(row) is list and len(row) == width
+        ]
+        skipped = len(rows) - len(line_items)
+        if skipped:
+            logger.warning(f"Skipped {skipped} compact row(s) not matching the {width} columns")
+
+        page = {key: value for key, value in data.items() if key not in ("columns", "rows")}
+        page["line_items"] = line_items
+        return page
+
+    @staticmethod
+    def decode_pages(data: Any) -> Any:
+        """
+        Decode every page of a multi-page response
+
+        A header row given once for the whole response applies to every
+        page that has none of its own.
+
+        Args:
+            data: Parsed multi-page model response ({"pages": [...]} or a list)
+
+        Returns:
+            The response with each columnar page decoded
+        """
+        if isinstance(data, dict) and isinstance(data.get("pages"), list):
+            columns = data.get("columns")
+            pages = [
+                {"columns": columns, **page} if isinstance(page, dict) and columns is not None else page
+                for page in data["pages"]
+            ]
+            return {**data, "pages": [CompactOutput.decode(page) for page in pages]}
+        if isinstance(data, list):
+            return [CompactOutput.decode(page) for page in data]
+        return data
@@ -0,0 +1,189 @@
+import logging
+from typing import List, Optional, Tuple
+from PIL import Image
+from services.document_processor import DocumentProcessor, ImageEncoding
+
+logger = logging.getLogger(__name__)
+
+Box = Tuple[int, int, int, int]
+
+
+class CropResult:
+    """A cropped page and what the crop saved"""
+
+    def __init__(self, image: Image.Image, box: Optional[Box], pixels_saved: int = 0, bytes_saved: int = 0):
+        self.image = image
+        # (left, top, right, bottom) in the original image, None when not cropped
+        self.box = box
+        self.pixels_saved = pixels_saved
+        # Upload size without the crop minus with it (0 unless the cropper measures bytes)
+        self.bytes_saved = bytes_saved
+
+
+class ContentCropper:
+    """Cuts empty margins (and optionally everything around the item table) off a page before upload
+
+    The content box comes from the row and column ink projections of the
+    page, which are computed in C by box-averaging the ink mask down to a
+    single column and a single row. Rows or columns that are almost entirely
+    dark at the edges (scanner borders, shadows) are not treated as content.
+    """
+
+    # Longest side of the grayscale copy projections are measured on
+    ANALYSIS_SIZE = 1024
+
+    # Rows/columns with more ink than this share hold content
+    MIN_INK = 0.002
+
+    # Rows/columns darker than this share are scan borders, not content
+    MAX_INK = 0.9
+
+    def __init__(
+        self,
+        padding: int = 16,
+        min_saving: float = 0.05,
+        table_only: bool = False,
+        encoding: Optional[ImageEncoding] = None,
+        measure_bytes: bool = False
+    ):
+        """
+        Initialize content cropper
+
+        Args:
+            padding: Pixels of margin kept around the content
+            min_saving: Smallest share of the pixels a crop must remove to be applied
+            table_only: Also cut letterheads and footers, keeping the largest
+                block of closely spaced text lines (the item table) and the
+                lines right below it (totals)
+            encoding: Upload encoding the saved bytes are measured in
+                (defaults to lossless PNG)
+            measure_bytes: Encode each cropped page with and without the crop
+                to report the upload bytes saved (two extra full encodes per
+                page, so off unless the figure is wanted)
+        """
+        self.padding = padding
+        self.min_saving = min_saving
+        self.table_only = table_only
+        self.encoding = encoding or ImageEncoding()
+        self.measure_bytes = measure_bytes
+
+    @classmethod
+    def _span(cls, shares: List[float]) -> Optional[Tuple[int, int]]:
+        """First and past-the-last index holding content, or None if there is none"""
+        content = [index for index, share in enumerate(shares) if cls.MIN_INK < share < cls.MAX_INK]
+        if not content:
+            return None
+        return content[0], content[-1] + 1
+
+    @classmethod
+    def _table_span(cls, rows: List[float], top: int, bottom: int) -> Tuple[int, int]:
+        """
+        Rows of the item table within [top, bottom)
+
+        Text lines are grouped into blocks wherever the gap between two lines
+        is much wider than usual. The block with the most lines is the table;
+        blocks following it closely (totals, amount in words) are kept too.
+        """
+        lines = []
+        start = None
+        for index in range(top, bottom):
+            if cls.MIN_INK < rows[index] < cls.MAX_INK:
+                if start is None:
+                    start = index
+            elif start is not None:
+                lines.append((start, index))
+                start = None
+        if start is not None:
+            lines.append((start, bottom))
+        if len(lines) < 3:
+            return top, bottom
+
+        gaps = sorted(lines[index + 1][0] - lines[index][1] for index in range(len(lines) - 1))
+        # A gap this much wider than the typical line spacing separates blocks
+        limit = max(3, 3 * gaps[len(gaps) // 2])
+        blocks = [[lines[0]]]
+        for previous, line in zip(lines, lines[1:]):
+            if line[0] - previous[1] > limit:
+                blocks.append([])
+            blocks[-1].append(line)
+
+        largest = max(range(len(blocks)), key=lambda index: len(blocks[index]))
+        end = largest
+        while end + 1 < len(blocks) and blocks[end + 1][0][0] - blocks[end][-1][1] <= 2 * limit:
+            end += 1
+        return blocks[largest][0][0], blocks[end][-1][1]
+
+    def find_box(self, image: Image.Image) -> Optional[Box]:
+        """
+        Locate the content of a page
+
+        Args:
+            image: PIL Image of the page
+
+        Returns:
+            (left, top, right, bottom) including padding, or None if the page
+            is blank or the crop would save less than min_saving
+        """
+        rows, columns = DocumentProcessor.ink_projection(image, self.ANALYSIS_SIZE)
+        horizontal = self._span(columns)
+        if horizontal is None:
+            return None
+        scale_x = image.width / len(columns)
+        left = int(horizontal[0] * scale_x)
+        right = min(image.width, int(horizontal[1] * scale_x + 0.999))
+        if right - left < image.width:
+            # Measure rows between the side margins only, so a dark scan border
+            # down one side doesn't make every row look like content
+            rows, _ = DocumentProcessor.ink_projection(image.crop((left, 0, right, image.height)), self.ANALYSIS_SIZE)
+
+        vertical = self._span(rows)
+        if vertical is None:
+            return None
+        if self.table_only:
+            vertical = self._table_span(rows, *vertical)
+
+        # Analysis coordinates → page pixels, widened by the padding
+        scale_y = image.height / len(rows)
+        box = (
+            max(0, left - self.padding),
+            max(0, int(vertical[0] * scale_y) - self.padding),
+            min(image.width, right + self.padding),
+            min(image.height, int(vertical[1] * scale_y + 0.999) + self.padding)
+        )
+        kept = (box[2] - box[0]) * (box[3] - box[1])
+        if kept >= (1 - self.min_saving) * image.width * image.height:
+            return None
+        return box
+
+    def crop(self, image: Image.Image) -> CropResult:
+        """
+        Crop a page to its content (CPU-bound; run it off the event loop)
+
+        Args:
+            image: Preprocessed PIL Image of the page
+
+        Returns:
+            CropResult with the image to upload (the original when nothing
+            worth cutting was found)
+        """
+        box = self.find_box(image)
+        if box is None:
+            return CropResult(image, None)
+
+        left, top, right, bottom = box
+        cropped = image.crop(box)
+        bytes_saved = 0
+        if self.measure_bytes:
+            bytes_saved = len(self._encode(image)) - len(self._encode(cropped))
+        pixels_saved = image.width * image.height - (right - left) * (bottom - top)
+        return CropResult(cropped, box, pixels_saved, bytes_saved)
+
+    def _encode(self, image: Image.Image) -> bytes:
+        """Encode an image the way it is uploaded"""
+        return DocumentProcessor.image_to_bytes(
+            image,
+            self.encoding.format,
+            quality=self.encoding.quality,
+            grayscale=self.encoding.grayscale,
+            binarize=self.encoding.binarize
+        )
@@ -0,0 +1,125 @@
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Optional, Tuple
+from PIL import Image
+from config import config
+
+logger = logging.getLogger(__name__)
+
+# (mode, size, raw pixel bytes): what pages look like on the way to and from workers
+PackedImage = Tuple[str, Tuple[int, int], bytes]
+
+# Modes whose raw bytes round-trip without extra state (palette images don't)
+RAW_MODES = ("1", "L", "LA", "RGB", "RGBA", "CMYK", "I", "F")
+
+
+def pack_image(image: Image.Image) -> PackedImage:
+    """
+    Flatten an image into a raw buffer for handing to a worker process
+
+    Args:
+        image: PIL Image object
+
+    Returns:
+        (mode, size, raw bytes)
+    """
+    if image.mode not in RAW_MODES:
+        image = image.convert("RGB")
+    return image.mode, image.size, image.tobytes()
+
+
+def unpack_image(packed: PackedImage) -> Image.Image:
+    """
+    Rebuild an image from pack_image output
+
+    Args:
+        packed: (mode, size, raw bytes)
+
+    Returns:
+        PIL Image object
+    """
+    mode, size, raw = packed
+    return Image.frombytes(mode, size, raw)
+
+
+class CPUPool:
+    """Process pool for CPU-bound image work (rasterize, preprocess, encode)
+
+    The pool only exists between start() and shutdown() (the server starts it
+    in its lifespan). Until then, or with CPU_WORKERS=0, the functions run in
+    the calling thread, so scripts importing the services need no
+    ``if __name__ == "__main__"`` guard.
+    """
+
+    _executor: Optional[ProcessPoolExecutor] = None
+    _workers = 0
+    _lock = threading.Lock()
+
+    @classmethod
+    def start(cls, workers: Optional[int] = None):
+        """
+        Start the worker processes
+
+        Args:
+            workers: Pool size (defaults to Config.CPU_WORKERS; 0 keeps work in threads)
+        """
+        workers = config.CPU_WORKERS if workers is None else workers
+        with cls._lock:
+            if cls._executor is not None or workers <= 0:
+                return
+            cls._workers = workers
+            cls._executor = cls._create_executor(workers)
+            logger.info(f"Started CPU pool with {workers} worker process(es)")
+
+    @staticmethod
+    def _create_executor(workers: int) -> ProcessPoolExecutor:
+        # spawn: forking a process that already runs threads is unsafe
+        return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+    @classmethod
+    def _replace_broken(cls, broken: ProcessPoolExecutor):
+        """Swap a pool whose worker died for a fresh one (once, however many callers saw it break)"""
+        with cls._lock:
+            if cls._executor is not broken:
+                return
+            broken.shutdown(wait=False, cancel_futures=True)
+            cls._executor = cls._create_executor(cls._workers)
+            logger.warning(f"CPU pool worker died, restarted the pool with {cls._workers} worker process(es)")
+
+    @classmethod
+    def executor(cls) -> Optional[ProcessPoolExecutor]:
+        """Shared process pool (None when not started)"""
+        return cls._executor
+
+    @classmethod
+    def run(cls, fn: Callable, *args) -> Any:
+        """
+        Run a picklable function in the pool, blocking the calling thread
+
+        Intended for worker threads (page rendering, OCR calls); the wait
+        does not hold the GIL. If a worker process dies (OOM kill, crash in
+        a native decoder) the pool is replaced and the call retried once.
+        """
+        executor = cls.executor()
+        if executor is None:
+            return fn(*args)
+        try:
+            return executor.submit(fn, *args).result()
+        except BrokenProcessPool:
+            cls._replace_broken(executor)
+        executor = cls.executor()
+        if executor is None:
+            # Shut down meanwhile
+            return fn(*args)
+        return executor.submit(fn, *args).result()
+
+    @classmethod
+    def shutdown(cls):
+        """Stop the worker processes"""
+        with cls._lock:
+            if cls._executor is not None:
+                cls._executor.shutdown(wait=False, cancel_futures=True)
+                cls._executor = None
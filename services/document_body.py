@@ -0,0 +1,140 @@
+import mmap
+import os
+import tempfile
+from typing import Optional, Union
+
+
+class DocumentTooLargeError(ValueError):
+    """Document body exceeds the configured download limit"""
+
+    def __init__(self, max_bytes: int):
+        super().__init__(f"Document exceeds the maximum size of {max_bytes} bytes")
+        self.max_bytes = max_bytes
+
+
+class UnsupportedDocumentError(ValueError):
+    """Body is clearly not a PDF or image (e.g. an HTML error page)"""
+
+
+class SpooledBody(mmap.mmap):
+    """Read-only memory map of a document spooled to a temp file
+
+    Behaves like bytes for slicing, len() and hashing without holding the
+    body in process memory; ``path`` lets decoders (poppler, worker
+    processes) read the file directly. close() also deletes the file.
+    """
+
+    path: str
+
+    @classmethod
+    def open(cls, path: str) -> "SpooledBody":
+        """
+        Map a spool file
+
+        Args:
+            path: Non-empty file to map; owned (and deleted) by the body
+
+        Returns:
+            SpooledBody over the file
+        """
+        with open(path, "rb") as f:
+            body = cls(f.fileno(), 0, access=mmap.ACCESS_READ)
+        body.path = path
+        return body
+
+    def close(self):
+        super().close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+
+DocumentContent = Union[bytes, SpooledBody]
+
+
+class BodySpooler:
+    """Accumulates a streamed body under a size cap, moving to disk past a threshold
+
+    Memory held per body is bounded by ``spool_threshold`` (twice that while
+    the final bytes object is built); anything larger lives in a temp file.
+    """
+
+    # Leading bytes kept for type sniffing
+    HEAD_BYTES = 1024
+
+    def __init__(self, max_bytes: int, spool_threshold: int):
+        """
+        Initialize spooler
+
+        Args:
+            max_bytes: Hard limit on the body size (0 = unlimited)
+            spool_threshold: Bodies larger than this are written to a temp file
+        """
+        self.max_bytes = max_bytes
+        self.spool_threshold = spool_threshold
+        self.size = 0
+        self.head = b""
+        self._buffer: Optional[bytearray] = bytearray()
+        self._file = None
+
+    def check_declared_size(self, content_length: Optional[str]):
+        """
+        Reject early from a Content-Length header
+
+        Raises:
+            DocumentTooLargeError: If the declared size is over the limit
+        """
+        if self.max_bytes and content_length and content_length.isdigit() and int(content_length) > self.max_bytes:
+            raise DocumentTooLargeError(self.max_bytes)
+
+    def write(self, chunk: bytes):
+        """
+        Append a chunk
+
+        Raises:
+            DocumentTooLargeError: Once the body grows past max_bytes
+        """
+        if len(self.head) < self.HEAD_BYTES:
+            self.head += chunk[:self.HEAD_BYTES - len(self.head)]
+        self.size += len(chunk)
+        if self.max_bytes and self.size > self.max_bytes:
+            self.discard()
+            raise DocumentTooLargeError(self.max_bytes)
+
+        if self._file is None and self.size > self.spool_threshold:
+            self._file = tempfile.NamedTemporaryFile(prefix="document-", delete=False)
+            self._file.write(self._buffer)
+            self._buffer = None
+
+        if self._file is not None:
+            self._file.write(chunk)
+        else:
+            self._buffer += chunk
+
+    def finish(self) -> DocumentContent:
+        """
+        Complete the body
+
+        Returns:
+            bytes for small bodies, a SpooledBody for spooled ones
+        """
+        if self._file is None:
+            content = bytes(self._buffer)
+            self._buffer = None
+            return content
+
+        self._file.close()
+        path, self._file = self._file.name, None
+        return SpooledBody.open(path)
+
+    def discard(self):
+        """Drop whatever has been received (removes the temp file)"""
+        self._buffer = None
+        if self._file is not None:
+            self._file.close()
+            try:
+                os.unlink(self._file.name)
+            except FileNotFoundError:
+                pass
+            self._file = None
@@ -0,0 +1,411 @@
+import asyncio
+import itertools
+import json
+import logging
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple, Union
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from config import config
+from models import ExtractResponse, ExtractData, ExtractMetadata, PagewiseLineItems, PageSource
+from services.document_body import DocumentContent, DocumentTooLargeError, UnsupportedDocumentError
+from services.document_processor import DocumentProcessor
+from services.ocr_service import OCRService
+from services.page_filter import PageFilter
+from services.page_pipeline import PagePipeline
+from services.reconciliation_service import ReconciliationService
+from services.result_cache import ResultCache
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    """One shared in-flight extraction and the number of callers awaiting it"""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+        self.abandoned = False
+
+
+class DocumentPipeline:
+    """End-to-end extraction for one document: download, cache, pages, reconciliation"""
+
+    def __init__(self, page_pipeline: PagePipeline, result_cache: Optional[ResultCache] = None, coalesce: bool = True):
+        """
+        Initialize document pipeline
+
+        Args:
+            page_pipeline: Pipeline running OCR over the document's pages
+            result_cache: Optional cache of complete responses
+            coalesce: Share one extraction among concurrent requests for the
+                same URL or content (off only for load tests)
+        """
+        self.page_pipeline = page_pipeline
+        self.result_cache = result_cache
+        self.coalesce = coalesce
+        # Single-flight maps: concurrent duplicates share one extraction
+        self._url_flights: Dict[str, _Flight] = {}
+        self._content_flights: Dict[str, _Flight] = {}
+
+    async def extract(self, url: str) -> ExtractResponse:
+        """
+        Extract line items from the document at a URL
+
+        Concurrent calls for the same (normalized) URL share one download and
+        extraction and receive the same response.
+
+        Args:
+            url: URL of the bill/invoice document
+
+        Returns:
+            ExtractResponse with extracted data or error
+        """
+        return await self._coalesce(self._url_flights, self.normalize_url(url), "url", lambda: self._extract_url(url))
+
+    async def extract_content(
+        self,
+        content: DocumentContent,
+        content_type: str = "",
+        source: str = "",
+        release: bool = False
+    ) -> ExtractResponse:
+        """
+        Extract line items from downloaded document bytes
+
+        Args:
+            content: Raw document bytes
+            content_type: Content-Type of the document
+            source: URL or file name (used for type sniffing and logging)
+            release: Free the body (DocumentProcessor.release) once no
+                extraction needs it any more
+
+        Returns:
+            ExtractResponse with extracted data or error
+        """
+        cleanup = (lambda: DocumentProcessor.release(content)) if release else None
+        try:
+            digest = await asyncio.to_thread(ResultCache.digest, content)
+        except BaseException:
+            if cleanup is not None:
+                cleanup()
+            raise
+        return await self._coalesce(
+            self._content_flights,
+            digest,
+            "content",
+            lambda: self._final_response(self.iter_extract_content(content, content_type, source, digest)),
+            cleanup
+        )
+
+    @staticmethod
+    def normalize_url(url: str) -> str:
+        """
+        Canonical form of a URL for request coalescing
+
+        Lower-cases scheme and host, drops default ports and the fragment,
+        and sorts query parameters.
+
+        Args:
+            url: Document URL
+
+        Returns:
+            Normalized URL
+        """
+        parts = urlsplit(url.strip())
+        scheme = parts.scheme.lower()
+        netloc = (parts.hostname or "").lower()
+        if parts.port and (scheme, parts.port) not in (("http", 80), ("https", 443)):
+            netloc = f"{netloc}:{parts.port}"
+        if parts.username:
+            netloc = f"{parts.username}@{netloc}"
+        query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+        return urlunsplit((scheme, netloc, parts.path or "/", query, ""))
+
+    async def _coalesce(
+        self,
+        flights: Dict[str, _Flight],
+        key: str,
+        kind: str,
+        factory: Callable[[], Awaitable[ExtractResponse]],
+        cleanup: Optional[Callable[[], None]] = None
+    ) -> ExtractResponse:
+        """
+        Run `factory` once per key among concurrent callers
+
+        The shared task is shielded from any single caller's cancellation and
+        is only cancelled when every caller awaiting it has gone away. The
+        entry is dropped as soon as the task finishes, so failures are not
+        remembered and the next request starts afresh. `cleanup` frees the
+        caller's inputs: when the shared task finishes if this caller started
+        it, straight away otherwise.
+        """
+        if not self.coalesce:
+            try:
+                return await factory()
+            finally:
+                if cleanup is not None:
+                    cleanup()
+
+        flight = flights.get(key)
+        if flight is None or flight.abandoned:
+            flight = _Flight(asyncio.ensure_future(factory()))
+            flights[key] = flight
+
+            def forget(_, key=key, flight=flight):
+                if flights.get(key) is flight:
+                    del flights[key]
+
+            flight.task.add_done_callback(forget)
+            if cleanup is not None:
+                flight.task.add_done_callback(lambda _: cleanup())
+        else:
+            logger.info(f"Joining in-flight extraction ({kind})")
+            metrics.COALESCED_REQUESTS.inc(key=kind)
+            if cleanup is not None:
+                cleanup()
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            flight.waiters -= 1
+            if flight.waiters == 0 and not flight.task.done():
+                flight.abandoned = True
+                flight.task.cancel()
+
+    async def _extract_url(self, url: str) -> ExtractResponse:
+        """Download a document and extract it (coalesced on content)"""
+        document = await self._download(url)
+        if isinstance(document, ExtractResponse):
+            return document
+        content, content_type = document
+        return await self.extract_content(content, content_type, url, release=True)
+
+    @staticmethod
+    async def _download(url: str) -> Union[Tuple[DocumentContent, str], ExtractResponse]:
+        """Fetch a document, or return the error response to send instead"""
+        try:
+            # Step 1: Download the document
+            document = await DocumentProcessor.fetch_document_async(url)
+        except (DocumentTooLargeError, UnsupportedDocumentError) as e:
+            logger.warning(f"Rejected document {url}: {e}")
+            return ExtractResponse(is_success=False, error=str(e))
+        except Exception as e:
+            logger.error(f"Unexpected error during extraction: {e}", exc_info=True)
+            return ExtractResponse(
+                is_success=False,
+                error=f"Internal server error: {str(e)}"
+            )
+
+        if document is None:
+            return ExtractResponse(
+                is_success=False,
+                error="Failed to download document from provided URL"
+            )
+        return document
+
+    async def iter_extract(self, url: str) -> AsyncIterator[Union[PagewiseLineItems, ExtractResponse]]:
+        """
+        Extract the document at a URL, yielding pages as they complete
+
+        Args:
+            url: URL of the bill/invoice document
+
+        Yields:
+            PagewiseLineItems per finished page, then the final ExtractResponse
+        """
+        document = await self._download(url)
+        if isinstance(document, ExtractResponse):
+            yield document
+            return
+
+        content, content_type = document
+        try:
+            async for event in self.iter_extract_content(content, content_type, url):
+                yield event
+        finally:
+            DocumentProcessor.release(content)
+
+    async def iter_extract_content(
+        self,
+        content: DocumentContent,
+        content_type: str = "",
+        source: str = "",
+        digest: Optional[str] = None
+    ) -> AsyncIterator[Union[PagewiseLineItems, ExtractResponse]]:
+        """
+        Extract downloaded document bytes, yielding pages as they complete
+
+        Args:
+            content: Raw document bytes
+            content_type: Content-Type of the document
+            source: URL or file name (used for type sniffing and logging)
+            digest: ResultCache.digest of the content, if already computed
+
+        Yields:
+            PagewiseLineItems per finished page (in completion order), then
+            the final ExtractResponse with pages in page order
+        """
+        try:
+            # Serve repeated documents from the cache (keyed on content, not URL)
+            cache_key = None
+            if self.result_cache is not None:
+                if digest is None:
+                    digest = await asyncio.to_thread(ResultCache.digest, content)
+                cache_key = ResultCache.make_key(
+                    digest, self.page_pipeline.model_key, OCRService.PROMPT_VERSION, config.extraction_fingerprint()
+                )
+                cached_response = await self.result_cache.get_async(cache_key)
+                if cached_response is not None:
+                    logger.info(f"Result cache hit for document: {source}")
+                    if cached_response.data is not None:
+                        for page in cached_response.data.pagewise_line_items:
+                            yield page
+                    yield cached_response
+                    return
+
+            # Pages are rendered lazily; peek the first one to detect undecodable documents
+            page_tiler = self.page_pipeline.page_tiler
+            tall_size, tall_aspect = None, config.TILE_MAX_ASPECT
+            if page_tiler is not None:
+                # Only pages tall enough to be cut into bands are decoded past MAX_IMAGE_SIZE
+                tall_size, tall_aspect = page_tiler.decode_size(config.MAX_IMAGE_SIZE), page_tiler.max_aspect
+            pages = DocumentProcessor.iter_pages(
+                content,
+                content_type,
+                source,
+                window=config.RASTER_WINDOW,
+                max_size=config.MAX_IMAGE_SIZE,
+                grayscale=config.PDF_RENDER_GRAYSCALE,
+                text_layer=config.PDF_TEXT_LAYER_ENABLED,
+                tall_size=tall_size,
+                tall_aspect=tall_aspect
+            )
+            with metrics.timed("rasterize"):
+                first_page = await asyncio.to_thread(next, pages, None)
+            if first_page is None:
+                yield ExtractResponse(
+                    is_success=False,
+                    error="Failed to download document from provided URL"
+                )
+                return
+
+            # Step 2 & 3: Render and process pages concurrently, skipping blank and repeated pages
+            page_filter = self.create_page_filter()
+            page_sources: List[PageSource] = []
+            failed_pages: List[int] = []
+            all_pagewise_items = []
+            async for page in self.page_pipeline.iter_page_results(
+                itertools.chain([first_page], pages), page_filter, page_sources, failed_pages
+            ):
+                all_pagewise_items.append(page)
+                yield page
+            all_pagewise_items.sort(key=lambda page: int(page.page_no))
+            metadata = ExtractMetadata(
+                skipped_pages=sorted(
+                    page_filter.skipped if page_filter is not None else [], key=lambda page: int(page.page_no)
+                ),
+                pages=sorted(page_sources, key=lambda page: int(page.page_no))
+            )
+
+            if not all_pagewise_items:
+                yield ExtractResponse(
+                    is_success=False,
+                    error="No line items could be extracted from the document",
+                    metadata=metadata
+                )
+                return
+
+            # Step 4: Calculate reconciled amount across all pages
+            with metrics.timed("reconcile"):
+                reconciled_amount = ReconciliationService.calculate_total(all_pagewise_items)
+                total_item_count = ReconciliationService.count_items(all_pagewise_items)
+
+            # Step 5: Prepare response
+            extract_data = ExtractData(
+                pagewise_line_items=all_pagewise_items,
+                total_item_count=total_item_count,
+                reconciled_amount=reconciled_amount
+            )
+
+            logger.info(
+                f"Extraction successful: {len(all_pagewise_items)} page(s) with items, {total_item_count} items, "
+                f"total amount: {reconciled_amount}"
+            )
+
+            response = ExtractResponse(
+                is_success=True,
+                data=extract_data,
+                metadata=metadata
+            )
+            # Pages lost to transient errors (quota, timeouts) or cut off must not stick for the cache TTL
+            if cache_key is not None and not failed_pages:
+                await self.result_cache.set_async(cache_key, response)
+            elif failed_pages:
+                logger.info(f"Not caching response: page(s) {sorted(failed_pages)} failed or were cut off")
+            yield response
+
+        except Exception as e:
+            logger.error(f"Unexpected error during extraction: {e}", exc_info=True)
+            yield ExtractResponse(
+                is_success=False,
+                error=f"Internal server error: {str(e)}"
+            )
+
+    @staticmethod
+    def create_page_filter() -> Optional[PageFilter]:
+        """Blank/duplicate filter for one document (None when disabled)"""
+        if not config.PAGE_FILTER_ENABLED:
+            return None
+        return PageFilter(
+            blank_ink_ratio=config.PAGE_BLANK_INK_RATIO,
+            duplicate_distance=config.PAGE_DUPLICATE_DISTANCE
+        )
+
+    @staticmethod
+    async def stream_records(
+        events: AsyncIterator[Union[PagewiseLineItems, ExtractResponse]],
+        sse: bool = False
+    ) -> AsyncIterator[str]:
+        """
+        Serialize extraction events as NDJSON lines or Server-Sent Events
+
+        Each finished page becomes a ``page`` record; the stream ends with a
+        ``summary`` record carrying success, totals and any error.
+
+        Args:
+            events: Output of iter_extract / iter_extract_content
+            sse: Emit text/event-stream frames instead of NDJSON
+
+        Yields:
+            Encoded records
+        """
+        async for event in events:
+            if isinstance(event, PagewiseLineItems):
+                record_type = "page"
+                record = {"type": record_type, "page": event.model_dump()}
+            else:
+                record_type = "summary"
+                record = {
+                    "type": record_type,
+                    "is_success": event.is_success,
+                    "total_item_count": event.data.total_item_count if event.data else 0,
+                    "reconciled_amount": event.data.reconciled_amount if event.data else 0.0,
+                    "error": event.error,
+                    "metadata": event.metadata.model_dump() if event.metadata else None
+                }
+
+            payload = json.dumps(record)
+            if sse:
+                yield f"event: {record_type}\ndata: {payload}\n\n"
+            else:
+                yield payload + "\n"
+
+    @staticmethod
+    async def _final_response(events: AsyncIterator[Union[PagewiseLineItems, ExtractResponse]]) -> ExtractResponse:
+        """Drain an event stream and return its final ExtractResponse"""
+        response = None
+        async for event in events:
+            if isinstance(event, ExtractResponse):
+                response = event
+        return response
@@ -1,15 +1,149 @@
+import asyncio
+import hashlib
+import math
+import os
+import re
+import tempfile
 import requests
+import httpx
 from PIL import Image
 from io import BytesIO
-from typing import Optional
+from typing import Iterator, List, Optional, Union
 import logging
+from config import config
+from services.http_client import HTTPClient
+from services.document_body import (
+    BodySpooler, DocumentContent, SpooledBody, UnsupportedDocumentError
+)
+from services.cpu_pool import CPUPool, PackedImage, pack_image, unpack_image
+from services.text_layer import TextLayerExtractor, TextLayerPage
+from services import metrics
 
 logger = logging.getLogger(__name__)
 
 
+# Worker-process entry points: pages travel as raw (mode, size, bytes) buffers
+
+def _render_pdf_window(pdf_path: str, dpi: int, first_page: int, last_page: int,
+                       grayscale: bool) -> List[PackedImage]:
+    from pdf2image import convert_from_path
+    
+    images = convert_from_path(
+        pdf_path,
+        dpi=dpi,
+        first_page=first_page,
+        last_page=last_page,
+        grayscale=grayscale
+    )
+    return [pack_image(image) for image in images]
+
+
+def _extract_text_layer(pdf_path: str, page_count: int, min_words: int) -> dict:
+    return TextLayerExtractor.extract(pdf_path, page_count, min_words)
+
+
+def _decode_image(
+    content: Union[bytes, str],
+    max_size: Optional[tuple],
+    tall_size: Optional[tuple] = None,
+    tall_aspect: float = 2.0
+) -> Optional[PackedImage]:
+    image = DocumentProcessor._open_image(content)
+    if image is None:
+        return None
+    if max_size is not None:
+        box = DocumentProcessor.page_box(image.size, max_size, tall_size, tall_aspect)
+        image = DocumentProcessor.preprocess_image(image, box)
+    return pack_image(image)
+
+
+def _preprocess_packed(packed: PackedImage, max_size: tuple) -> PackedImage:
+    return pack_image(DocumentProcessor.preprocess_image(unpack_image(packed), max_size))
+
+
+def _encode_packed(packed: PackedImage, encoding: "ImageEncoding") -> bytes:
+    return DocumentProcessor.image_to_bytes(
+        unpack_image(packed),
+        encoding.format,
+        quality=encoding.quality,
+        grayscale=encoding.grayscale,
+        binarize=encoding.binarize
+    )
+
+
+class ImageEncoding:
+    """How page images are encoded for upload to the model"""
+    
+    MIME_TYPES = {"PNG": "image/png", "JPEG": "image/jpeg", "WEBP": "image/webp"}
+    
+    def __init__(self, format: str = "PNG", quality: int = 85, grayscale: bool = False, binarize: bool = False):
+        """
+        Initialize image encoding
+        
+        Args:
+            format: PNG, JPEG or WEBP
+            quality: JPEG/WebP quality (1-100; ignored for PNG)
+            grayscale: Convert colour pages to grayscale first
+            binarize: Reduce pages to black and white (Otsu threshold)
+            
+        Raises:
+            ValueError: If the format is not supported
+        """
+        self.format = format.upper().replace("JPG", "JPEG")
+        if self.format not in self.MIME_TYPES:
+            raise ValueError(f"Unsupported upload image format: {format}")
+        self.quality = quality
+        self.grayscale = grayscale
+        self.binarize = binarize
+    
+    @classmethod
+    def from_config(cls) -> "ImageEncoding":
+        """Encoding selected by the OCR_IMAGE_* settings"""
+        return cls(
+            format=config.OCR_IMAGE_FORMAT,
+            quality=config.OCR_IMAGE_QUALITY,
+            grayscale=config.OCR_IMAGE_GRAYSCALE,
+            binarize=config.OCR_IMAGE_BINARIZE
+        )
+    
+    @property
+    def mime_type(self) -> str:
+        return self.MIME_TYPES[self.format]
+    
+    @property
+    def label(self) -> str:
+        """Short name such as "webp:80:gray" (the benchmark's --encodings syntax)"""
+        parts = [self.format.lower()]
+        if self.format != "PNG":
+            parts.append(str(self.quality))
+        if self.binarize:
+            parts.append("bw")
+        elif self.grayscale:
+            parts.append("gray")
+        return ":".join(parts)
+
+
 class DocumentProcessor:
     """Handles document downloading and preprocessing"""
     
+    # Render resolution for PDFs without a size target, and the cap when fitting one
+    PDF_MAX_DPI = 200
+    
+    # Bytes read per network chunk while streaming a download
+    DOWNLOAD_CHUNK_SIZE = 64 * 1024
+    
+    # Magic numbers of the formats we decode
+    SIGNATURES = [
+        (b'%PDF', 'application/pdf'),
+        (b'\x89PNG\r\n\x1a\n', 'image/png'),
+        (b'\xff\xd8\xff', 'image/jpeg'),
+        (b'GIF87a', 'image/gif'),
+        (b'GIF89a', 'image/gif'),
+        (b'II*\x00', 'image/tiff'),
+        (b'MM\x00*', 'image/tiff'),
+        (b'BM', 'image/bmp'),
+    ]
+    
     @staticmethod
     def download_image(url: str) -> Optional[Image.Image]:
         """
@@ -37,61 +171,21 @@ class DocumentProcessor:
         """
         try:
             logger.info(f"Downloading document from: {url}")
-            response = requests.get(url, timeout=30, headers={'User-Agent': 'Mozilla/5.0'})
-            response.raise_for_status()
+            spooler = BodySpooler(config.DOWNLOAD_MAX_BYTES, config.DOWNLOAD_SPOOL_THRESHOLD)
+            with requests.get(url, timeout=30, headers={'User-Agent': 'Mozilla/5.0'}, stream=True) as response:
+                response.raise_for_status()
+                spooler.check_declared_size(response.headers.get('Content-Length'))
+                for chunk in response.iter_content(DocumentProcessor.DOWNLOAD_CHUNK_SIZE):
+                    spooler.write(chunk)
             
-            content_type = response.headers.get('Content-Type', '').lower()
-            url_lower = url.lower()
-            
-            # Check if it's a PDF (by content-type or extension)
-            is_pdf = ('application/pdf' in content_type or 
-                     url_lower.endswith('.pdf') or
-                     response.content[:4] == b'%PDF')
-            
-            if is_pdf:
-                try:
-                    from pdf2image import convert_from_bytes
-                    logger.info("Detected PDF document, converting to images...")
-                    # Convert ALL pages of PDF to images
-                    images = convert_from_bytes(response.content, dpi=200)
-                    if images:
-                        logger.info(f"Successfully converted PDF to {len(images)} page(s)")
-                        return images
-                    else:
-                        logger.error("PDF conversion returned no images")
-                        return []
-                except ImportError:
-                    logger.error("pdf2image not installed. Cannot process PDFs.")
-                    return []
-                except Exception as e:
-                    logger.error(f"PDF conversion failed: {e}")
-                    # Try to open as image anyway
-                    try:
-                        image = Image.open(BytesIO(response.content))
-                        logger.info("Opened as image instead")
-                        return [image]
-                    except:
-                        return []
-
-            # Handle Images (single page) - try multiple methods
+            content_type = DocumentProcessor.sniff_content_type(
+                spooler.head, response.headers.get('Content-Type', '')
+            )
+            content = spooler.finish()
             try:
-                image = Image.open(BytesIO(response.content))
-                logger.info(f"Image downloaded successfully. Size: {image.size}, Mode: {image.mode}")
-                return [image]
-            except Exception as e:
-                logger.error(f"Failed to open as image: {e}")
-                # Last resort: try to save and reopen
-                try:
-                    import tempfile
-                    with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as tmp:
-                        tmp.write(response.content)
-                        tmp_path = tmp.name
-                    image = Image.open(tmp_path)
-                    import os
-                    os.unlink(tmp_path)
-                    return [image]
-                except:
-                    return []
+                return DocumentProcessor.decode_document(content, content_type, url)
+            finally:
+                DocumentProcessor.release(content)
             
         except requests.RequestException as e:
             logger.error(f"Failed to download document: {e}")
@@ -100,6 +194,366 @@ class DocumentProcessor:
             logger.error(f"Failed to process document: {e}")
             return []
     
+    @staticmethod
+    async def fetch_document_async(url: str) -> Optional[tuple[DocumentContent, str]]:
+        """
+        Stream a document without blocking the event loop
+        
+        The body is capped at DOWNLOAD_MAX_BYTES and its type is sniffed from
+        the first bytes, so oversized or non-document responses are dropped
+        early. Bodies over DOWNLOAD_SPOOL_THRESHOLD are spooled to a temp file
+        and returned memory-mapped; call release() when done with them.
+        
+        Args:
+            url: URL of the document to download
+            
+        Returns:
+            Tuple of (content, content_type) or None if download fails
+            
+        Raises:
+            DocumentTooLargeError: If the body exceeds DOWNLOAD_MAX_BYTES
+            UnsupportedDocumentError: If the body is not a PDF or image
+        """
+        spooler = BodySpooler(config.DOWNLOAD_MAX_BYTES, config.DOWNLOAD_SPOOL_THRESHOLD)
+        try:
+            logger.info(f"Downloading document from: {url}")
+            with metrics.timed("download"):
+                async with HTTPClient.stream(url) as response:
+                    spooler.check_declared_size(response.headers.get('Content-Length'))
+                    content_type = response.headers.get('Content-Type', '')
+                    sniffed = False
+                    async for chunk in response.aiter_bytes(DocumentProcessor.DOWNLOAD_CHUNK_SIZE):
+                        spooler.write(chunk)
+                        if not sniffed and len(spooler.head) >= BodySpooler.HEAD_BYTES:
+                            content_type = DocumentProcessor.sniff_content_type(spooler.head, content_type)
+                            sniffed = True
+                    if not sniffed:
+                        content_type = DocumentProcessor.sniff_content_type(spooler.head, content_type)
+                content = spooler.finish()
+            metrics.BYTES_DOWNLOADED.inc(spooler.size)
+            return content, content_type
+        except httpx.HTTPError as e:
+            spooler.discard()
+            logger.error(f"Failed to download document: {e}")
+            return None
+        except BaseException:
+            spooler.discard()
+            raise
+    
+    @staticmethod
+    def sniff_content_type(head: bytes, content_type: str = "") -> str:
+        """
+        Work out a document's type from its leading bytes
+        
+        Args:
+            head: First bytes of the body
+            content_type: Content-Type the server declared
+            
+        Returns:
+            MIME type from the magic number, or the declared type if none matched
+            
+        Raises:
+            UnsupportedDocumentError: If the body is text/markup rather than a document
+        """
+        if b'%PDF' in head[:1024]:
+            return 'application/pdf'
+        for signature, mime_type in DocumentProcessor.SIGNATURES:
+            if head.startswith(signature):
+                return mime_type
+        if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+            return 'image/webp'
+        
+        declared = content_type.lower()
+        if (declared.startswith('text/') or 'json' in declared or 'xml' in declared
+                or head.lstrip()[:1] in (b'<', b'{')):
+            raise UnsupportedDocumentError(
+                f"Document is not a PDF or image (Content-Type: {content_type or 'unknown'})"
+            )
+        return content_type
+    
+    @staticmethod
+    def release(content: DocumentContent):
+        """
+        Free a downloaded body (unmaps and deletes spooled ones)
+        
+        Args:
+            content: Body returned by fetch_document_async
+        """
+        if isinstance(content, SpooledBody):
+            content.close()
+    
+    @staticmethod
+    def decode_document(content: DocumentContent, content_type: str = "", url: str = "") -> list[Image.Image]:
+        """
+        Decode downloaded document bytes into page images
+        
+        Args:
+            content: Raw document bytes
+            content_type: Content-Type header of the response
+            url: Source URL (used for extension sniffing)
+            
+        Returns:
+            List of PIL Image objects (one per page)
+        """
+        try:
+            return list(DocumentProcessor.iter_pages(content, content_type, url))
+        except Exception as e:
+            logger.error(f"Failed to process document: {e}")
+            return []
+    
+    @staticmethod
+    def is_pdf(content: DocumentContent, content_type: str = "", url: str = "") -> bool:
+        """
+        Check if a document is a PDF (by content-type, extension or magic bytes)
+        
+        Args:
+            content: Raw document bytes
+            content_type: Content-Type header of the response
+            url: Source URL
+            
+        Returns:
+            True if the document should be rasterized as a PDF
+        """
+        return ('application/pdf' in content_type.lower() or 
+                url.lower().endswith('.pdf') or
+                content[:4] == b'%PDF')
+    
+    @staticmethod
+    def iter_pages(
+        content: DocumentContent,
+        content_type: str = "",
+        url: str = "",
+        window: int = 2,
+        max_size: Optional[tuple] = None,
+        grayscale: bool = False,
+        text_layer: bool = False,
+        tall_size: Optional[tuple] = None,
+        tall_aspect: float = 2.0
+    ) -> Iterator[Union[Image.Image, TextLayerPage]]:
+        """
+        Lazily decode document bytes into page images
+        
+        PDFs are rendered ``window`` pages at a time, so only a few bitmaps
+        are alive at once and the first page is available before the rest
+        of the document has been rendered.
+        
+        Args:
+            content: Raw document bytes
+            content_type: Content-Type header of the response
+            url: Source URL (used for extension sniffing)
+            window: Number of PDF pages rendered per poppler call
+            max_size: Render each PDF page directly to fit these dimensions
+                and shrink images to fit them (None renders PDFs at 200 dpi
+                and returns images at full size)
+            grayscale: Render PDF pages as 8-bit grayscale instead of RGB
+            text_layer: Read PDF pages that carry a text layer directly; those
+                pages are yielded as TextLayerPage and never rendered
+            tall_size: Larger box used instead of max_size for pages taller
+                than ``tall_aspect`` times their width (None: max_size for all)
+            tall_aspect: Height/width ratio above which a page gets tall_size
+            
+        Yields:
+            PIL Image objects (or TextLayerPage) in page order
+        """
+        if DocumentProcessor.is_pdf(content, content_type, url):
+            try:
+                import pdf2image  # noqa: F401
+            except ImportError:
+                logger.error("pdf2image not installed. Cannot process PDFs.")
+                return
+            
+            pages = DocumentProcessor._iter_pdf_pages(
+                content, window, max_size, grayscale, text_layer, tall_size, tall_aspect
+            )
+            try:
+                first_page = next(pages, None)
+            except Exception as e:
+                logger.error(f"PDF conversion failed: {e}")
+                # Try to open as image anyway
+                try:
+                    image = Image.open(content.path if isinstance(content, SpooledBody) else BytesIO(content))
+                    logger.info("Opened as image instead")
+                    yield image
+                except:
+                    pass
+                return
+            
+            if first_page is None:
+                logger.error("PDF conversion returned no images")
+                return
+            
+            yield first_page
+            try:
+                yield from pages
+            except Exception as e:
+                logger.error(f"PDF conversion failed part-way through the document: {e}")
+            finally:
+                pages.close()
+            return
+        
+        # Decode (and shrink to max_size) in the CPU pool so only the small bitmap comes back
+        # Spooled bodies are read from their file rather than copied to the worker
+        source = content.path if isinstance(content, SpooledBody) else content
+        packed = CPUPool.run(_decode_image, source, max_size, tall_size, tall_aspect)
+        if packed is not None:
+            yield unpack_image(packed)
+    
+    @staticmethod
+    def _iter_pdf_pages(
+        content: DocumentContent,
+        window: int,
+        max_size: Optional[tuple] = None,
+        grayscale: bool = False,
+        text_layer: bool = False,
+        tall_size: Optional[tuple] = None,
+        tall_aspect: float = 2.0
+    ) -> Iterator[Union[Image.Image, TextLayerPage]]:
+        """Render a PDF a window of pages at a time (in the CPU pool)"""
+        from pdf2image import pdfinfo_from_path
+        
+        window = max(1, window)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            if isinstance(content, SpooledBody):
+                # Already on disk
+                pdf_path = content.path
+            else:
+                # Write once so each windowed render reads the same file
+                pdf_path = os.path.join(tmp_dir, "document.pdf")
+                with open(pdf_path, "wb") as f:
+                    f.write(content)
+            
+            page_count = int(pdfinfo_from_path(pdf_path)["Pages"])
+            logger.info(f"Detected PDF document with {page_count} page(s), rendering {window} at a time")
+            
+            text_pages = {}
+            if text_layer:
+                with metrics.timed("text_layer"):
+                    text_pages = CPUPool.run(
+                        _extract_text_layer, pdf_path, page_count, config.PDF_TEXT_LAYER_MIN_WORDS
+                    )
+                if text_pages:
+                    logger.info(f"Read {len(text_pages)} of {page_count} page(s) from the PDF text layer")
+            
+            if max_size is None:
+                dpis = [DocumentProcessor.PDF_MAX_DPI] * page_count
+            else:
+                page_sizes = DocumentProcessor._pdf_page_sizes(pdf_path, page_count)
+                dpis = [
+                    DocumentProcessor.render_dpi(size, DocumentProcessor.page_box(size, max_size, tall_size, tall_aspect))
+                    for size in page_sizes
+                ]
+            
+            # Group consecutive pages rendered at the same dpi, at most `window` per call
+            first_page = 1
+            while first_page <= page_count:
+                if first_page in text_pages:
+                    yield TextLayerPage(first_page, text_pages[first_page])
+                    first_page += 1
+                    continue
+                
+                dpi = dpis[first_page - 1]
+                last_page = first_page
+                while (last_page < page_count and last_page - first_page + 1 < window
+                       and dpis[last_page] == dpi and last_page + 1 not in text_pages):
+                    last_page += 1
+                
+                for packed in CPUPool.run(_render_pdf_window, pdf_path, dpi, first_page, last_page, grayscale):
+                    yield unpack_image(packed)
+                first_page = last_page + 1
+    
+    @staticmethod
+    def _pdf_page_sizes(pdf_path: str, page_count: int) -> list[Optional[tuple]]:
+        """Media box (width, height) in points for each page, accounting for rotation"""
+        from pdf2image import pdfinfo_from_path
+        
+        info = pdfinfo_from_path(pdf_path, first_page=1, last_page=page_count)
+        sizes = []
+        for page in range(1, page_count + 1):
+            match = re.match(r"\s*([\d.]+) x ([\d.]+)", str(info.get(f"Page {page:4d} size", "")))
+            if not match:
+                sizes.append(None)
+                continue
+            
+            width, height = float(match.group(1)), float(match.group(2))
+            rotation = int(float(str(info.get(f"Page {page:4d} rot", "0")).strip() or 0))
+            if rotation % 180 == 90:
+                width, height = height, width
+            sizes.append((width, height))
+        return sizes
+    
+    @staticmethod
+    def page_box(
+        page_size: Optional[tuple],
+        max_size: tuple,
+        tall_size: Optional[tuple] = None,
+        tall_aspect: float = 2.0
+    ) -> tuple:
+        """
+        Box a page is rendered or decoded to fit
+        
+        Args:
+            page_size: Page (width, height) in any unit, or None if unknown
+            max_size: Box for ordinary pages
+            tall_size: Box for pages taller than tall_aspect times their width
+            tall_aspect: Height/width ratio above which a page is tall
+            
+        Returns:
+            tall_size for tall pages (when given), otherwise max_size
+        """
+        if tall_size is None or page_size is None or page_size[0] <= 0:
+            return max_size
+        return tall_size if page_size[1] / page_size[0] > tall_aspect else max_size
+    
+    @staticmethod
+    def render_dpi(page_size: Optional[tuple], max_size: tuple, max_dpi: int = PDF_MAX_DPI) -> int:
+        """
+        Highest dpi at which a PDF page still fits within max_size
+        
+        Args:
+            page_size: Page (width, height) in points, or None if unknown
+            max_size: Maximum rendered dimensions (width, height) in pixels
+            max_dpi: Upper bound on the render resolution
+            
+        Returns:
+            Render resolution in dpi
+        """
+        if not page_size or page_size[0] <= 0 or page_size[1] <= 0:
+            return max_dpi
+        
+        width_pts, height_pts = page_size
+        dpi = int(min(max_dpi, max_size[0] * 72 / width_pts, max_size[1] * 72 / height_pts))
+        # poppler rounds the pixel size up, so step down until the page really fits
+        while dpi > 1 and (math.ceil(width_pts * dpi / 72) > max_size[0] or
+                           math.ceil(height_pts * dpi / 72) > max_size[1]):
+            dpi -= 1
+        return max(1, dpi)
+    
+    @staticmethod
+    def _open_image(content: Union[bytes, str]) -> Optional[Image.Image]:
+        """Open single-page image bytes (or an image file path), trying multiple methods"""
+        if isinstance(content, str):
+            try:
+                return Image.open(content)
+            except Exception as e:
+                logger.error(f"Failed to open as image: {e}")
+                return None
+        try:
+            image = Image.open(BytesIO(content))
+            logger.info(f"Image downloaded successfully. Size: {image.size}, Mode: {image.mode}")
+            return image
+        except Exception as e:
+            logger.error(f"Failed to open as image: {e}")
+            # Last resort: try to save and reopen
+            try:
+                with tempfile.NamedTemporaryFile(delete=False, suffix='.png') as tmp:
+                    tmp.write(content)
+                    tmp_path = tmp.name
+                image = Image.open(tmp_path)
+                os.unlink(tmp_path)
+                return image
+            except:
+                return None
+    
     @staticmethod
     def preprocess_image(image: Image.Image, max_size: tuple = (2048, 2048)) -> Image.Image:
         """
@@ -113,8 +567,8 @@ class DocumentProcessor:
             Preprocessed PIL Image
         """
         try:
-            # Convert to RGB if necessary
-            if image.mode != 'RGB':
+            # Convert to RGB if necessary (grayscale renders are kept as-is)
+            if image.mode not in ('RGB', 'L'):
                 image = image.convert('RGB')
             
             # Resize if too large
@@ -129,17 +583,193 @@ class DocumentProcessor:
             return image
     
     @staticmethod
-    def image_to_bytes(image: Image.Image, format: str = "PNG") -> bytes:
+    async def preprocess_image_async(image: Image.Image, max_size: tuple = (2048, 2048)) -> Image.Image:
+        """
+        preprocess_image in the CPU pool (skipped when there is nothing to do)
+        
+        Args:
+            image: PIL Image object
+            max_size: Maximum dimensions (width, height)
+            
+        Returns:
+            Preprocessed PIL Image
+        """
+        if image.mode in ('RGB', 'L') and image.size[0] <= max_size[0] and image.size[1] <= max_size[1]:
+            return image
+        # Packing and unpacking copy the pixels, so keep them off the event loop too
+        return await asyncio.to_thread(
+            lambda: unpack_image(CPUPool.run(_preprocess_packed, pack_image(image), max_size))
+        )
+    
+    @staticmethod
+    def encode_image(image: Image.Image, encoding: Optional[ImageEncoding] = None) -> bytes:
+        """
+        image_to_bytes in the CPU pool (blocks the calling thread, not the GIL)
+        
+        Args:
+            image: PIL Image object
+            encoding: Upload encoding (defaults to lossless PNG)
+            
+        Returns:
+            Image as bytes
+        """
+        encoding = encoding or ImageEncoding()
+        with metrics.timed("encode"):
+            data = CPUPool.run(_encode_packed, pack_image(image), encoding)
+        metrics.UPLOAD_BYTES.inc(len(data), format=encoding.format.lower())
+        return data
+    
+    @staticmethod
+    def image_to_bytes(
+        image: Image.Image,
+        format: str = "PNG",
+        quality: Optional[int] = None,
+        grayscale: bool = False,
+        binarize: bool = False
+    ) -> bytes:
         """
         Convert PIL Image to bytes
         
         Args:
             image: PIL Image object
             format: Image format (PNG, JPEG, etc.)
+            quality: JPEG/WebP quality (None = Pillow's default)
+            grayscale: Convert to grayscale first
+            binarize: Convert to black and white first (PNG stores it as 1 bit per pixel)
             
         Returns:
             Image as bytes
         """
+        if binarize:
+            image = DocumentProcessor.binarize(image)
+        elif grayscale and image.mode != 'L':
+            image = image.convert('L')
+        
+        format = format.upper()
+        if format == "JPEG" and image.mode not in ('L', 'RGB'):
+            image = image.convert('L' if image.mode == '1' else 'RGB')
+        elif format == "WEBP" and image.mode not in ('RGB', 'RGBA'):
+            # WebP has no grayscale mode; the encoder stores the luma plane only anyway
+            image = image.convert('RGB')
+        
+        options = {"quality": quality} if quality is not None and format in ("JPEG", "WEBP") else {}
         buffer = BytesIO()
-        image.save(buffer, format=format)
+        image.save(buffer, format=format, **options)
         return buffer.getvalue()
+    
+    @staticmethod
+    def binarize(image: Image.Image) -> Image.Image:
+        """
+        Black-and-white copy of a page, thresholded with Otsu's method
+        
+        Args:
+            image: PIL Image object
+            
+        Returns:
+            Mode "1" image
+        """
+        gray = image if image.mode == 'L' else image.convert('L')
+        histogram = gray.histogram()
+        total = sum(histogram)
+        weighted_total = sum(level * count for level, count in enumerate(histogram))
+        
+        # Threshold maximizing the variance between the dark and the light class
+        best_threshold, best_variance = 128, -1.0
+        dark_count = dark_weighted = 0
+        for level in range(255):
+            dark_count += histogram[level]
+            dark_weighted += level * histogram[level]
+            light_count = total - dark_count
+            if dark_count == 0 or light_count == 0:
+                continue
+            dark_mean = dark_weighted / dark_count
+            light_mean = (weighted_total - dark_weighted) / light_count
+            variance = dark_count * light_count * (dark_mean - light_mean) ** 2
+            if variance > best_variance:
+                best_threshold, best_variance = level, variance
+        
+        return gray.point(lambda level: 255 if level > best_threshold else 0, mode='1')
+    
+    @staticmethod
+    def content_hash(image: Image.Image) -> str:
+        """
+        Exact hash of an image's pixels
+        
+        Args:
+            image: PIL Image object
+            
+        Returns:
+            SHA-256 hex digest of mode, size and raw pixel data
+        """
+        digest = hashlib.sha256(f"{image.mode}:{image.size[0]}x{image.size[1]}:".encode())
+        digest.update(image.tobytes())
+        return digest.hexdigest()
+    
+    @staticmethod
+    def perceptual_hash(image: Image.Image, hash_size: int = 16) -> str:
+        """
+        Difference hash (dHash) that survives re-encoding and small rescans
+        
+        Args:
+            image: PIL Image object
+            hash_size: Hash grid size (hash_size**2 bits)
+            
+        Returns:
+            Hex string of the hash bits
+        """
+        small = image.convert('L').resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR)
+        pixels = small.tobytes()
+        
+        bits = 0
+        for row in range(hash_size):
+            offset = row * (hash_size + 1)
+            for col in range(hash_size):
+                bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+        
+        return f"{bits:0{hash_size * hash_size // 4}x}"
+    
+    @staticmethod
+    def paper_level(histogram: list) -> int:
+        """
+        Luminance of the paper: the 90th percentile of a grayscale histogram
+        
+        Args:
+            histogram: 256-bin histogram of an "L" image
+            
+        Returns:
+            Paper luminance (0-255)
+        """
+        total = sum(histogram)
+        seen = 0
+        for level in range(256):
+            seen += histogram[level]
+            if seen >= 0.9 * total:
+                return level
+        return 255
+    
+    @staticmethod
+    def ink_projection(image: Image.Image, analysis_size: int = 1024, contrast: int = 64) -> tuple[list, list]:
+        """
+        Share of ink pixels in every row and every column of a page
+        
+        Measured on a grayscale copy whose longest side is analysis_size;
+        pixels more than contrast levels darker than the paper count as ink.
+        
+        Args:
+            image: PIL Image object
+            analysis_size: Longest side of the analysis copy
+            contrast: Darkness below the paper level that counts as ink
+            
+        Returns:
+            Tuple of (per-row ink shares, per-column ink shares), each 0.0-1.0;
+            scale by image.height / len(rows) to get page coordinates
+        """
+        gray = image.convert('L')
+        gray.thumbnail((analysis_size, analysis_size), Image.Resampling.BOX)
+        threshold = DocumentProcessor.paper_level(gray.histogram()) - contrast
+        ink = gray.point(lambda level: 255 if level < threshold else 0)
+        
+        # Box-averaging down to one column (row) gives each row's (column's) ink share
+        rows = ink.resize((1, ink.height), Image.Resampling.BOX).tobytes()
+        columns = ink.resize((ink.width, 1), Image.Resampling.BOX).tobytes()
+        return [value / 255 for value in rows], [value / 255 for value in columns]
@@ -0,0 +1,87 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+from urllib.parse import urlsplit
+import httpx
+from config import config
+
+logger = logging.getLogger(__name__)
+
+
+class HTTPClient:
+    """Shared async HTTP client with pooled keep-alive connections"""
+
+    _client: Optional[httpx.AsyncClient] = None
+    _host_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    @classmethod
+    def get_client(cls) -> httpx.AsyncClient:
+        """
+        Get (or lazily create) the process-wide AsyncClient
+
+        Returns:
+            httpx.AsyncClient configured with pool limits and timeouts
+        """
+        if cls._client is None or cls._client.is_closed:
+            cls._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(
+                    config.DOWNLOAD_READ_TIMEOUT,
+                    connect=config.DOWNLOAD_CONNECT_TIMEOUT
+                ),
+                limits=httpx.Limits(
+                    max_connections=config.HTTP_MAX_CONNECTIONS,
+                    max_keepalive_connections=config.HTTP_MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=config.HTTP_KEEPALIVE_EXPIRY
+                ),
+                headers={'User-Agent': 'Mozilla/5.0'},
+                follow_redirects=True
+            )
+            logger.info("Created shared HTTP client")
+        return cls._client
+
+    @classmethod
+    def host_semaphore(cls, url: str) -> asyncio.Semaphore:
+        """
+        Get the semaphore limiting concurrent connections to the URL's host
+
+        Args:
+            url: Request URL
+
+        Returns:
+            asyncio.Semaphore for the host
+        """
+        host = urlsplit(url).netloc.lower()
+        semaphore = cls._host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(max(1, config.HTTP_MAX_CONNECTIONS_PER_HOST))
+            cls._host_semaphores[host] = semaphore
+        return semaphore
+
+    @classmethod
+    @asynccontextmanager
+    async def stream(cls, url: str) -> AsyncIterator[httpx.Response]:
+        """
+        GET a URL without reading the body, respecting the per-host limit
+
+        Args:
+            url: URL to fetch
+
+        Yields:
+            httpx.Response whose body can be consumed with aiter_bytes()
+
+        Raises:
+            httpx.HTTPError: On connection, timeout or HTTP status errors
+        """
+        async with cls.host_semaphore(url):
+            async with cls.get_client().stream("GET", url) as response:
+                response.raise_for_status()
+                yield response
+
+    @classmethod
+    async def close(cls):
+        """Close the shared client and its pooled connections"""
+        if cls._client is not None:
+            await cls._client.aclose()
+            cls._client = None
+        cls._host_semaphores.clear()
@@ -0,0 +1,269 @@
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+_NUMBER_RE = re.compile(r"-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?")
+_AMOUNT_RE = re.compile(r"^(\(?)\s*(-?)\s*(?:₹|rs\.?|inr|\$|€|£)?\s*(-?)\s*(\d[\d,]*(?:\.\d+)?|\.\d+)\s*(?:/-)?\s*(\)?)$", re.I)
+_THOUSANDS_RE = re.compile(r",\d{2,3}(?!\d)")
+# A quoted key and its colon: the start of the next member when a comma is missing
+_KEY_RE = re.compile(r"\s*[\"'][^\"'\n]*[\"']\s*:")
+_WORDS = {"true": True, "false": False, "null": None, "none": None, "nan": None}
+
+
+class _Truncated(Exception):
+    """Input ended inside a scalar value"""
+
+
+class _Parser:
+    """Recursive-descent JSON parser that keeps going past common model mistakes
+
+    Containers cut off by the end of the input return what they hold so far
+    (and set ``truncated``); scalars cut off raise _Truncated so that a
+    half-written number or name is never taken for a value.
+    """
+
+    def __init__(self, text: str, pos: int = 0):
+        self.text = text
+        self.pos = pos
+        self.truncated = False
+
+    def at_end(self) -> bool:
+        while self.pos < len(self.text) and self.text[self.pos].isspace():
+            self.pos += 1
+        return self.pos >= len(self.text)
+
+    def value(self, in_object: bool = False) -> Any:
+        if self.at_end():
+            raise _Truncated()
+        char = self.text[self.pos]
+        if char == "{":
+            return self.object()
+        if char == "[":
+            return self.array()
+        if char in "\"'":
+            return self.string(char)
+        return self.bare(in_object)
+
+    def object(self) -> Dict[str, Any]:
+        self.pos += 1
+        result: Dict[str, Any] = {}
+        while not self.at_end():
+            char = self.text[self.pos]
+            if char == "}":
+                self.pos += 1
+                return result
+            if char == "]":
+                # Mismatched bracket: treat it as the end of this object
+                return result
+            if char == ",":
+                # Leading, doubled or trailing comma
+                self.pos += 1
+                continue
+            try:
+                key = self.string(char) if char in "\"'" else self.bare_key()
+                if not self.at_end() and self.text[self.pos] == ":":
+                    self.pos += 1
+                value = self.value(in_object=True)
+            except _Truncated:
+                # The member cut off mid-way is dropped
+                break
+            result[key] = value
+        self.truncated = True
+        return result
+
+    def array(self) -> List[Any]:
+        self.pos += 1
+        result: List[Any] = []
+        while not self.at_end():
+            char = self.text[self.pos]
+            if char == "]":
+                self.pos += 1
+                return result
+            if char == "}":
+                return result
+            if char == ",":
+                self.pos += 1
+                continue
+            complete = not self.truncated
+            try:
+                element = self.value()
+            except _Truncated:
+                break
+            if complete and self.truncated and not self._has_containers(element):
+                # An element (e.g. a line item) cut off part-way is dropped;
+                # wrappers around complete elements (e.g. a page) are kept
+                break
+            result.append(element)
+        self.truncated = True
+        return result
+
+    @staticmethod
+    def _has_containers(element: Any) -> bool:
+        values = element.values() if isinstance(element, dict) else element if isinstance(element, list) else []
+        return any(isinstance(value, (dict, list)) for value in values)
+
+    def string(self, quote: str) -> str:
+        self.pos += 1
+        chars = []
+        while self.pos < len(self.text):
+            char = self.text[self.pos]
+            if char == "\\" and self.pos + 1 < len(self.text):
+                length = 6 if self.text[self.pos + 1] == "u" else 2
+                escape = self.text[self.pos:self.pos + length]
+                try:
+                    chars.append(json.loads(f'"{escape}"'))
+                except ValueError:
+                    chars.append(escape[1:])
+                self.pos += length
+                continue
+            if char == quote:
+                # A quote only closes the string when structure, a line break or
+                # the next key (both: a missing comma) follows; otherwise it is
+                # part of the text
+                rest = self.pos + 1
+                while rest < len(self.text) and self.text[rest] in " \t\r\n":
+                    rest += 1
+                if (rest >= len(self.text) or self.text[rest] in ",:}]" or "\n" in self.text[self.pos:rest]
+                        or _KEY_RE.match(self.text, self.pos + 1)):
+                    self.pos += 1
+                    return "".join(chars)
+            chars.append(char)
+            self.pos += 1
+        raise _Truncated()
+
+    def bare_key(self) -> str:
+        start = self.pos
+        while self.pos < len(self.text) and self.text[self.pos] not in ":,}]\n":
+            self.pos += 1
+        if self.pos >= len(self.text):
+            raise _Truncated()
+        return self.text[start:self.pos].strip()
+
+    def bare(self, in_object: bool) -> Any:
+        """Numbers (including currency-formatted ones), literals and unquoted text"""
+        start = self.pos
+        while True:
+            while self.pos < len(self.text) and self.text[self.pos] not in ",}]\n":
+                self.pos += 1
+            # Inside an object a comma followed by digits can't start a new
+            # key, so "1,234.50" and "1,00,000" are single numbers
+            if in_object and _THOUSANDS_RE.match(self.text, self.pos):
+                self.pos += 1
+                continue
+            break
+        if in_object:
+            # The next key on the same line: the comma before it is missing
+            key = next((match for match in (_KEY_RE.match(self.text, index) for index in range(start, self.pos)
+                                            if self.text[index].isspace()) if match), None)
+            if key is not None:
+                self.pos = key.start()
+        if self.pos >= len(self.text):
+            # No terminator: the value may have been cut off
+            raise _Truncated()
+        token = self.text[start:self.pos].strip()
+        lowered = token.lower()
+        if lowered in _WORDS:
+            return _WORDS[lowered]
+        if _NUMBER_RE.fullmatch(token):
+            return json.loads(token)
+        amount = JSONRepair.parse_amount(token)
+        return amount if amount is not None else token
+
+
+class JSONRepair:
+    """Local, tolerant parsing of model JSON output (no extra model call)"""
+
+    @staticmethod
+    def loads(text: str) -> Tuple[Any, bool]:
+        """
+        Parse JSON the way a lenient reader would
+
+        Handles markdown fences and surrounding prose, trailing commas,
+        missing commas (between array elements, and between members when the
+        next key is quoted), single quotes, unescaped quotes inside strings, bare
+        currency-formatted numbers and output cut off part-way (complete
+        array elements are kept, the element cut off is dropped).
+
+        Args:
+            text: Raw model response
+
+        Returns:
+            Tuple of (parsed value, whether the output was truncated)
+
+        Raises:
+            ValueError: If the text contains no JSON object or array
+        """
+        starts = [index for index in (text.find("{"), text.find("[")) if index != -1]
+        if not starts:
+            raise ValueError("No JSON object or array in response")
+
+        parser = _Parser(text, min(starts))
+        try:
+            return parser.value(), parser.truncated
+        except _Truncated:
+            raise ValueError("JSON value cut off before anything could be salvaged")
+
+    @staticmethod
+    def parse_amount(value: Any) -> Optional[float]:
+        """
+        Read a number that may carry a currency symbol or thousands separators
+
+        Args:
+            value: Number or text such as "₹1,234.50", "Rs. 99", "(12.00)"
+
+        Returns:
+            The number, or None if the value is not numeric
+        """
+        if isinstance(value, bool):
+            return None
+        if isinstance(value, (int, float)):
+            return float(value)
+        if not isinstance(value, str):
+            return None
+        match = _AMOUNT_RE.match(value.strip())
+        if not match:
+            return None
+        opening, sign, inner_sign, digits, closing = match.groups()
+        number = float(digits.replace(",", ""))
+        negative = bool(sign or inner_sign or (opening and closing))
+        return -number if negative else number
+
+    @staticmethod
+    def normalize_extraction(data: Any) -> Optional[Dict[str, Any]]:
+        """
+        Coerce a repaired response into the extraction shape
+
+        Amounts given as text are converted; line items without a name or
+        a numeric amount are dropped.
+
+        Args:
+            data: Parsed response
+
+        Returns:
+            Dict with a line_items list, or None if the response has none
+        """
+        if isinstance(data, list):
+            data = {"line_items": data}
+        if not isinstance(data, dict) or not isinstance(data.get("line_items"), list):
+            return None
+
+        items = []
+        for item in data["line_items"]:
+            if not isinstance(item, dict) or not item.get("item_name"):
+                continue
+            amount = JSONRepair.parse_amount(item.get("item_amount"))
+            if amount is None:
+                continue
+            items.append({
+                **item,
+                "item_name": str(item["item_name"]).strip(),
+                "item_amount": amount,
+                "item_rate": JSONRepair.parse_amount(item.get("item_rate")) or 0.0,
+                "item_quantity": JSONRepair.parse_amount(item.get("item_quantity")) or 0.0
+            })
+
+        result = {**data, "line_items": items}
+        for key in ("extracted_total", "actual_bill_total"):
+            if key in result:
+                result[key] = JSONRepair.parse_amount(result[key]) or 0.0
+        return result
@@ -0,0 +1,295 @@
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds, from in-process stages up to slow OCR calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(label_names: Sequence[str], label_values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    """Base for labelled metrics; values are keyed on the label value tuple"""
+
+    metric_type = "untyped"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+
+    metric_type = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        # Unlabelled series are exported as 0 before their first update
+        self._values: Dict[Tuple[str, ...], float] = {} if self.label_names else {(): 0.0}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, key)} {value:g}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Value that can go up and down (e.g. in-flight work)"""
+
+    metric_type = "gauge"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()):
+        super().__init__(name, documentation, label_names)
+        # Unlabelled series are exported as 0 before their first update
+        self._values: Dict[Tuple[str, ...], float] = {} if self.label_names else {(): 0.0}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track_inprogress(self, **labels):
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.label_names, key)} {value:g}")
+        return lines
+
+
+class Histogram(_Metric):
+    """Distribution of observations over fixed buckets"""
+
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # key -> (per-bucket counts, +Inf count, sum)
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0, 0.0]
+            if index < len(self.buckets):
+                entry[0][index] += 1
+            entry[1] += 1
+            entry[2] += value
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        with self._lock:
+            for key, (counts, total, value_sum) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    labels = _format_labels(self.label_names, key, f'le="{bound:g}"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = _format_labels(self.label_names, key, 'le="+Inf"')
+                lines.append(f"{self.name}_bucket{labels} {total}")
+                plain = _format_labels(self.label_names, key)
+                lines.append(f"{self.name}_sum{plain} {value_sum:g}")
+                lines.append(f"{self.name}_count{plain} {total}")
+        return lines
+
+
+class Registry:
+    """Collection of metrics rendered in the Prometheus text exposition format"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class RequestTimings:
+    """Per-request accumulation of stage durations (seconds, summed across pages)"""
+
+    def __init__(self):
+        self.stages: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def as_milliseconds(self) -> Dict[str, float]:
+        with self._lock:
+            return {stage: round(seconds * 1000, 3) for stage, seconds in self.stages.items()}
+
+
+# Set for the duration of a request that asked for a timing breakdown
+current_timings: contextvars.ContextVar[Optional[RequestTimings]] = contextvars.ContextVar(
+    "current_timings", default=None
+)
+
+registry = Registry()
+
+STAGE_SECONDS = registry.register(Histogram(
+    "bill_extraction_stage_seconds",
+    "Time spent in each extraction stage",
+    ["stage"]
+))
+REQUESTS = registry.register(Counter(
+    "bill_extraction_requests_total",
+    "Extraction requests by outcome",
+    ["endpoint", "outcome"]
+))
+PAGES = registry.register(Counter(
+    "bill_extraction_pages_total",
+    "Pages processed"
+))
+TEXT_LAYER_PAGES = registry.register(Counter(
+    "bill_extraction_text_layer_pages_total",
+    "PDF pages read from their text layer instead of OCR"
+))
+PAGES_SKIPPED = registry.register(Counter(
+    "bill_extraction_pages_skipped_total",
+    "Pages skipped before OCR",
+    ["reason"]
+))
+LINE_ITEMS = registry.register(Counter(
+    "bill_extraction_line_items_total",
+    "Line items extracted"
+))
+OCR_FAILURES = registry.register(Counter(
+    "bill_extraction_ocr_failures_total",
+    "OCR calls that returned an error"
+))
+JSON_REPAIRS = registry.register(Counter(
+    "bill_extraction_json_repairs_total",
+    "OCR responses that needed JSON repair",
+    ["outcome"]
+))
+BYTES_DOWNLOADED = registry.register(Counter(
+    "bill_extraction_bytes_downloaded_total",
+    "Document bytes downloaded"
+))
+COALESCED_REQUESTS = registry.register(Counter(
+    "bill_extraction_coalesced_requests_total",
+    "Requests that joined an identical in-flight extraction",
+    ["key"]
+))
+OCR_BATCHES = registry.register(Counter(
+    "bill_extraction_ocr_batches_total",
+    "Multi-page OCR calls by how much of the response was usable",
+    ["outcome"]
+))
+CASCADE_ESCALATIONS = registry.register(Counter(
+    "bill_extraction_cascade_escalations_total",
+    "Pages re-run on a stronger model because their totals did not reconcile",
+    ["model"]
+))
+TILED_PAGES = registry.register(Counter(
+    "bill_extraction_tiled_pages_total",
+    "Tall or dense pages extracted as overlapping bands"
+))
+TILE_BANDS = registry.register(Counter(
+    "bill_extraction_tile_bands_total",
+    "Bands OCR'd for tiled pages"
+))
+TILE_DUPLICATE_ROWS = registry.register(Counter(
+    "bill_extraction_tile_duplicate_rows_total",
+    "Line items read in two overlapping bands and kept once"
+))
+UPLOAD_BYTES = registry.register(Counter(
+    "bill_extraction_upload_bytes_total",
+    "Encoded page image bytes sent to the model",
+    ["format"]
+))
+CROP_SAVED = registry.register(Counter(
+    "bill_extraction_crop_saved_total",
+    "Pixels and encoded bytes cut off pages before upload",
+    ["unit"]
+))
+CROP_SAVED_RATIO = registry.register(Histogram(
+    "bill_extraction_crop_saved_ratio",
+    "Share of each page's pixels removed by content cropping",
+    buckets=(0.0, 0.05, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9)
+))
+OCR_RETRIES = registry.register(Counter(
+    "bill_extraction_ocr_retries_total",
+    "OCR calls retried after a transient error",
+    ["reason"]
+))
+OCR_CONCURRENCY_LIMIT = registry.register(Gauge(
+    "bill_extraction_ocr_concurrency_limit",
+    "Current adaptive limit on concurrent OCR calls"
+))
+IN_FLIGHT = registry.register(Gauge(
+    "bill_extraction_in_flight",
+    "Work currently in progress",
+    ["kind"]
+))
+
+
+def observe_stage(stage: str, seconds: float):
+    """Record a stage duration in the histogram and the current request's breakdown"""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = current_timings.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+@contextmanager
+def timed(stage: str):
+    """Time a block as one observation of `stage`"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - start)
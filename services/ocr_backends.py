@@ -0,0 +1,238 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from typing import List, Optional, Union
+from PIL import Image
+from google.api_core import exceptions as google_exceptions
+from config import config
+from services.document_processor import DocumentProcessor, ImageEncoding
+
+logger = logging.getLogger(__name__)
+
+# One page, several pages answered in a single call, or none (text-only calls)
+ImageInput = Union[Image.Image, List[Image.Image], None]
+
+
+class OCRBackend:
+    """Model call behind OCRService: prompt (+ optional page image) in, response text out"""
+
+    name = "base"
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+
+    def generate(self, prompt: str, image: ImageInput = None) -> str:
+        """
+        Run the model on a prompt and optional images
+
+        Args:
+            prompt: Text prompt
+            image: Page image, list of page images in prompt order (multi-page
+                extraction), or None for text-only calls such as JSON repair
+
+        Returns:
+            Raw response text
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def image_hash(image: ImageInput) -> Optional[str]:
+        """Content hash of the call's image(s), comma-joined for several pages"""
+        if image is None:
+            return None
+        if isinstance(image, list):
+            return ",".join(DocumentProcessor.content_hash(page) for page in image)
+        return DocumentProcessor.content_hash(image)
+
+    @staticmethod
+    def record_key(prompt: str, image: ImageInput = None) -> str:
+        """
+        Key identifying a prompt/image pair for recording and replay
+
+        Args:
+            prompt: Text prompt
+            image: Page image, list of page images or None
+
+        Returns:
+            SHA-256 hex digest of the prompt hash and image hash
+        """
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        image_hash = OCRBackend.image_hash(image) or "none"
+        return hashlib.sha256(f"{prompt_hash}:{image_hash}".encode()).hexdigest()
+
+
+class GeminiBackend(OCRBackend):
+    """Google Gemini Vision backend"""
+
+    name = "gemini"
+
+    def __init__(self, api_key: str, model_name: str, encoding: Optional[ImageEncoding] = None):
+        """
+        Initialize Gemini backend
+
+        Args:
+            api_key: Google Gemini API key
+            model_name: Name of the Gemini model to use
+            encoding: Upload encoding of page images (defaults to lossless PNG)
+        """
+        super().__init__(model_name)
+        self.encoding = encoding or ImageEncoding()
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(model_name)
+
+    def generate(self, prompt: str, image: ImageInput = None) -> str:
+        if image is None:
+            contents = prompt
+        else:
+            # Encode off the GIL in the CPU pool instead of inside the SDK
+            pages = image if isinstance(image, list) else [image]
+            contents = [prompt] + [
+                {"mime_type": self.encoding.mime_type, "data": DocumentProcessor.encode_image(page, self.encoding)}
+                for page in pages
+            ]
+        response = self.model.generate_content(contents)
+        return response.text
+
+
+class RecordingBackend(OCRBackend):
+    """Wraps another backend and saves every prompt/image → response pair to disk"""
+
+    name = "record"
+
+    def __init__(self, inner: OCRBackend, record_dir: str):
+        """
+        Initialize recording backend
+
+        Args:
+            inner: Backend that actually serves the calls
+            record_dir: Directory where recordings are written
+        """
+        super().__init__(inner.model_name)
+        self.inner = inner
+        self.record_dir = record_dir
+        os.makedirs(record_dir, exist_ok=True)
+
+    def generate(self, prompt: str, image: ImageInput = None) -> str:
+        response_text = self.inner.generate(prompt, image)
+
+        key = self.record_key(prompt, image)
+        record = {
+            "key": key,
+            "model_name": self.model_name,
+            "image_sha256": self.image_hash(image),
+            "prompt": prompt,
+            "response": response_text,
+            "recorded_at": time.time()
+        }
+        try:
+            # Write atomically so a concurrent replay never reads a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=self.record_dir, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(record, f)
+            os.replace(tmp_path, os.path.join(self.record_dir, f"{key}.json"))
+        except OSError as e:
+            logger.warning(f"Failed to save OCR recording {key}: {e}")
+
+        return response_text
+
+
+class ReplayBackend(OCRBackend):
+    """Serves recorded responses offline with synthetic latency and failures"""
+
+    name = "replay"
+
+    def __init__(
+        self,
+        record_dir: str,
+        model_name: str = "replay",
+        latency_ms: float = 0.0,
+        latency_jitter_ms: float = 0.0,
+        failure_rate: float = 0.0,
+        default_response: Optional[str] = None,
+        seed: Optional[int] = None
+    ):
+        """
+        Initialize replay backend
+
+        Args:
+            record_dir: Directory written by RecordingBackend
+            model_name: Model name reported to callers (cache keys etc.)
+            latency_ms: Mean synthetic latency added to every call
+            latency_jitter_ms: Uniform +/- jitter around latency_ms
+            failure_rate: Fraction of calls failing with a synthetic 429
+            default_response: Response for pairs that were never recorded
+                (None raises instead)
+            seed: Seed for reproducible latency/failure sequences
+        """
+        super().__init__(model_name)
+        self.record_dir = record_dir
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.failure_rate = failure_rate
+        self.default_response = default_response
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+
+    def generate(self, prompt: str, image: ImageInput = None) -> str:
+        with self._random_lock:
+            jitter = self._random.uniform(-self.latency_jitter_ms, self.latency_jitter_ms)
+            fail = self._random.random() < self.failure_rate
+
+        delay = max(0.0, self.latency_ms + jitter) / 1000
+        if delay:
+            time.sleep(delay)
+
+        if fail:
+            raise google_exceptions.ResourceExhausted("Synthetic replay failure (quota exceeded)")
+
+        key = self.record_key(prompt, image)
+        try:
+            with open(os.path.join(self.record_dir, f"{key}.json"), "r", encoding="utf-8") as f:
+                return json.load(f)["response"]
+        except FileNotFoundError:
+            if self.default_response is not None:
+                return self.default_response
+            raise LookupError(f"No recorded OCR response for key {key}")
+
+
+def create_ocr_backend(model_name: str) -> OCRBackend:
+    """
+    Build the OCR backend selected by Config.OCR_BACKEND
+
+    Args:
+        model_name: Model name for the Gemini backend (and reported by replay)
+
+    Returns:
+        Configured OCRBackend
+    """
+    backend = config.OCR_BACKEND.lower()
+
+    if backend == "gemini":
+        return GeminiBackend(api_key=config.GEMINI_API_KEY, model_name=model_name, encoding=ImageEncoding.from_config())
+
+    if backend == "record":
+        inner = GeminiBackend(api_key=config.GEMINI_API_KEY, model_name=model_name, encoding=ImageEncoding.from_config())
+        return RecordingBackend(inner, config.OCR_RECORD_DIR)
+
+    if backend == "replay":
+        default_response = None
+        if config.REPLAY_DEFAULT_RESPONSE_FILE:
+            with open(config.REPLAY_DEFAULT_RESPONSE_FILE, "r", encoding="utf-8") as f:
+                default_response = f.read()
+        return ReplayBackend(
+            config.OCR_RECORD_DIR,
+            model_name=model_name,
+            latency_ms=config.REPLAY_LATENCY_MS,
+            latency_jitter_ms=config.REPLAY_LATENCY_JITTER_MS,
+            failure_rate=config.REPLAY_FAILURE_RATE,
+            default_response=default_response,
+            seed=config.REPLAY_SEED
+        )
+
+    raise ValueError(f"Unknown OCR_BACKEND: {config.OCR_BACKEND}")
@@ -0,0 +1,140 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from PIL import Image
+from services.ocr_scheduler import OCRScheduler
+
+logger = logging.getLogger(__name__)
+
+
+class OCRBatcher:
+    """Groups pages of one document that are ready at about the same time into multi-page OCR calls
+
+    A batch is sent once it holds ``max_pages`` pages, once the next page
+    would exceed the pixel or token budget, or ``linger`` seconds after its
+    first page arrived. Pages a batched response could not be mapped back
+    to are retried with single-page calls.
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[List[Image.Image]], Awaitable[List[Optional[Dict[str, Any]]]]],
+        run_single: Callable[[Image.Image], Awaitable[Dict[str, Any]]],
+        max_pages: int,
+        max_pixels: int,
+        max_tokens: int,
+        expected_output_tokens: int,
+        linger: float = 0.05
+    ):
+        """
+        Initialize OCR batcher
+
+        Args:
+            run_batch: Multi-page call returning one result (or None) per image
+            run_single: Single-page call used for batches of one and for fallbacks
+            max_pages: Most pages per call
+            max_pixels: Pixel budget per call
+            max_tokens: Image plus expected output token budget per call
+            expected_output_tokens: Response tokens budgeted per page
+            linger: Seconds to wait for more pages before sending a partial batch
+        """
+        self.run_batch = run_batch
+        self.run_single = run_single
+        self.max_pages = max(1, max_pages)
+        self.max_pixels = max_pixels
+        self.max_tokens = max_tokens
+        self.expected_output_tokens = expected_output_tokens
+        self.linger = linger
+        # (image, future) pairs waiting to be sent, and the budget they use
+        self._pending: List[Tuple[Image.Image, asyncio.Future]] = []
+        self._pixels = 0
+        self._tokens = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(self, image: Image.Image) -> Dict[str, Any]:
+        """
+        Extract a page as part of the next batch
+
+        Args:
+            image: Preprocessed PIL Image of the page
+
+        Returns:
+            Raw OCR output dictionary for the page
+        """
+        pixels = image.width * image.height
+        tokens = OCRScheduler.image_tokens(image) + self.expected_output_tokens
+        if self._pending and (self._pixels + pixels > self.max_pixels or self._tokens + tokens > self.max_tokens):
+            self._flush()
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((image, future))
+        self._pixels += pixels
+        self._tokens += tokens
+
+        if len(self._pending) >= self.max_pages:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.linger, self._flush)
+        return await future
+
+    def close(self):
+        """Cancel the pending timer and any batch still running"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        for image, future in self._pending:
+            future.cancel()
+        self._pending = []
+        for task in self._tasks:
+            task.cancel()
+
+    def _flush(self):
+        """Send whatever is pending as one call"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        self._pixels = self._tokens = 0
+        # Pages whose request was cancelled while waiting are dropped
+        batch = [(image, future) for image, future in batch if not future.done()]
+        if not batch:
+            return
+        task = asyncio.get_running_loop().create_task(self._run(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[Image.Image, asyncio.Future]]):
+        """Make the call for a batch and resolve each page's future"""
+        try:
+            if len(batch) == 1:
+                results = [None]
+            else:
+                results = await self.run_batch([image for image, _ in batch])
+
+            async def resolve(image: Image.Image, future: asyncio.Future, result: Optional[Dict[str, Any]]):
+                try:
+                    if result is None:
+                        result = await self.run_single(image)
+                except Exception as e:
+                    if not future.done():
+                        future.set_exception(e)
+                    return
+                if not future.done():
+                    future.set_result(result)
+
+            if len(batch) > 1 and any(result is None for result in results):
+                logger.info(f"Retrying {sum(1 for r in results if r is None)} page(s) of a batch one by one")
+            await asyncio.gather(*(
+                resolve(image, future, result) for (image, future), result in zip(batch, results)
+            ))
+        except BaseException as e:
+            cancelled = isinstance(e, asyncio.CancelledError)
+            for _, future in batch:
+                if not future.done():
+                    if cancelled:
+                        future.cancel()
+                    else:
+                        future.set_exception(e)
+            if cancelled:
+                raise
@@ -0,0 +1,275 @@
+import logging
+import math
+import random
+import threading
+import time
+from typing import Callable, List, Union
+from PIL import Image
+from google.api_core import exceptions as google_exceptions
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+# Quota/overload responses: back off concurrency and retry
+OVERLOAD_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.TooManyRequests,
+    google_exceptions.ServiceUnavailable,
+)
+# Transient errors worth retrying without treating them as overload
+RETRYABLE_ERRORS = OVERLOAD_ERRORS + (
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+)
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at a per-minute rate
+
+    Callers reserve tokens up front and sleep off any debt, so waiters are
+    served in arrival order without polling.
+    """
+
+    def __init__(self, per_minute: float, burst_seconds: float = 10.0):
+        """
+        Initialize token bucket
+
+        Args:
+            per_minute: Sustained refill rate
+            burst_seconds: Bucket capacity expressed as seconds of refill
+        """
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount: float, deadline: float):
+        """
+        Take `amount` tokens, sleeping until they are available
+
+        Args:
+            amount: Tokens needed (clamped to the bucket capacity)
+            deadline: time.monotonic() value after which to give up
+
+        Raises:
+            TimeoutError: If the tokens would not be available before the deadline
+        """
+        amount = min(amount, self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            if now + wait > deadline:
+                self.tokens += amount
+                raise TimeoutError("OCR rate limit wait exceeds the call deadline")
+        if wait:
+            time.sleep(wait)
+
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD limit on concurrent calls
+
+    The limit grows by roughly one per window of healthy calls (latency at or
+    under the target) and is cut multiplicatively on overload, at most once
+    per round trip: only calls started after the last cut can trigger another.
+    """
+
+    def __init__(
+        self,
+        min_limit: int,
+        max_limit: int,
+        initial_limit: int,
+        target_latency: float,
+        decrease_ratio: float = 0.5
+    ):
+        """
+        Initialize limiter
+
+        Args:
+            min_limit: Floor for the concurrency limit
+            max_limit: Ceiling for the concurrency limit
+            initial_limit: Starting limit
+            target_latency: Calls slower than this (seconds) don't grow the limit
+            decrease_ratio: Multiplier applied to the limit on overload
+        """
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(self.max_limit, max(self.min_limit, initial_limit)))
+        self.target_latency = target_latency
+        self.decrease_ratio = decrease_ratio
+        self.in_flight = 0
+        self.last_decrease = 0.0
+        self._condition = threading.Condition()
+        metrics.OCR_CONCURRENCY_LIMIT.set(self.limit)
+
+    def acquire(self, deadline: float):
+        """
+        Wait for a free slot under the current limit
+
+        Args:
+            deadline: time.monotonic() value after which to give up
+
+        Raises:
+            TimeoutError: If no slot frees up before the deadline
+        """
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError("No OCR concurrency slot before the call deadline")
+                self._condition.wait(remaining)
+            self.in_flight += 1
+
+    def release(self, started: float, latency: float, outcome: str):
+        """
+        Free a slot and adapt the limit
+
+        Args:
+            started: time.monotonic() when the call was issued
+            latency: Call duration in seconds
+            outcome: "success", "overload" or "error"
+        """
+        with self._condition:
+            self.in_flight -= 1
+            if outcome == "overload":
+                if started > self.last_decrease:
+                    self.limit = max(self.min_limit, self.limit * self.decrease_ratio)
+                    self.last_decrease = time.monotonic()
+                    logger.warning(f"OCR overloaded, concurrency limit reduced to {int(self.limit)}")
+            elif outcome == "success" and latency <= self.target_latency:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            metrics.OCR_CONCURRENCY_LIMIT.set(self.limit)
+            self._condition.notify_all()
+
+
+class OCRScheduler:
+    """Process-wide gate for model calls: rate limits, adaptive concurrency, retries"""
+
+    # Gemini bills each image as 258 tokens per 768x768 tile
+    IMAGE_TILE_SIZE = 768
+    IMAGE_TILE_TOKENS = 258
+
+    def __init__(
+        self,
+        requests_per_minute: float = 0,
+        tokens_per_minute: float = 0,
+        min_concurrency: int = 1,
+        max_concurrency: int = 16,
+        initial_concurrency: int = 4,
+        target_latency: float = 20.0,
+        max_retries: int = 4,
+        retry_base_delay: float = 1.0,
+        retry_max_delay: float = 30.0,
+        call_deadline: float = 120.0,
+        expected_output_tokens: int = 1500
+    ):
+        """
+        Initialize OCR scheduler
+
+        Args:
+            requests_per_minute: Request quota (0 disables the limit)
+            tokens_per_minute: Token quota (0 disables the limit)
+            min_concurrency: Floor for the adaptive concurrency limit
+            max_concurrency: Ceiling for the adaptive concurrency limit
+            initial_concurrency: Starting concurrency limit
+            target_latency: Seconds per call under which concurrency may grow
+            max_retries: Retries after a transient failure
+            retry_base_delay: Base of the exponential (full-jitter) backoff
+            retry_max_delay: Cap on a single backoff sleep
+            call_deadline: Seconds a call may spend waiting, running and retrying
+            expected_output_tokens: Response tokens reserved per call
+        """
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self.limiter = AdaptiveConcurrencyLimiter(
+            min_concurrency, max_concurrency, initial_concurrency, target_latency
+        )
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.call_deadline = call_deadline
+        self.expected_output_tokens = expected_output_tokens
+        self._random = random.Random()
+
+    @classmethod
+    def image_tokens(cls, image: Image.Image) -> int:
+        """Input tokens billed for one image"""
+        tiles = math.ceil(image.width / cls.IMAGE_TILE_SIZE) * math.ceil(image.height / cls.IMAGE_TILE_SIZE)
+        return max(1, tiles) * cls.IMAGE_TILE_TOKENS
+
+    def estimate_tokens(self, prompt: str, image: Union[Image.Image, List[Image.Image], None] = None) -> int:
+        """
+        Rough token cost of a call, used for the tokens-per-minute budget
+
+        Args:
+            prompt: Text prompt
+            image: Page image, list of page images (one response per page) or None
+
+        Returns:
+            Estimated prompt + image + response tokens
+        """
+        images = image if isinstance(image, list) else [image] if image is not None else []
+        tokens = len(prompt) // 4 + self.expected_output_tokens * max(1, len(images))
+        return tokens + sum(self.image_tokens(page) for page in images)
+
+    def run(
+        self,
+        generate: Callable[[str, Union[Image.Image, List[Image.Image], None]], str],
+        prompt: str,
+        image: Union[Image.Image, List[Image.Image], None] = None,
+        stage: str = "ocr"
+    ) -> str:
+        """
+        Run a blocking model call under the rate limits, retrying transient failures
+
+        Args:
+            generate: Backend call taking (prompt, image)
+            prompt: Text prompt
+            image: Page image, list of page images or None
+            stage: Metrics stage name for the model call itself
+
+        Returns:
+            Raw response text
+
+        Raises:
+            The last transient error once retries or the deadline run out,
+            TimeoutError if the call could not be scheduled in time, or any
+            non-transient error from the backend
+        """
+        deadline = time.monotonic() + self.call_deadline
+        tokens = self.estimate_tokens(prompt, image)
+        attempt = 0
+
+        while True:
+            with metrics.timed("ocr_queue"):
+                if self.request_bucket is not None:
+                    self.request_bucket.acquire(1, deadline)
+                if self.token_bucket is not None:
+                    self.token_bucket.acquire(tokens, deadline)
+                self.limiter.acquire(deadline)
+
+            started = time.monotonic()
+            outcome = "error"
+            try:
+                with metrics.timed(stage):
+                    response_text = generate(prompt, image)
+                outcome = "success"
+                return response_text
+            except RETRYABLE_ERRORS as e:
+                outcome = "overload" if isinstance(e, OVERLOAD_ERRORS) else "error"
+                error = e
+            finally:
+                self.limiter.release(started, time.monotonic() - started, outcome)
+
+            attempt += 1
+            delay = self._random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** (attempt - 1)))
+            if attempt > self.max_retries or time.monotonic() + delay >= deadline:
+                logger.error(f"OCR call failed after {attempt} attempt(s): {error}")
+                raise error
+
+            metrics.OCR_RETRIES.inc(reason=type(error).__name__)
+            logger.warning(f"OCR call failed ({error}), retry {attempt}/{self.max_retries} in {delay:.2f}s")
+            time.sleep(delay)
@@ -1,8 +1,12 @@
-import google.generativeai as genai
 from PIL import Image
 import logging
 import json
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
+from services.compact_output import CompactOutput
+from services.json_repair import JSONRepair
+from services.ocr_backends import ImageInput, OCRBackend, GeminiBackend
+from services.ocr_scheduler import OCRScheduler
+from services import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -10,31 +14,11 @@ logger = logging.getLogger(__name__)
 class OCRService:
     """OCR service using Google Gemini Vision API"""
     
-    def __init__(self, api_key: str, model_name: str = "gemini-1.5-pro-latest"):
-        """
-        Initialize OCR service
-        
-        Args:
-            api_key: Google Gemini API key
-            model_name: Name of the Gemini model to use
-        """
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel(model_name)
-        logger.info(f"OCR Service initialized with model: {model_name}")
+    # Bump whenever the extraction prompt changes so cached results are invalidated
+    PROMPT_VERSION = "1"
     
-    def extract_bill_data(self, image: Image.Image) -> Dict[str, Any]:
-        """
-        Extract structured bill data from image using Gemini Vision
-        
-        Args:
-            image: PIL Image object of the bill
-            
-        Returns:
-            Dictionary containing extracted bill data
-        """
-        try:
-            # Create detailed prompt for bill extraction
-            prompt = """Extract all line items from this medical bill/invoice image.
+    # Prompt for bill extraction
+    PROMPT = """Extract all line items from this medical bill/invoice image.
 
 For each line item, provide:
 - item_name: product/service name
@@ -64,67 +48,326 @@ Return ONLY this JSON (no markdown, no code blocks):
   "actual_bill_total": 100.0
 }
 """
+    
+    # Same fields as PROMPT, answered as a header row plus one value array per line item
+    COMPACT_PROMPT = """Extract all line items from this medical bill/invoice image.
+
+Return one row per line item with these columns, in this order:
+- item_name: product/service name
+- item_quantity: quantity (use 0 if not shown)
+- item_rate: price per unit (use 0 if not shown)
+- item_amount: total amount (REQUIRED - exact value, no rounding)
+
+IMPORTANT:
+- Only extract MONETARY amounts (not dates, invoice numbers, or IDs)
+- page_type must be one of: "Bill Detail", "Final Bill", or "Pharmacy"
+- Write numbers without quotes, currency symbols or thousands separators
+- Extract amounts exactly as shown
+
+Return ONLY this JSON (no markdown, no code blocks):
+{"page_type":"Bill Detail","columns":["item_name","item_quantity","item_rate","item_amount"],"rows":[["Item 1",1,100,100]],"extracted_total":100,"actual_bill_total":100}
+"""
+    
+    # Prompt for several pages in one call; pages are the images in order
+    BATCH_PROMPT = """Extract all line items from each of these {count} medical bill/invoice page images.
+The images are pages 1 to {count}, in the order given. Treat every image separately.
+
+For each line item, provide:
+- item_name: product/service name
+- item_quantity: quantity (use 0.0 if not shown)
+- item_rate: price per unit (use 0.0 if not shown)  
+- item_amount: total amount (REQUIRED - exact value, no rounding)
+
+IMPORTANT:
+- Only extract MONETARY amounts (not dates, invoice numbers, or IDs)
+- page_type must be one of: "Bill Detail", "Final Bill", or "Pharmacy"
+- Use 0.0 for missing quantity/rate values
+- Extract amounts exactly as shown
+- Return exactly one entry per image, with page_no = the image's position (1 to {count}),
+  even when the page has no line items
+
+Return ONLY this JSON (no markdown, no code blocks):
+{{
+  "pages": [
+    {{
+      "page_no": "1",
+      "page_type": "Bill Detail",
+      "line_items": [
+        {{
+          "item_name": "Item 1",
+          "item_quantity": 1.0,
+          "item_rate": 100.0,
+          "item_amount": 100.0
+        }}
+      ],
+      "extracted_total": 100.0,
+      "actual_bill_total": 100.0
+    }}
+  ]
+}}
+"""
+    
+    # COMPACT_PROMPT's columnar answer for several pages in one call
+    COMPACT_BATCH_PROMPT = """Extract all line items from each of these {count} medical bill/invoice page images.
+The images are pages 1 to {count}, in the order given. Treat every image separately.
+
+Return one row per line item with these columns, in this order:
+- item_name: product/service name
+- item_quantity: quantity (use 0 if not shown)
+- item_rate: price per unit (use 0 if not shown)
+- item_amount: total amount (REQUIRED - exact value, no rounding)
+
+IMPORTANT:
+- Only extract MONETARY amounts (not dates, invoice numbers, or IDs)
+- page_type must be one of: "Bill Detail", "Final Bill", or "Pharmacy"
+- Write numbers without quotes, currency symbols or thousands separators
+- Extract amounts exactly as shown
+- Return exactly one entry per image, with page_no = the image's position (1 to {count}),
+  even when the page has no line items
+
+Return ONLY this JSON (no markdown, no code blocks):
+{{"columns":["item_name","item_quantity","item_rate","item_amount"],"pages":[{{"page_no":"1","page_type":"Bill Detail","rows":[["Item 1",1,100,100]],"extracted_total":100,"actual_bill_total":100}}]}}
+"""
+    
+    def __init__(
+        self,
+        api_key: str = "",
+        model_name: str = "gemini-1.5-pro-latest",
+        backend: Optional[OCRBackend] = None,
+        scheduler: Optional[OCRScheduler] = None,
+        output_format: str = "objects"
+    ):
+        """
+        Initialize OCR service
+        
+        Args:
+            api_key: Google Gemini API key (unused when a backend is given)
+            model_name: Name of the Gemini model to use
+            backend: Model backend (defaults to GeminiBackend)
+            scheduler: Optional rate limiter/retry policy shared by all model calls
+            output_format: "objects" (one JSON object per line item) or
+                "compact" (header row plus value arrays, fewer output tokens)
+        """
+        if output_format not in ("objects", "compact"):
+            raise ValueError(f"Unknown OCR output format: {output_format}")
+        self.backend = backend or GeminiBackend(api_key=api_key, model_name=model_name)
+        self.scheduler = scheduler
+        self.model_name = self.backend.model_name
+        self.output_format = output_format
+        logger.info(f"OCR Service initialized with {self.backend.name} backend, model: {self.model_name}")
+    
+    def generate(self, prompt: str, image: ImageInput = None, stage: str = "ocr") -> str:
+        """
+        Call the backend, through the scheduler when one is configured
+        
+        Args:
+            prompt: Text prompt
+            image: Page image, list of page images or None
+            stage: Metrics stage name for the call
+            
+        Returns:
+            Raw response text
+        """
+        if self.scheduler is None:
+            with metrics.timed(stage):
+                return self.backend.generate(prompt, image)
+        return self.scheduler.run(self.backend.generate, prompt, image, stage=stage)
+    
+    @staticmethod
+    def strip_markdown(response_text: str) -> str:
+        """
+        Remove a markdown code fence around a JSON response
+        
+        Args:
+            response_text: Raw response text
             
+        Returns:
+            The JSON text
+        """
+        response_text = response_text.strip()
+        if "```json" in response_text:
+            # Extract content between ```json and ```
+            start = response_text.find("```json") + 7
+            end = response_text.find("```", start)
+            if end != -1:
+                response_text = response_text[start:end]
+        elif response_text.startswith("```"):
+            # Remove opening ```
+            response_text = response_text[3:]
+            # Remove closing ```
+            if response_text.endswith("```"):
+                response_text = response_text[:-3]
+        return response_text.strip()
+    
+    @staticmethod
+    def repair_json(response_text: str) -> Optional[Dict[str, Any]]:
+        """
+        Parse malformed extraction JSON locally
+        
+        Args:
+            response_text: Model response that json.loads rejected
+            
+        Returns:
+            Extraction dict with every complete line item, or None if no
+            line item could be recovered (an empty salvage is a failure, not
+            a page without items). Output that was cut off is flagged with
+            "truncated" so it is not cached as the page's full result
+        """
+        try:
+            data, truncated = JSONRepair.loads(response_text)
+        except ValueError:
+            return None
+        extracted_data = JSONRepair.normalize_extraction(CompactOutput.decode(data))
+        if extracted_data is None or not extracted_data["line_items"]:
+            return None
+        if truncated:
+            logger.warning("Model output was cut off; kept the complete line items")
+            extracted_data["truncated"] = True
+        return extracted_data
+    
+    def extract_bill_data_batch(self, images: List[Image.Image]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Extract several pages in one Gemini call
+        
+        The response is mapped back onto the images by page_no. Pages the
+        response leaves out, duplicates or garbles come back as None so the
+        caller can retry them with single-page calls; no JSON repair call is
+        made for batches. When the output was cut off, the last page in it
+        is treated as garbled too, since its item list may be incomplete.
+        
+        Args:
+            images: PIL Images of the pages, in the order sent
+            
+        Returns:
+            Extracted data per image (same order), None where unusable
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(images)
+        try:
+            logger.info(f"Sending {len(images)} pages to Gemini Vision API in one request")
+            prompt = self.COMPACT_BATCH_PROMPT if self.output_format == "compact" else self.BATCH_PROMPT
+            response_text = self.strip_markdown(self.generate(prompt.format(count=len(images)), list(images)))
+            with metrics.timed("parse"):
+                repaired = truncated = False
+                try:
+                    data = json.loads(response_text)
+                except json.JSONDecodeError:
+                    data, truncated = JSONRepair.loads(response_text)
+                    repaired = True
+                    metrics.JSON_REPAIRS.inc(outcome="local")
+                    logger.warning(f"Repaired multi-page JSON locally{' (output was cut off)' if truncated else ''}")
+                data = CompactOutput.decode_pages(data)
+        except Exception as e:
+            logger.warning(f"Multi-page extraction of {len(images)} pages failed: {e}")
+            metrics.OCR_BATCHES.inc(outcome="failed")
+            return results
+        
+        pages = data.get("pages") if isinstance(data, dict) else data
+        if not isinstance(pages, list):
+            logger.warning("Multi-page response has no pages list")
+            metrics.OCR_BATCHES.inc(outcome="failed")
+            return results
+        
+        repeated = set()
+        last_index = None
+        for page in pages:
+            if repaired:
+                page = JSONRepair.normalize_extraction(page) if isinstance(page, dict) else None
+                if page is not None and not page["line_items"]:
+                    # Nothing salvaged for this page: retry it on its own
+                    continue
+            try:
+                index = int(str(page.get("page_no", "")).strip()) - 1
+            except (AttributeError, ValueError):
+                continue
+            if not 0 <= index < len(images) or not isinstance(page.get("line_items"), list):
+                continue
+            if results[index] is not None or index in repeated:
+                # The same page twice: can't tell which entry belongs to it
+                logger.warning(f"Multi-page response repeats page {index + 1}")
+                repeated.add(index)
+                results[index] = None
+                continue
+            results[index] = page
+            last_index = index
+        
+        if truncated and last_index is not None:
+            # The cut fell inside (or right after) this page's items
+            logger.warning(f"Multi-page response was cut off in page {last_index + 1}")
+            results[last_index] = None
+        
+        missing = sum(1 for result in results if result is None)
+        metrics.OCR_BATCHES.inc(
+            outcome="complete" if missing == 0 else "failed" if missing == len(images) else "partial"
+        )
+        if missing:
+            logger.warning(f"Multi-page response unusable for {missing} of {len(images)} page(s)")
+        return results
+    
+    def extract_bill_data(self, image: Image.Image) -> Dict[str, Any]:
+        """
+        Extract structured bill data from image using Gemini Vision
+        
+        Args:
+            image: PIL Image object of the bill
+            
+        Returns:
+            Dictionary containing extracted bill data
+        """
+        try:
             logger.info("Sending image to Gemini Vision API for extraction")
             
             # Generate content with image
-            response = self.model.generate_content([prompt, image])
+            prompt = self.COMPACT_PROMPT if self.output_format == "compact" else self.PROMPT
+            response_text = self.generate(prompt, image)
             
             # Extract text from response
-            response_text = response.text.strip()
+            response_text = response_text.strip()
             logger.info(f"Received response from Gemini: {response_text[:200]}...")
             
             # Clean up response (remove markdown code blocks if present)
-            if "```json" in response_text:
-                # Extract content between ```json and ```
-                start = response_text.find("```json") + 7
-                end = response_text.find("```", start)
-                if end != -1:
-                    response_text = response_text[start:end]
-            elif response_text.startswith("```"):
-                # Remove opening ```
-                response_text = response_text[3:]
-                # Remove closing ```
-                if response_text.endswith("```"):
-                    response_text = response_text[:-3]
-            
-            response_text = response_text.strip()
+            response_text = self.strip_markdown(response_text)
             
             # Parse JSON response
             try:
-                extracted_data = json.loads(response_text)
+                with metrics.timed("parse"):
+                    extracted_data = CompactOutput.decode(json.loads(response_text))
                 logger.info(f"Successfully parsed JSON response with {len(extracted_data.get('line_items', []))} items")
                 return extracted_data
             except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse JSON response: {e}")
-                logger.error(f"Response text (first 500 chars): {response_text[:500]}")
+                logger.warning(f"Failed to parse JSON response: {e}")
+                logger.warning(f"Response text (first 500 chars): {response_text[:500]}")
                 
-                # Try to ask Gemini again with stricter JSON format
+                # Salvage locally first: fences, trailing commas, stray quotes, cut-off output
+                with metrics.timed("parse"):
+                    extracted_data = self.repair_json(response_text)
+                if extracted_data is not None:
+                    logger.info(f"Repaired JSON locally with {len(extracted_data['line_items'])} items")
+                    metrics.JSON_REPAIRS.inc(outcome="local")
+                    return extracted_data
+                
+                # Last resort: ask Gemini again with stricter JSON format (whole response, not a prefix)
                 repair_prompt = f"""The previous response had invalid JSON. Please fix it and return ONLY valid JSON with no special characters in strings.
 
 Previous response:
-{response_text[:1000]}
+{response_text}
 
 Return corrected JSON with properly escaped quotes."""
                 
                 try:
-                    repair_response = self.model.generate_content(repair_prompt)
-                    repaired_text = repair_response.text.strip()
-                    
-                    # Clean again
-                    if "```json" in repaired_text:
-                        start = repaired_text.find("```json") + 7
-                        end = repaired_text.find("```", start)
-                        if end != -1:
-                            repaired_text = repaired_text[start:end]
-                    
-                    repaired_text = repaired_text.strip()
-                    extracted_data = json.loads(repaired_text)
-                    logger.info("Successfully repaired and parsed JSON")
-                    return extracted_data
-                except:
-                    pass
+                    repaired_text = self.strip_markdown(self.generate(repair_prompt, stage="json_repair"))
+                    try:
+                        extracted_data = CompactOutput.decode(json.loads(repaired_text))
+                    except json.JSONDecodeError:
+                        extracted_data = self.repair_json(repaired_text)
+                    if extracted_data is not None:
+                        logger.info("Successfully repaired and parsed JSON")
+                        metrics.JSON_REPAIRS.inc(outcome="success")
+                        return extracted_data
+                except Exception as repair_error:
+                    logger.error(f"JSON repair call failed: {repair_error}")
                 
+                metrics.JSON_REPAIRS.inc(outcome="failure")
+                metrics.OCR_FAILURES.inc()
                 # Last resort: return empty structure
                 return {
                     "page_no": "1",
@@ -137,6 +380,7 @@ Return corrected JSON with properly escaped quotes."""
                 
         except Exception as e:
             logger.error(f"Error during bill extraction: {e}")
+            metrics.OCR_FAILURES.inc()
             return {
                 "page_no": "1",
                 "line_items": [],
@@ -0,0 +1,188 @@
+import asyncio
+import copy
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from PIL import Image
+from services.document_processor import DocumentProcessor
+from services.page_filter import PageFilter, PageSignature
+
+logger = logging.getLogger(__name__)
+
+
+class PageCache:
+    """LRU cache of parsed OCR output keyed on a hash of the page image
+
+    In perceptual mode the dHash only shortlists: bills printed from the
+    same template hash alike whatever their figures, so every entry keeps
+    a downscaled grayscale copy of its page and a hit must also pass the
+    PageFilter pixel comparison.
+    """
+
+    def __init__(self, max_entries: int = 4096, hash_mode: str = "exact", max_change: float = 0.02):
+        """
+        Initialize page cache
+
+        Args:
+            max_entries: Maximum number of pages kept (least recently used are evicted)
+            hash_mode: "exact" (pixel SHA-256) or "perceptual" (dHash
+                confirmed by a pixel comparison)
+            max_change: Largest share of changed pixels (relative to the
+                page's ink) for a perceptual match
+        """
+        if hash_mode not in ("exact", "perceptual"):
+            raise ValueError(f"Unsupported page cache hash mode: {hash_mode}")
+
+        self.max_entries = max_entries
+        self.hash_mode = hash_mode
+        self.max_change = max_change
+
+        # key -> (OCR data, signature of the page it was read from in perceptual mode)
+        self._entries: "OrderedDict[str, Tuple[Dict[str, Any], Optional[PageSignature]]]" = OrderedDict()
+        self._pending: Dict[str, Tuple[asyncio.Future, Optional[PageSignature]]] = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def make_key(self, image: Image.Image, model_name: str, prompt_version: str) -> str:
+        """
+        Build the cache key for a preprocessed page
+
+        Args:
+            image: Preprocessed PIL Image of the page
+            model_name: OCR model used for extraction
+            prompt_version: Version of the extraction prompt
+
+        Returns:
+            Cache key string
+        """
+        if self.hash_mode == "perceptual":
+            image_hash = DocumentProcessor.perceptual_hash(image)
+        else:
+            image_hash = DocumentProcessor.content_hash(image)
+        return f"{model_name}:{prompt_version}:{self.hash_mode}:{image_hash}"
+
+    def signature(self, image: Image.Image) -> Optional[PageSignature]:
+        """
+        Downscaled copy of a page that perceptual matches are confirmed
+        against (CPU-bound; run it off the event loop)
+
+        Args:
+            image: Preprocessed PIL Image of the page
+
+        Returns:
+            PageSignature in perceptual mode, None in exact mode
+        """
+        if self.hash_mode != "perceptual":
+            return None
+        return PageFilter.signature(image)
+
+    def _matches(self, stored: Optional[PageSignature], signature: Optional[PageSignature]) -> bool:
+        """Whether a page is close enough to the one an entry was read from"""
+        if stored is None:
+            return True
+        return signature is not None and PageFilter.pixel_change(signature, stored) <= self.max_change
+
+    def get(self, key: str, signature: Optional[PageSignature] = None) -> Optional[Dict[str, Any]]:
+        """
+        Look up parsed OCR output for a page
+
+        Args:
+            key: Cache key from make_key
+            signature: signature() of the page (required for perceptual hits)
+
+        Returns:
+            Copy of the cached OCR data or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            ocr_data, stored = entry
+            if not self._matches(stored, signature):
+                return None
+            self._entries.move_to_end(key)
+        return copy.deepcopy(ocr_data)
+
+    def set(self, key: str, ocr_data: Dict[str, Any], signature: Optional[PageSignature] = None):
+        """
+        Store parsed OCR output for a page
+
+        Args:
+            key: Cache key from make_key
+            ocr_data: OCR output (results carrying an "error" or salvaged
+                from cut-off output are not cached)
+            signature: signature() of the page
+        """
+        if not self.reusable(ocr_data):
+            return
+
+        with self._lock:
+            self._entries[key] = (copy.deepcopy(ocr_data), signature)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Dict[str, Any]]],
+        signature: Optional[PageSignature] = None
+    ) -> Dict[str, Any]:
+        """
+        Return cached OCR output, or compute it once for concurrent identical pages
+
+        Args:
+            key: Cache key from make_key
+            compute: Coroutine factory running the OCR call on a miss
+            signature: signature() of the page (required for perceptual hits)
+
+        Returns:
+            OCR output for the page
+        """
+        ocr_data = self.get(key, signature)
+        if ocr_data is not None:
+            self.hits += 1
+            logger.info("Page cache hit, skipping OCR")
+            return ocr_data
+
+        pending = self._pending.get(key)
+        if pending is not None and self._matches(pending[1], signature):
+            ocr_data = await asyncio.shield(pending[0])
+            if ocr_data is not None:
+                self.hits += 1
+                logger.info("Reusing OCR result of identical in-flight page")
+                return copy.deepcopy(ocr_data)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        if pending is None:
+            self._pending[key] = (future, signature)
+        ocr_data = None
+        try:
+            ocr_data = await compute()
+            self.set(key, ocr_data, signature)
+        finally:
+            # Waiters fall back to their own OCR call if the leader failed
+            future.set_result(ocr_data if ocr_data is not None and self.reusable(ocr_data) else None)
+            if self._pending.get(key, (None,))[0] is future:
+                del self._pending[key]
+        return ocr_data
+
+    @staticmethod
+    def reusable(ocr_data: Dict[str, Any]) -> bool:
+        """Whether OCR output is the page's complete result (not a failure or a partial salvage)"""
+        return "error" not in ocr_data and not ocr_data.get("truncated")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries)
+            }
@@ -0,0 +1,154 @@
+import logging
+from typing import List, Optional, Tuple
+from PIL import Image, ImageChops, ImageStat
+from models import SkippedPage
+from services.document_processor import DocumentProcessor
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class PageSignature:
+    """Cheap measurements of a page used to decide whether it needs OCR"""
+
+    def __init__(self, ink_pixels: int, ink_ratio: float, stddev: float, dhash: int, gray: Image.Image):
+        self.ink_pixels = ink_pixels
+        self.ink_ratio = ink_ratio
+        self.stddev = stddev
+        self.dhash = dhash
+        self.gray = gray
+
+
+class PageFilter:
+    """Skips blank and near-duplicate pages of one document before OCR
+
+    One instance per document: duplicates are only looked for among the
+    pages of the same document. Skip decisions are counted in metrics and
+    kept in ``skipped`` for the response metadata.
+    """
+
+    # Longest side of the grayscale copy the measurements are taken on
+    ANALYSIS_SIZE = 512
+
+    # Pixels this much darker than the paper count as ink
+    INK_CONTRAST = 64
+
+    # Misalignment (in analysis pixels) tolerated between a page and its duplicate
+    ALIGN_SHIFT = 2
+
+    def __init__(
+        self,
+        blank_ink_ratio: float = 0.0005,
+        blank_max_stddev: float = 1.5,
+        duplicate_distance: int = 8,
+        duplicate_max_change: float = 0.02
+    ):
+        """
+        Initialize page filter
+
+        Args:
+            blank_ink_ratio: Pages with a smaller fraction of ink pixels are blank
+            blank_max_stddev: Pages with less luminance spread are blank (uniform scans)
+            duplicate_distance: Largest dHash Hamming distance (of 256 bits) for a duplicate
+            duplicate_max_change: Largest share of changed pixels (relative to
+                the page's ink) for a duplicate
+        """
+        self.blank_ink_ratio = blank_ink_ratio
+        self.blank_max_stddev = blank_max_stddev
+        self.duplicate_distance = duplicate_distance
+        self.duplicate_max_change = duplicate_max_change
+        self.skipped: List[SkippedPage] = []
+        # (page_num, signature) of pages sent to OCR
+        self._kept: List[Tuple[int, PageSignature]] = []
+
+    @classmethod
+    def signature(cls, image: Image.Image) -> PageSignature:
+        """
+        Measure a page (CPU-bound; run it off the event loop)
+
+        Args:
+            image: Preprocessed PIL Image of the page
+
+        Returns:
+            PageSignature of the page
+        """
+        gray = image.convert("L")
+        gray.thumbnail((cls.ANALYSIS_SIZE, cls.ANALYSIS_SIZE), Image.Resampling.BOX)
+
+        # Ink is well below the paper level
+        histogram = gray.histogram()
+        total = gray.width * gray.height
+        paper = DocumentProcessor.paper_level(histogram)
+        ink = sum(histogram[:max(0, paper - cls.INK_CONTRAST)])
+
+        return PageSignature(
+            ink_pixels=ink,
+            ink_ratio=ink / total,
+            stddev=ImageStat.Stat(gray).stddev[0],
+            dhash=int(DocumentProcessor.perceptual_hash(gray), 16),
+            gray=gray
+        )
+
+    def check(self, page_num: int, signature: PageSignature) -> Optional[SkippedPage]:
+        """
+        Decide whether a page can skip OCR
+
+        Pages that are kept become candidates for later duplicate checks.
+
+        Args:
+            page_num: 1-based page number
+            signature: Output of signature() for the page
+
+        Returns:
+            SkippedPage describing the decision, or None if the page needs OCR
+        """
+        skipped = None
+        if signature.ink_ratio < self.blank_ink_ratio or signature.stddev < self.blank_max_stddev:
+            skipped = SkippedPage(page_no=str(page_num), reason="blank")
+        else:
+            for kept_num, kept in self._kept:
+                # dHash shortlists candidates; the pixel comparison decides
+                if (signature.dhash ^ kept.dhash).bit_count() > self.duplicate_distance:
+                    continue
+                if self.pixel_change(signature, kept) <= self.duplicate_max_change:
+                    skipped = SkippedPage(page_no=str(page_num), reason="duplicate", duplicate_of=str(kept_num))
+                    break
+
+        if skipped is None:
+            self._kept.append((page_num, signature))
+            return None
+
+        metrics.PAGES_SKIPPED.inc(reason=skipped.reason)
+        logger.info(
+            f"Skipping page {page_num}: {skipped.reason}"
+            + (f" of page {skipped.duplicate_of}" if skipped.duplicate_of else f" (ink {signature.ink_ratio:.4f})")
+        )
+        self.skipped.append(skipped)
+        return skipped
+
+    @classmethod
+    def pixel_change(cls, page: PageSignature, other: PageSignature) -> float:
+        """
+        Share of pixels that differ by an ink-level amount, relative to the ink
+        on the page, at the best alignment within ALIGN_SHIFT pixels
+
+        Pages with the same layout but different figures change a large part
+        of their ink; a re-encoded or rescanned copy changes very little.
+        """
+        if page.gray.size != other.gray.size:
+            return 1.0
+        ink = max(1, page.ink_pixels, other.ink_pixels)
+        best = 1.0
+        shifts = [(0, 0)] + [
+            (dx, dy)
+            for dx in range(-cls.ALIGN_SHIFT, cls.ALIGN_SHIFT + 1)
+            for dy in range(-cls.ALIGN_SHIFT, cls.ALIGN_SHIFT + 1)
+            if dx or dy
+        ]
+        for dx, dy in shifts:
+            shifted = ImageChops.offset(other.gray, dx, dy) if dx or dy else other.gray
+            histogram = ImageChops.difference(page.gray, shifted).histogram()
+            best = min(best, sum(histogram[cls.INK_CONTRAST:]) / ink)
+            if best == 0.0:
+                break
+        return best
@@ -0,0 +1,459 @@
+import asyncio
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+from PIL import Image
+from config import config
+from models import PagewiseLineItems, PageSource
+from services.content_crop import ContentCropper
+from services.document_processor import DocumentProcessor
+from services.extraction_service import ExtractionService
+from services.ocr_batcher import OCRBatcher
+from services.ocr_service import OCRService
+from services.page_cache import PageCache
+from services.page_filter import PageFilter
+from services.page_tiler import Band, PageTiler
+from services.reconciliation_service import ReconciliationService
+from services.text_layer import TextLayerPage
+from services import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class PagePipeline:
+    """Runs preprocessing and OCR for the pages of a document concurrently"""
+
+    # Shared by every request so the total number of OCR calls stays bounded
+    _global_semaphore: Optional[asyncio.Semaphore] = None
+    _ocr_executor: Optional[ThreadPoolExecutor] = None
+
+    def __init__(
+        self,
+        ocr_service: OCRService,
+        max_concurrency: Optional[int] = None,
+        page_cache: Optional[PageCache] = None,
+        batch_pages: Optional[int] = None,
+        cascade_services: Optional[List[OCRService]] = None,
+        page_tiler: Optional[PageTiler] = None,
+        content_cropper: Optional[ContentCropper] = None
+    ):
+        """
+        Initialize page pipeline
+
+        Args:
+            ocr_service: OCR service used to extract each page
+            max_concurrency: Pages processed in parallel per request
+                (defaults to Config.PAGE_CONCURRENCY)
+            page_cache: Optional cache reusing OCR output for identical pages
+            batch_pages: Most pages sent in one OCR call (defaults to
+                Config.OCR_BATCH_PAGES; 1 disables multi-page calls)
+            cascade_services: Stronger models, in order, that re-run pages
+                whose line items don't add up to the printed total
+            page_tiler: Optional tiler splitting tall or dense pages into
+                bands that are OCR'd concurrently
+            content_cropper: Optional cropper cutting empty margins off
+                pages (and bands) before upload
+        """
+        self.ocr_service = ocr_service
+        self.cascade_services = list(cascade_services or [])
+        self.page_cache = page_cache
+        self.page_tiler = page_tiler
+        self.content_cropper = content_cropper
+        self.max_concurrency = max(1, max_concurrency or config.PAGE_CONCURRENCY)
+        self.batch_pages = max(1, batch_pages or config.OCR_BATCH_PAGES)
+
+    @property
+    def model_key(self) -> str:
+        """Models that can produce a page, for result cache keys"""
+        return ">".join(service.model_name for service in [self.ocr_service] + self.cascade_services)
+
+    @classmethod
+    def global_semaphore(cls) -> asyncio.Semaphore:
+        """Process-wide limit on in-flight OCR calls"""
+        if cls._global_semaphore is None:
+            cls._global_semaphore = asyncio.Semaphore(max(1, config.OCR_MAX_CONCURRENCY))
+        return cls._global_semaphore
+
+    @classmethod
+    def ocr_executor(cls) -> ThreadPoolExecutor:
+        """Thread pool for blocking OCR calls, sized to the process-wide limit"""
+        if cls._ocr_executor is None:
+            cls._ocr_executor = ThreadPoolExecutor(
+                max_workers=max(1, config.OCR_MAX_CONCURRENCY),
+                thread_name_prefix="ocr"
+            )
+        return cls._ocr_executor
+
+    async def iter_page_results(
+        self,
+        pages: Iterator[Image.Image],
+        page_filter: Optional[PageFilter] = None,
+        page_sources: Optional[List[PageSource]] = None,
+        failed_pages: Optional[List[int]] = None
+    ) -> AsyncIterator[PagewiseLineItems]:
+        """
+        Extract line items from lazily rendered pages, yielding each page as it completes
+
+        Pages are pulled from the iterator in a worker thread and handed to
+        OCR as soon as they are rendered. At most PAGE_CONCURRENCY +
+        RASTER_WINDOW pages are held in memory at any time (with multi-page
+        calls, PAGE_CONCURRENCY calls' worth of pages).
+
+        Args:
+            pages: Iterator of pages in order (e.g. DocumentProcessor.iter_pages)
+            page_filter: Optional per-document filter skipping blank and
+                duplicate pages before OCR
+            page_sources: Optional list receiving the source (and cascade
+                tier) of every page that produced items
+            failed_pages: Optional list receiving the number of every page
+                whose OCR failed (in whole or in some of its bands) or was
+                salvaged from cut-off output
+
+        Yields:
+            PagewiseLineItems in completion order (page_no identifies the page)
+        """
+        # With multi-page calls, enough pages must be in flight to fill each batch
+        in_flight = self.max_concurrency * self.batch_pages
+        semaphore = asyncio.Semaphore(in_flight)
+        # Pages rendered but not yet finished
+        backlog = asyncio.Semaphore(in_flight + max(1, config.RASTER_WINDOW))
+        batcher = self.create_batcher()
+        # Receives (page_num, result) per page, then (None, page_count) once rendering ends
+        completed: asyncio.Queue = asyncio.Queue()
+        tasks = []
+
+        async def run(page_num: int, image: Image.Image, previous: Optional[asyncio.Event], screened: asyncio.Event):
+            page = None
+            preprocessed = None
+            try:
+                try:
+                    if page_filter is not None and not isinstance(image, TextLayerPage):
+                        try:
+                            preprocessed = await self.screen_page(page_num, image, page_filter, previous)
+                        except Exception as e:
+                            # Left unscreened; process_page preprocesses again and reports any failure
+                            logger.warning(f"Page filter failed on page {page_num}: {e}")
+                        else:
+                            if preprocessed is None:
+                                return
+                finally:
+                    screened.set()
+                async with semaphore:
+                    with metrics.IN_FLIGHT.track_inprogress(kind="pages"):
+                        page = await self.process_page(
+                            page_num, image, batcher, page_sources, failed_pages, preprocessed
+                        )
+            finally:
+                backlog.release()
+                completed.put_nowait((page_num, page))
+
+        async def render():
+            page_num = 0
+            previous = None
+            try:
+                while True:
+                    await backlog.acquire()
+                    with metrics.timed("rasterize"):
+                        image = await asyncio.to_thread(next, pages, None)
+                    if image is None:
+                        backlog.release()
+                        break
+                    page_num += 1
+                    screened = asyncio.Event()
+                    tasks.append(asyncio.create_task(run(page_num, image, previous, screened)))
+                    previous = screened
+                    del image
+            except Exception as e:
+                logger.error(f"Rendering stopped after page {page_num}: {e}")
+            logger.info(f"Rendered {page_num} page(s)")
+            completed.put_nowait((None, page_num))
+
+        renderer = asyncio.create_task(render())
+        try:
+            page_count = None
+            finished = 0
+            while page_count is None or finished < page_count:
+                page_num, result = await completed.get()
+                if page_num is None:
+                    page_count = result
+                    continue
+                finished += 1
+                if result is not None:
+                    yield result
+        finally:
+            renderer.cancel()
+            for task in tasks:
+                task.cancel()
+            if batcher is not None:
+                batcher.close()
+            await asyncio.gather(renderer, *tasks, return_exceptions=True)
+            close = getattr(pages, "close", None)
+            if close is not None:
+                try:
+                    await asyncio.to_thread(close)
+                except ValueError:
+                    # Generator still running in an abandoned render thread
+                    pass
+
+    async def run_ocr(self, image: Image.Image, ocr_service: Optional[OCRService] = None) -> Dict[str, Any]:
+        """
+        Run a blocking OCR call on the OCR thread pool
+
+        Args:
+            image: Preprocessed PIL Image of the page
+            ocr_service: Model to use (defaults to the first tier)
+
+        Returns:
+            Raw OCR output dictionary
+        """
+        ocr_service = ocr_service or self.ocr_service
+        async with self.global_semaphore():
+            with metrics.IN_FLIGHT.track_inprogress(kind="ocr_calls"):
+                # Executors don't propagate context; carry the request's timing breakdown over
+                context = contextvars.copy_context()
+                return await asyncio.get_running_loop().run_in_executor(
+                    self.ocr_executor(), context.run, ocr_service.extract_bill_data, image
+                )
+
+    def create_batcher(self) -> Optional[OCRBatcher]:
+        """Multi-page call batcher for one document (None when batching is off)"""
+        if self.batch_pages <= 1:
+            return None
+        return OCRBatcher(
+            self.run_ocr_batch,
+            self.run_ocr,
+            max_pages=self.batch_pages,
+            max_pixels=config.OCR_BATCH_MAX_PIXELS,
+            max_tokens=config.OCR_BATCH_MAX_TOKENS,
+            expected_output_tokens=config.OCR_EXPECTED_OUTPUT_TOKENS,
+            linger=config.OCR_BATCH_LINGER_MS / 1000
+        )
+
+    async def run_ocr_batch(self, images: List[Image.Image]) -> List[Optional[Dict[str, Any]]]:
+        """
+        Run a blocking multi-page OCR call on the OCR thread pool
+
+        Args:
+            images: Preprocessed PIL Images of the pages
+
+        Returns:
+            Raw OCR output per page, None where the response was unusable
+        """
+        async with self.global_semaphore():
+            with metrics.IN_FLIGHT.track_inprogress(kind="ocr_calls"):
+                context = contextvars.copy_context()
+                return await asyncio.get_running_loop().run_in_executor(
+                    self.ocr_executor(), context.run, self.ocr_service.extract_bill_data_batch, images
+                )
+
+    async def screen_page(
+        self,
+        page_num: int,
+        image: Image.Image,
+        page_filter: PageFilter,
+        previous: Optional[asyncio.Event] = None
+    ) -> Optional[Image.Image]:
+        """
+        Preprocess a page and check it against the document's page filter
+
+        Pages are preprocessed and measured concurrently but registered with
+        the filter in page order (each waits for ``previous``, set once the
+        page before it has been checked), so the first copy of a duplicate
+        is the one kept on every run.
+
+        Args:
+            page_num: 1-based page number
+            image: PIL Image of the page
+            page_filter: Filter that may skip the page as blank or a duplicate
+            previous: Event set once the previous page has been checked
+
+        Returns:
+            Preprocessed PIL Image, or None if the page is skipped
+        """
+        with metrics.timed("preprocess"):
+            preprocessed = await DocumentProcessor.preprocess_image_async(image, config.MAX_IMAGE_SIZE)
+        with metrics.timed("page_filter"):
+            signature = await asyncio.to_thread(PageFilter.signature, preprocessed)
+        if previous is not None:
+            await previous.wait()
+        if page_filter.check(page_num, signature) is not None:
+            return None
+        return preprocessed
+
+    async def process_page(
+        self,
+        page_num: int,
+        image: Image.Image,
+        batcher: Optional[OCRBatcher] = None,
+        page_sources: Optional[List[PageSource]] = None,
+        failed_pages: Optional[List[int]] = None,
+        preprocessed: Optional[Image.Image] = None
+    ) -> Optional[PagewiseLineItems]:
+        """
+        Preprocess, OCR and transform a single page
+
+        Args:
+            page_num: 1-based page number assigned to the result
+            image: PIL Image of the page, or a TextLayerPage already read
+                from the PDF text layer (no OCR needed)
+            batcher: Optional batcher sending the page in a multi-page OCR call
+            page_sources: Optional list receiving where the page's items came from
+            failed_pages: Optional list receiving the page number if its OCR
+                failed or was salvaged from cut-off output
+            preprocessed: The page already preprocessed (by screen_page), if any
+
+        Returns:
+            PagewiseLineItems for the page, or None if the page failed or had no items
+        """
+        metrics.PAGES.inc()
+        if isinstance(image, TextLayerPage):
+            metrics.TEXT_LAYER_PAGES.inc()
+            ocr_data = image.ocr_data
+            source = PageSource(page_no=str(page_num), source="text_layer")
+        else:
+            ocr_data, tier = await self._ocr_page(page_num, image, batcher, preprocessed)
+            model = ([self.ocr_service] + self.cascade_services)[tier].model_name
+            source = PageSource(page_no=str(page_num), source="ocr", model=model, tier=tier)
+
+        # Check for OCR errors (a tiled page may have lost only some of its bands)
+        # and cut-off output; either way the document's response must not be cached
+        if ("error" in ocr_data or ocr_data.get("truncated")) and failed_pages is not None:
+            failed_pages.append(page_num)
+        if "error" in ocr_data and not ocr_data.get("line_items"):
+            logger.warning(f"OCR extraction failed for page {page_num}: {ocr_data['error']}")
+            return None
+
+        # Transform to structured line items
+        with metrics.timed("transform"):
+            pagewise_items = ExtractionService.transform_to_line_items(ocr_data)
+
+        if not pagewise_items or not pagewise_items[0].bill_items:
+            return None
+
+        metrics.LINE_ITEMS.inc(len(pagewise_items[0].bill_items))
+        page = pagewise_items[0]
+        page.page_no = str(page_num)
+        if page_sources is not None:
+            source.total_matches = ReconciliationService.check_page_total(ocr_data, config.OCR_CASCADE_TOLERANCE)
+            page_sources.append(source)
+        return page
+
+    async def _ocr_page(
+        self,
+        page_num: int,
+        image: Image.Image,
+        batcher: Optional[OCRBatcher] = None,
+        preprocessed: Optional[Image.Image] = None
+    ) -> Tuple[Dict[str, Any], int]:
+        """
+        Preprocess and OCR a page image (through the page cache), escalating
+        along the model cascade while its totals don't reconcile
+
+        Returns:
+            (OCR output, cascade tier that produced it); failures come back
+            as OCR output carrying "error"
+        """
+        try:
+            if preprocessed is None:
+                with metrics.timed("preprocess"):
+                    preprocessed = await DocumentProcessor.preprocess_image_async(image, config.MAX_IMAGE_SIZE)
+
+            bands: List[Band] = []
+            band_images: List[Image.Image] = []
+            if self.page_tiler is not None:
+                with metrics.timed("tile"):
+                    bands = await asyncio.to_thread(self.page_tiler.plan, image)
+                    band_images = await asyncio.gather(*(self._band_image(image, band) for band in bands))
+                if bands:
+                    logger.info(f"Page {page_num} ({image.width}x{image.height}) split into {len(bands)} bands")
+                    metrics.TILED_PAGES.inc()
+            # The decoded page is no longer needed
+            image = preprocessed if bands else await self._crop(preprocessed)
+
+            async def extract(ocr_service: OCRService, run: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+                if bands:
+                    return await self._ocr_bands(page_num, bands, band_images, ocr_service)
+                return await self._cached_ocr(image, ocr_service, run)
+
+            run = (lambda: batcher.submit(image)) if batcher is not None else (lambda: self.run_ocr(image))
+            ocr_data = await extract(self.ocr_service, run)
+            tier = 0
+
+            # Cheapest model first; re-run on stronger ones only while the page doesn't reconcile
+            for next_tier, ocr_service in enumerate(self.cascade_services, 1):
+                if not self.needs_escalation(ocr_data):
+                    break
+                logger.info(f"Page {page_num} does not reconcile, re-running on {ocr_service.model_name}")
+                metrics.CASCADE_ESCALATIONS.inc(model=ocr_service.model_name)
+                escalated = await extract(ocr_service, lambda service=ocr_service: self.run_ocr(image, service))
+                if "error" in escalated and not escalated.get("line_items"):
+                    continue
+                ocr_data, tier = escalated, next_tier
+        except Exception as e:
+            return {"error": f"Processing failed: {e}"}, 0
+        return ocr_data, tier
+
+    async def _band_image(self, image: Image.Image, band: Band) -> Image.Image:
+        """Cut one band out of the decoded page, shrink it to MAX_IMAGE_SIZE on its own and crop it"""
+        cropped = await asyncio.to_thread(PageTiler.crop, image, band)
+        return await self._crop(await DocumentProcessor.preprocess_image_async(cropped, config.MAX_IMAGE_SIZE))
+
+    async def _crop(self, image: Image.Image) -> Image.Image:
+        """Cut empty margins off a preprocessed image before upload"""
+        if self.content_cropper is None:
+            return image
+        with metrics.timed("crop"):
+            result = await asyncio.to_thread(self.content_cropper.crop, image)
+        metrics.CROP_SAVED_RATIO.observe(result.pixels_saved / (image.width * image.height))
+        if result.box is not None:
+            metrics.CROP_SAVED.inc(result.pixels_saved, unit="pixels")
+            if self.content_cropper.measure_bytes:
+                metrics.CROP_SAVED.inc(result.bytes_saved, unit="bytes")
+        return result.image
+
+    async def _ocr_bands(
+        self,
+        page_num: int,
+        bands: List[Band],
+        band_images: List[Image.Image],
+        ocr_service: OCRService
+    ) -> Dict[str, Any]:
+        """OCR the bands of a tiled page concurrently and merge them into one page result"""
+        metrics.TILE_BANDS.inc(len(bands))
+        results = await asyncio.gather(*(
+            self._cached_ocr(band_image, ocr_service, lambda band_image=band_image: self.run_ocr(band_image, ocr_service))
+            for band_image in band_images
+        ))
+        ocr_data, duplicates = PageTiler.merge(bands, results)
+        if duplicates:
+            logger.info(f"Page {page_num}: dropped {duplicates} row(s) read in two overlapping bands")
+            metrics.TILE_DUPLICATE_ROWS.inc(duplicates)
+        return ocr_data
+
+    async def _cached_ocr(
+        self,
+        image: Image.Image,
+        ocr_service: OCRService,
+        run: Callable[[], Awaitable[Dict[str, Any]]]
+    ) -> Dict[str, Any]:
+        """Run an OCR call through the page cache (keyed on the model)"""
+        if self.page_cache is None:
+            return await run()
+        cache_key = await asyncio.to_thread(
+            self.page_cache.make_key,
+            image,
+            ocr_service.model_name,
+            ocr_service.PROMPT_VERSION
+        )
+        signature = None
+        if self.page_cache.hash_mode == "perceptual":
+            signature = await asyncio.to_thread(self.page_cache.signature, image)
+        return await self.page_cache.get_or_compute(cache_key, run, signature)
+
+    @staticmethod
+    def needs_escalation(ocr_data: Dict[str, Any]) -> bool:
+        """Whether a page should be re-run on a stronger model"""
+        if "error" in ocr_data and not ocr_data.get("line_items"):
+            return True
+        return ReconciliationService.check_page_total(ocr_data, config.OCR_CASCADE_TOLERANCE) is False
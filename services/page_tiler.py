@@ -0,0 +1,231 @@
+import logging
+import math
+import re
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Optional, Tuple
+from PIL import Image
+from services.document_processor import DocumentProcessor
+from services.json_repair import JSONRepair
+
+logger = logging.getLogger(__name__)
+
+
+class Band:
+    """A horizontal strip of a page, in page pixels"""
+
+    def __init__(self, top: int, bottom: int, overlap_lines: int = 0):
+        self.top = top
+        self.bottom = bottom
+        # Text lines shared with the previous band (rows that may come back twice)
+        self.overlap_lines = overlap_lines
+
+
+class PageTiler:
+    """Splits tall or dense pages into overlapping horizontal bands for separate OCR calls
+
+    A page squeezed into MAX_IMAGE_SIZE as a whole gets tiny text and one
+    very long response. Pages taller than max_aspect are therefore decoded
+    at up to decode_size() (the full MAX_IMAGE_SIZE width however tall they
+    are; other pages are decoded straight to MAX_IMAGE_SIZE), bands are cut
+    from that copy and each band is shrunk to MAX_IMAGE_SIZE on its own, so
+    a tall receipt keeps its full width instead of a sliver of it. Each
+    response stays short and the bands are extracted concurrently. Cuts
+    are moved into the whitespace between text lines, and bands overlap so
+    a line near a cut is complete in at least one of them; rows read twice
+    are removed when merging.
+    """
+
+    # Longest side of the grayscale copy text lines are found on
+    ANALYSIS_SIZE = 1024
+
+    # Rows with more ink than this share are part of a text line
+    LINE_INK = 0.005
+
+    # How far (share of the band height) a cut may move to reach whitespace
+    CUT_SEARCH = 0.15
+
+    # Item names at least this similar (after normalization) are the same row
+    NAME_SIMILARITY = 0.8
+
+    def __init__(self, max_aspect: float = 2.0, max_lines: int = 60, overlap: float = 0.08, max_bands: int = 8):
+        """
+        Initialize page tiler
+
+        Args:
+            max_aspect: Tallest height/width ratio sent as one call (bands are
+                made at most this tall; above US Legal's 1.65 so ordinary
+                paper sizes are only split for their line count)
+            max_lines: Most text lines sent in one call
+            overlap: Share of the band height each band extends past its cut
+            max_bands: Most bands per page
+        """
+        self.max_aspect = max_aspect
+        self.max_lines = max_lines
+        self.overlap = overlap
+        self.max_bands = max(1, max_bands)
+
+    def decode_size(self, max_size: Tuple[int, int]) -> Tuple[int, int]:
+        """
+        Size pages taller than max_aspect are decoded (rendered) to before tiling
+
+        Args:
+            max_size: Largest image sent in one call (MAX_IMAGE_SIZE)
+
+        Returns:
+            max_size with room for max_bands bands of full width stacked
+            vertically; tall pages that end up not split are shrunk to max_size later
+        """
+        return max_size[0], max_size[1] * self.max_bands
+
+    @classmethod
+    def text_lines(cls, rows: List[float]) -> List[Tuple[int, int]]:
+        """
+        Runs of inked rows in a row projection
+
+        Args:
+            rows: Per-row ink shares
+
+        Returns:
+            (first row, row after the last) of every text line
+        """
+        lines = []
+        start = None
+        for index, share in enumerate(rows):
+            if share > cls.LINE_INK:
+                if start is None:
+                    start = index
+            elif start is not None:
+                lines.append((start, index))
+                start = None
+        if start is not None:
+            lines.append((start, len(rows)))
+        return lines
+
+    def plan(self, image: Image.Image) -> List[Band]:
+        """
+        Decide how to split a page (CPU-bound; run it off the event loop)
+
+        Args:
+            image: PIL Image of the page as decoded (at most decode_size(),
+                not yet shrunk to MAX_IMAGE_SIZE)
+
+        Returns:
+            Bands from top to bottom, or an empty list if the page is sent whole
+        """
+        width, height = image.size
+        by_aspect = math.ceil(height / (width * self.max_aspect))
+        rows, _ = DocumentProcessor.ink_projection(image, self.ANALYSIS_SIZE)
+        lines = self.text_lines(rows)
+        by_lines = math.ceil(len(lines) / self.max_lines)
+        count = min(self.max_bands, max(by_aspect, by_lines))
+        if count <= 1:
+            return []
+
+        # Page pixels per analysis row
+        scale = height / len(rows)
+        band_height = height / count
+        overlap = int(band_height * self.overlap)
+        search = max(1, int(band_height * self.CUT_SEARCH / scale))
+
+        cuts = [0]
+        for index in range(1, count):
+            nominal = int(index * band_height / scale)
+            window = range(max(0, nominal - search), min(len(rows), nominal + search + 1))
+            # Emptiest row near the nominal cut, the nearer one on ties
+            cut = min(window, key=lambda row: (rows[row], abs(row - nominal)))
+            cuts.append(int(cut * scale))
+        cuts.append(height)
+
+        bands = []
+        for index in range(count):
+            top = max(0, cuts[index] - overlap) if index else 0
+            bottom = min(height, cuts[index + 1] + overlap) if index < count - 1 else height
+            if not any(start < bottom / scale and end > top / scale for start, end in lines):
+                # Nothing printed in this band (e.g. the blank tail of a receipt)
+                continue
+            overlap_lines = 0
+            if bands and bands[-1].bottom > top:
+                # Lines anywhere in the stretch both bands cover
+                shared_top, shared_bottom = top / scale, bands[-1].bottom / scale
+                overlap_lines = sum(1 for start, end in lines if start < shared_bottom and end > shared_top)
+            bands.append(Band(top, bottom, overlap_lines))
+        return bands if len(bands) > 1 else []
+
+    @staticmethod
+    def crop(image: Image.Image, band: Band) -> Image.Image:
+        """Cut a band out of the page"""
+        return image.crop((0, band.top, image.width, band.bottom))
+
+    @classmethod
+    def same_item(cls, item: Dict[str, Any], other: Dict[str, Any]) -> bool:
+        """Whether two extracted rows are the same bill line read from two bands"""
+        amount = JSONRepair.parse_amount(item.get("item_amount"))
+        if amount is None or amount != JSONRepair.parse_amount(other.get("item_amount")):
+            return False
+        name = re.sub(r"\W+", "", str(item.get("item_name", "")).lower())
+        other_name = re.sub(r"\W+", "", str(other.get("item_name", "")).lower())
+        return name == other_name or SequenceMatcher(None, name, other_name).ratio() >= cls.NAME_SIMILARITY
+
+    @classmethod
+    def merge(cls, bands: List[Band], results: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], int]:
+        """
+        Combine the band results of a page into one page result
+
+        Rows read in two bands are found by position and content: the last
+        rows of a band are compared with the first rows of the next one, at
+        most as many as there are text lines in their overlap, and the
+        longest run that matches item by item is kept once.
+
+        Args:
+            bands: Bands of the page, top to bottom
+            results: Raw OCR output per band, same order
+
+        Returns:
+            Tuple of (merged OCR output, number of duplicate rows removed)
+        """
+        line_items: List[Dict[str, Any]] = []
+        duplicates = 0
+        failed = []
+        truncated = False
+        page_type: Optional[str] = None
+        actual_bill_total = 0.0
+        previous_count = 0
+
+        for index, (band, result) in enumerate(zip(bands, results)):
+            items = [item for item in result.get("line_items") or [] if isinstance(item, dict)]
+            if "error" in result and not items:
+                failed.append(f"band {index + 1}: {result['error']}")
+                previous_count = 0
+                continue
+
+            band_count = len(items)
+            truncated = truncated or bool(result.get("truncated"))
+
+            # Only rows at the edge shared with the previous band can repeat
+            window = min(previous_count, len(items), band.overlap_lines)
+            for length in range(window, 0, -1):
+                if all(cls.same_item(a, b) for a, b in zip(line_items[-length:], items[:length])):
+                    duplicates += length
+                    items = items[length:]
+                    break
+
+            line_items.extend(items)
+            # Every row of this band (kept or matched) now ends the merged list
+            previous_count = band_count
+            page_type = page_type or result.get("page_type")
+            # The printed total is at the bottom: the lowest band that shows one wins
+            actual_bill_total = JSONRepair.parse_amount(result.get("actual_bill_total")) or actual_bill_total
+
+        amounts = [JSONRepair.parse_amount(item.get("item_amount")) for item in line_items]
+        merged: Dict[str, Any] = {
+            "page_no": "1",
+            "page_type": page_type or "Bill Detail",
+            "line_items": line_items,
+            "extracted_total": round(sum(amount for amount in amounts if amount is not None), 2),
+            "actual_bill_total": actual_bill_total
+        }
+        if failed:
+            merged["error"] = "; ".join(failed)
+        if truncated:
+            merged["truncated"] = True
+        return merged, duplicates
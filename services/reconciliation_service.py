@@ -1,5 +1,6 @@
-from typing import List
+from typing import Any, Dict, List, Optional
 from models import PagewiseLineItems
+from services.json_repair import JSONRepair
 import logging
 
 logger = logging.getLogger(__name__)
@@ -46,6 +47,27 @@ class ReconciliationService:
         logger.info(f"Total item count: {count}")
         return count
     
+    @staticmethod
+    def check_page_total(ocr_data: Dict[str, Any], tolerance: float = 1.0) -> Optional[bool]:
+        """
+        Check a page's line items against the total printed on it
+        
+        Args:
+            ocr_data: Raw OCR output with line_items and actual_bill_total
+            tolerance: Acceptable difference percentage
+            
+        Returns:
+            True/False when the page has a printed total, None when it has none
+        """
+        actual_bill_total = JSONRepair.parse_amount(ocr_data.get("actual_bill_total"))
+        if not actual_bill_total:
+            return None
+        
+        amounts = [JSONRepair.parse_amount(item.get("item_amount")) for item in ocr_data.get("line_items") or []
+                   if isinstance(item, dict)]
+        reconciled_amount = round(sum(amount for amount in amounts if amount is not None), 2)
+        return ReconciliationService.validate_extraction(reconciled_amount, actual_bill_total, tolerance)
+    
     @staticmethod
     def validate_extraction(reconciled_amount: float, actual_bill_total: float, tolerance: float = 0.01) -> bool:
         """
@@ -0,0 +1,245 @@
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from models import ExtractResponse
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """Content-addressed cache of extraction results (memory LRU + optional disk tier)"""
+
+    # Share of disk_max_bytes the disk tier is evicted down to once over budget,
+    # so the directory walk of an eviction is not repeated on every write
+    DISK_LOW_WATER = 0.9
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_seconds: float = 7 * 24 * 3600,
+        disk_dir: Optional[str] = None,
+        disk_max_bytes: int = 512 * 1024 * 1024
+    ):
+        """
+        Initialize result cache
+
+        Args:
+            max_entries: Maximum number of responses kept in memory
+            ttl_seconds: Time after which an entry is treated as missing (0 disables expiry)
+            disk_dir: Directory for the on-disk tier (None disables it)
+            disk_max_bytes: Size budget for the on-disk tier
+        """
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+
+        self._memory: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes = 0
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._disk_bytes = sum(size for _, size, _ in self._disk_entries())
+            logger.info(f"Result cache disk tier at {self.disk_dir} ({self._disk_bytes} bytes)")
+
+    @staticmethod
+    def digest(content: bytes) -> str:
+        """SHA-256 of document bytes (CPU-bound for large bodies; run it off the event loop)"""
+        return hashlib.sha256(content).hexdigest()
+
+    @staticmethod
+    def make_key(digest: str, model_name: str, prompt_version: str, settings: str = "") -> str:
+        """
+        Build the cache key for a document
+
+        Args:
+            digest: Hex digest of the raw document bytes (from digest)
+            model_name: OCR model used for extraction
+            prompt_version: Version of the extraction prompt
+            settings: Fingerprint of the settings that change the extracted
+                items (Config.extraction_fingerprint)
+
+        Returns:
+            Hex digest identifying the document/model/prompt/settings combination
+        """
+        return hashlib.sha256(f"{digest}:{model_name}:{prompt_version}:{settings}".encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[ExtractResponse]:
+        """
+        Look up a cached response
+
+        Args:
+            key: Cache key from make_key
+
+        Returns:
+            Cached ExtractResponse or None on a miss
+        """
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                stored_at, payload = entry
+                if not self._expired(stored_at, now):
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return ExtractResponse.model_validate_json(payload)
+                del self._memory[key]
+
+        payload = self._disk_get(key, now)
+        with self._lock:
+            if payload is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._memory_set(key, now, payload)
+        return ExtractResponse.model_validate_json(payload)
+
+    async def get_async(self, key: str) -> Optional[ExtractResponse]:
+        """get, in a worker thread when the disk tier may be read"""
+        if not self.disk_dir:
+            return self.get(key)
+        return await asyncio.to_thread(self.get, key)
+
+    async def set_async(self, key: str, response: ExtractResponse):
+        """set, in a worker thread when the disk tier is written (and maybe evicted)"""
+        if not self.disk_dir:
+            self.set(key, response)
+            return
+        await asyncio.to_thread(self.set, key, response)
+
+    def set(self, key: str, response: ExtractResponse):
+        """
+        Store a response in both tiers
+
+        Args:
+            key: Cache key from make_key
+            response: Response to cache
+        """
+        payload = response.model_dump_json()
+        now = time.time()
+
+        with self._lock:
+            self._memory_set(key, now, payload)
+
+        if self.disk_dir:
+            try:
+                self._disk_set(key, payload)
+            except OSError as e:
+                logger.warning(f"Failed to write result cache entry to disk: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and tier sizes"""
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "hits": hits,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_bytes": self._disk_bytes
+            }
+
+    def _expired(self, stored_at: float, now: float) -> bool:
+        return self.ttl_seconds > 0 and now - stored_at > self.ttl_seconds
+
+    def _memory_set(self, key: str, stored_at: float, payload: str):
+        # Caller holds the lock
+        self._memory[key] = (stored_at, payload)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _disk_entries(self):
+        """Yield (path, size, mtime) for every file in the disk tier"""
+        for root, _, files in os.walk(self.disk_dir):
+            for name in files:
+                if not name.endswith(".json"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat.st_size, stat.st_mtime
+
+    def _disk_get(self, key: str, now: float) -> Optional[str]:
+        if not self.disk_dir:
+            return None
+
+        path = self._disk_path(key)
+        try:
+            stat = os.stat(path)
+            if self._expired(stat.st_mtime, now):
+                self._disk_remove(path, stat.st_size)
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                payload = f.read()
+            # Touch so size-based eviction drops least recently used entries first
+            os.utime(path)
+            return payload
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"Failed to read result cache entry from disk: {e}")
+            return None
+
+    def _disk_set(self, key: str, payload: str):
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        try:
+            previous_size = os.path.getsize(path)
+        except OSError:
+            previous_size = 0
+
+        # Write atomically so concurrent readers never see a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._disk_bytes += os.path.getsize(path) - previous_size
+            over_budget = self._disk_bytes > self.disk_max_bytes
+
+        if over_budget:
+            self._disk_evict()
+
+    def _disk_remove(self, path: str, size: int):
+        try:
+            os.unlink(path)
+        except OSError:
+            return
+        with self._lock:
+            self._disk_bytes -= size
+
+    def _disk_evict(self):
+        """Remove expired entries, then least recently used ones down to the low-water mark"""
+        now = time.time()
+        target = self.disk_max_bytes * self.DISK_LOW_WATER
+        entries = sorted(self._disk_entries(), key=lambda entry: entry[2])
+
+        for path, size, mtime in entries:
+            if self._disk_bytes <= target and not self._expired(mtime, now):
+                continue
+            self._disk_remove(path, size)
+
+        logger.info(f"Result cache disk tier evicted down to {self._disk_bytes} bytes")
@@ -0,0 +1,335 @@
+import html
+import logging
+import re
+import statistics
+import subprocess
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# (x_min, y_min, x_max, y_max, text) in PDF points, origin top-left
+Word = Tuple[float, float, float, float, str]
+
+_PAGE_RE = re.compile(r'<page width="([\d.]+)" height="([\d.]+)">(.*?)</page>', re.S)
+_WORD_RE = re.compile(
+    r'<word xMin="([\d.\-]+)" yMin="([\d.\-]+)" xMax="([\d.\-]+)" yMax="([\d.\-]+)">(.*?)</word>', re.S
+)
+_NUMBER_RE = re.compile(r"^\(?-?(?:\d{1,3}(?:,\d{2,3})+|\d+)(?:\.\d+)?\)?-?$")
+_CURRENCY_RE = re.compile(r"^(?:₹|rs\.?|inr|\$)", re.I)
+# Matched at the start of a row's label, and only for rows without quantity/rate figures
+# (see _has_line_figures), so items such as "Total Bilirubin" stay items
+_TOTAL_RE = re.compile(
+    r"(?:(?:less|add|by)\b[\s:]*)?"
+    r"(?:sub\s*total|grand\s*total|total|net\s*amount|amount\s*payable|bill\s*amount|balance)\b", re.I
+)
+_SKIP_RE = re.compile(
+    r"(?:(?:less|add|by)\b[\s:]*)?(?:discount|round(?:ing)?\s*off|advance|paid|refund|cgst|sgst|igst|gst|tax)\b",
+    re.I
+)
+
+_HEADER_COLUMNS = {
+    "name": ("description", "particulars", "item", "service", "details", "medicine", "product"),
+    "quantity": ("qty", "quantity", "units", "unit", "nos"),
+    "rate": ("rate", "price", "mrp", "unit price", "cost"),
+    "amount": ("amount", "amt", "total", "value", "net"),
+}
+
+
+class TextLayerPage:
+    """A PDF page whose line items were read from its text layer instead of OCR"""
+
+    def __init__(self, page_number: int, ocr_data: Dict[str, Any]):
+        self.page_number = page_number
+        self.ocr_data = ocr_data
+
+    def close(self):
+        """No bitmap to free (mirrors PIL.Image.close for the page pipeline)"""
+
+
+class TextLayerExtractor:
+    """Parses line items from positioned PDF text (poppler's pdftotext -bbox)"""
+
+    @staticmethod
+    def extract(pdf_path: str, page_count: int, min_words: int = 20, timeout: float = 60.0) -> Dict[int, Dict[str, Any]]:
+        """
+        Extract OCR-shaped data for every page with a usable text layer
+
+        Pages without enough text (scans), or whose table could not be read
+        confidently, are left out so they go through vision OCR.
+
+        Args:
+            pdf_path: PDF file on disk
+            page_count: Number of pages in the document
+            min_words: Fewest words for a page to count as having a text layer
+            timeout: Seconds allowed for pdftotext
+
+        Returns:
+            Mapping of 1-based page number to data in the OCR response shape
+        """
+        try:
+            result = subprocess.run(
+                ["pdftotext", "-bbox", "-f", "1", "-l", str(page_count), pdf_path, "-"],
+                capture_output=True,
+                timeout=timeout,
+                check=True
+            )
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.warning(f"pdftotext unavailable or failed, using OCR for every page: {e}")
+            return {}
+
+        pages = {}
+        for page_number, words in enumerate(TextLayerExtractor.parse_bbox_html(result.stdout.decode("utf-8", "replace")), 1):
+            if len(words) < min_words:
+                continue
+            ocr_data = TextLayerExtractor.parse_page(words)
+            if ocr_data is not None:
+                ocr_data["page_no"] = str(page_number)
+                pages[page_number] = ocr_data
+        return pages
+
+    @staticmethod
+    def parse_bbox_html(document: str) -> List[List[Word]]:
+        """
+        Read words and their boxes from pdftotext -bbox output
+
+        Args:
+            document: XHTML produced by pdftotext -bbox
+
+        Returns:
+            Words per page, in page order
+        """
+        pages = []
+        for match in _PAGE_RE.finditer(document):
+            words = []
+            for word in _WORD_RE.finditer(match.group(3)):
+                text = html.unescape(word.group(5)).strip()
+                if text:
+                    words.append((float(word.group(1)), float(word.group(2)),
+                                  float(word.group(3)), float(word.group(4)), text))
+            pages.append(words)
+        return pages
+
+    @staticmethod
+    def parse_page(words: List[Word]) -> Optional[Dict[str, Any]]:
+        """
+        Parse a page's words into line items
+
+        Args:
+            words: Positioned words of one page
+
+        Returns:
+            Dict in the OCR response shape, or None if the page should go
+            through OCR because its table could not be read confidently
+        """
+        lines = TextLayerExtractor.group_lines(words)
+        page_text = " ".join(word[4] for line in lines for word in line).lower()
+        page_type = "Pharmacy" if "pharmacy" in page_text else "Final Bill" if "final bill" in page_text else "Bill Detail"
+
+        header_index, columns, boundary = TextLayerExtractor._find_header(lines)
+        heights = [word[3] - word[1] for word in words if word[3] > word[1]]
+        line_height = statistics.median(heights) if heights else 10.0
+
+        items = []
+        totals = []
+        previous_bottom = None
+        has_numbers = False
+        for index, line in enumerate(lines):
+            if index <= header_index:
+                continue
+            numbers = [(position, value) for position, value in
+                       ((i, TextLayerExtractor.parse_number(word[4])) for i, word in enumerate(line))
+                       if value is not None]
+            has_numbers = has_numbers or bool(numbers)
+            top = min(word[1] for word in line)
+            bottom = max(word[3] for word in line)
+
+            # Wrapped description: a text-only line tight under an item continues its name
+            if not numbers:
+                if items and previous_bottom is not None and top - previous_bottom < 0.6 * line_height:
+                    items[-1]["item_name"] += " " + " ".join(word[4] for word in line)
+                    previous_bottom = bottom
+                else:
+                    previous_bottom = None
+                continue
+
+            summary = not TextLayerExtractor._has_line_figures(line, numbers, boundary)
+            label = " ".join(word[4] for word in line if TextLayerExtractor.parse_number(word[4]) is None)
+            label = label.lstrip(" -:|*")
+            if summary and _TOTAL_RE.match(label):
+                totals.append(numbers[-1][1])
+                previous_bottom = None
+                continue
+            if summary and _SKIP_RE.match(label):
+                previous_bottom = None
+                continue
+
+            item = TextLayerExtractor._parse_item(line, numbers, columns, boundary)
+            if item is None:
+                previous_bottom = None
+                continue
+            items.append(item)
+            previous_bottom = bottom
+
+        extracted_total = round(sum(item["item_amount"] for item in items), 2)
+        if not items:
+            # A page of prose (terms, cover letter) needs no OCR; a page with unread figures does
+            return None if has_numbers else {
+                "page_type": page_type, "line_items": [], "extracted_total": 0.0,
+                "actual_bill_total": 0.0, "source": "text_layer"
+            }
+
+        consistent = sum(
+            1 for item in items
+            if item["item_quantity"] and item["item_rate"]
+            and abs(item["item_quantity"] * item["item_rate"] - item["item_amount"]) <= max(0.05, 0.01 * item["item_amount"])
+        )
+        matches_total = any(abs(total - extracted_total) <= max(0.05, 0.005 * total) for total in totals)
+        if totals and not matches_total:
+            # A printed total the rows don't add up to means rows were missed or misread
+            return None
+        if header_index < 0 and not totals and consistent < 0.6 * len(items):
+            return None
+
+        return {
+            "page_type": page_type,
+            "line_items": items,
+            "extracted_total": extracted_total,
+            "actual_bill_total": max(totals) if totals else extracted_total,
+            "source": "text_layer"
+        }
+
+    @staticmethod
+    def group_lines(words: List[Word]) -> List[List[Word]]:
+        """Cluster words into visual lines (top to bottom, each left to right)"""
+        lines: List[List[Word]] = []
+        centers: List[float] = []
+        for word in sorted(words, key=lambda w: ((w[1] + w[3]) / 2, w[0])):
+            center = (word[1] + word[3]) / 2
+            height = max(1.0, word[3] - word[1])
+            if lines and abs(center - centers[-1]) < 0.5 * height:
+                lines[-1].append(word)
+                centers[-1] = sum((w[1] + w[3]) / 2 for w in lines[-1]) / len(lines[-1])
+            else:
+                lines.append([word])
+                centers.append(center)
+        return [sorted(line, key=lambda w: w[0]) for line in lines]
+
+    @staticmethod
+    def parse_number(text: str) -> Optional[float]:
+        """Parse an amount/quantity token ("1,234.50", "₹99", "(12.00)"), or None"""
+        token = _CURRENCY_RE.sub("", text.strip())
+        if not token or not _NUMBER_RE.match(token):
+            return None
+        negative = token.startswith(("-", "(")) or token.endswith("-")
+        value = float(token.strip("()-").replace(",", ""))
+        return -value if negative else value
+
+    @staticmethod
+    def _find_header(lines: List[List[Word]]) -> Tuple[int, Dict[str, float], Optional[float]]:
+        """
+        Locate the table header row
+
+        Returns:
+            (header line index, x-centre of each known column, left edge of
+            the first figure column), or (-1, {}, None) if there is no header
+        """
+        for index, line in enumerate(lines):
+            columns = {}
+            left_edges = []
+            for word in line:
+                text = word[4].lower().strip(".:")
+                for column, keywords in _HEADER_COLUMNS.items():
+                    if column not in columns and text in keywords:
+                        columns[column] = (word[0] + word[2]) / 2
+                        if column != "name":
+                            left_edges.append(word[0])
+            if "amount" in columns and len(columns) >= 2:
+                return index, columns, min(left_edges)
+        return -1, {}, None
+
+    @staticmethod
+    def _has_line_figures(line: List[Word], numbers: List[Tuple[int, float]], boundary: Optional[float]) -> bool:
+        """
+        Whether a row carries figures besides its amount (quantity, rate)
+
+        Totals, taxes and discounts print a single figure; an item row such as
+        "Total Bilirubin  1  350.00  350.00" fills the quantity and rate columns.
+        """
+        if boundary is not None:
+            numbers = [(position, value) for position, value in numbers
+                       if (line[position][0] + line[position][2]) / 2 >= boundary]
+        return len(numbers) > 1
+
+    @staticmethod
+    def _parse_item(
+        line: List[Word],
+        numbers: List[Tuple[int, float]],
+        columns: Dict[str, float],
+        boundary: Optional[float] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Turn one table row into a line item dict
+
+        The name is every word left of the first figure column of the header
+        (``boundary``), or without a header every word before the trailing
+        run of figures, so doses and sizes ("500 mg", "1 g", "(2 days)")
+        stay in the name.
+        """
+        if boundary is not None:
+            start = next((i for i, word in enumerate(line) if (word[0] + word[2]) / 2 >= boundary), len(line))
+        else:
+            start = len(line)
+            while start > 0 and TextLayerExtractor.parse_number(line[start - 1][4]) is not None:
+                start -= 1
+        numbers = [(position, value) for position, value in numbers if position >= start]
+        if not numbers:
+            return None
+
+        name_words = [word[4] for word in line[:start]]
+        # A leading integer before any text is a serial number, not part of the name
+        serial = TextLayerExtractor.parse_number(name_words[0]) if len(name_words) > 1 else None
+        if serial is not None and float(serial).is_integer():
+            name_words = name_words[1:]
+        name = " ".join(name_words).strip(" -:|")
+        if not name:
+            return None
+
+        values = [value for _, value in numbers]
+        amount = values[-1]
+        quantity = rate = 0.0
+
+        if columns:
+            # The amount must sit under the amount column (skips footers like "Page 1 of 2")
+            word = line[numbers[-1][0]]
+            center = (word[0] + word[2]) / 2
+            if min(columns, key=lambda column: abs(columns[column] - center)) != "amount":
+                return None
+
+        if "quantity" in columns or "rate" in columns:
+            # Assign each figure to the nearest header column
+            for position, value in numbers[:-1]:
+                word = line[position]
+                center = (word[0] + word[2]) / 2
+                nearest = min(columns, key=lambda column: abs(columns[column] - center))
+                if nearest == "quantity":
+                    quantity = value
+                elif nearest == "rate":
+                    rate = value
+        else:
+            # Otherwise look for quantity x rate = amount among the preceding figures
+            # (quantity column first, the usual layout)
+            preceding = values[:-1]
+            for i in range(len(preceding) - 1, -1, -1):
+                for j in range(i + 1, len(preceding)):
+                    if abs(preceding[i] * preceding[j] - amount) <= max(0.05, 0.01 * abs(amount)):
+                        quantity, rate = preceding[i], preceding[j]
+                        break
+                if quantity:
+                    break
+
+        return {
+            "item_name": name,
+            "item_quantity": quantity,
+            "item_rate": rate,
+            "item_amount": amount
+        }
@@ -0,0 +1,138 @@
+import logging
+from typing import AsyncIterator, Dict, Tuple
+from services.document_body import BodySpooler, DocumentContent, UnsupportedDocumentError
+from services.document_processor import DocumentProcessor
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+logger = logging.getLogger(__name__)
+
+
+class _MultipartFile:
+    """Parser callbacks that stream the first file part into a spooler"""
+
+    def __init__(self, spooler: BodySpooler, field_name: str):
+        self.spooler = spooler
+        self.field_name = field_name.encode()
+        self.headers: Dict[bytes, bytes] = {}
+        self.header_field = b""
+        self.header_value = b""
+        self.in_file = False
+        self.found = False
+        self.content_type = ""
+        self.filename = ""
+
+    def callbacks(self) -> dict:
+        return {
+            "on_part_begin": self.on_part_begin,
+            "on_header_field": self.on_header_field,
+            "on_header_value": self.on_header_value,
+            "on_header_end": self.on_header_end,
+            "on_headers_finished": self.on_headers_finished,
+            "on_part_data": self.on_part_data,
+            "on_part_end": self.on_part_end,
+        }
+
+    def on_part_begin(self):
+        self.headers = {}
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self.header_field += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self.header_value += data[start:end]
+
+    def on_header_end(self):
+        self.headers[self.header_field.lower()] = self.header_value
+        self.header_field = b""
+        self.header_value = b""
+
+    def on_headers_finished(self):
+        if self.found:
+            return
+        _, params = parse_options_header(self.headers.get(b"content-disposition", b""))
+        if params.get(b"name") == self.field_name or b"filename" in params:
+            self.in_file = True
+            self.found = True
+            self.content_type = self.headers.get(b"content-type", b"").decode("latin-1")
+            self.filename = params.get(b"filename", b"").decode("utf-8", "replace")
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self.in_file:
+            self.spooler.write(data[start:end])
+
+    def on_part_end(self):
+        self.in_file = False
+
+
+class UploadReader:
+    """Reads an uploaded document (multipart file or raw body) as it streams in"""
+
+    @staticmethod
+    async def read(
+        chunks: AsyncIterator[bytes],
+        content_type: str,
+        max_bytes: int,
+        spool_threshold: int,
+        field_name: str = "file"
+    ) -> Tuple[DocumentContent, str, str]:
+        """
+        Stream a request body into a (possibly spooled) document
+
+        Accepts ``multipart/form-data`` (the first file part, or the part
+        named ``field_name``) or a raw ``application/pdf`` / ``image/*``
+        body. The size cap is enforced while the body arrives and the type
+        is sniffed from the leading bytes.
+
+        Args:
+            chunks: Request body chunks (e.g. Request.stream())
+            content_type: Content-Type header of the request
+            max_bytes: Largest document accepted (0 = unlimited)
+            spool_threshold: Documents larger than this are spooled to disk
+            field_name: Multipart field holding the document
+
+        Returns:
+            Tuple of (content, document content type, file name)
+
+        Raises:
+            DocumentTooLargeError: If the document exceeds max_bytes
+            UnsupportedDocumentError: If the body is not a PDF or image upload
+        """
+        spooler = BodySpooler(max_bytes, spool_threshold)
+        media_type, params = parse_options_header(content_type)
+        media_type = media_type.decode("latin-1").lower()
+
+        try:
+            if media_type == "multipart/form-data":
+                boundary = params.get(b"boundary")
+                if not boundary:
+                    raise UnsupportedDocumentError("Multipart upload without a boundary")
+                part = _MultipartFile(spooler, field_name)
+                parser = MultipartParser(boundary, part.callbacks())
+                async for chunk in chunks:
+                    parser.write(chunk)
+                parser.finalize()
+                if not part.found:
+                    raise UnsupportedDocumentError(f"Multipart upload has no '{field_name}' file part")
+                declared_type, filename = part.content_type, part.filename
+            elif media_type == "application/pdf" or media_type.startswith("image/"):
+                async for chunk in chunks:
+                    spooler.write(chunk)
+                declared_type, filename = media_type, ""
+            else:
+                raise UnsupportedDocumentError(
+                    "Upload a multipart/form-data file or an application/pdf or image/* body"
+                )
+
+            if spooler.size == 0:
+                raise UnsupportedDocumentError("Uploaded document is empty")
+
+            document_type = DocumentProcessor.sniff_content_type(spooler.head, declared_type)
+            logger.info(f"Received upload {filename or '(raw body)'}: {spooler.size} bytes, {document_type}")
+            return spooler.finish(), document_type, filename
+        except BaseException:
+            spooler.discard()
+            raise
@@ -0,0 +1,47 @@
+from services.compact_output import CompactOutput
+from services.extraction_service import ExtractionService
+
+
+def test_shuffled_header_maps_values_by_name():
+    page = CompactOutput.decode({
+        "page_type": "Pharmacy",
+        "columns": ["item_amount", "item_name", "item_rate", "item_quantity"],
+        "rows": [[30, "Paracetamol 500 mg Tab", 1.5, 20], [170, "Inj. Ceftriaxone 1 g", 85, 2]],
+        "actual_bill_total": 200
+    })
+
+    assert "rows" not in page and "columns" not in page
+    assert page["line_items"] == [
+        {"item_amount": 30, "item_name": "Paracetamol 500 mg Tab", "item_rate": 1.5, "item_quantity": 20},
+        {"item_amount": 170, "item_name": "Inj. Ceftriaxone 1 g", "item_rate": 85, "item_quantity": 2},
+    ]
+    items = ExtractionService.transform_to_line_items(page)[0].bill_items
+    assert [(item.item_name, item.item_quantity, item.item_amount) for item in items] == [
+        ("Paracetamol 500 mg Tab", 20, 30), ("Inj. Ceftriaxone 1 g", 2, 170)
+    ]
+
+
+def test_rows_of_the_wrong_width_are_skipped():
+    page = CompactOutput.decode({"columns": ["item_name", "item_amount"], "rows": [["A", 1], ["B"], "C", ["D", 4]]})
+
+    assert [item["item_name"] for item in page["line_items"]] == ["A", "D"]
+
+
+def test_missing_header_falls_back_to_default_order():
+    page = CompactOutput.decode({"rows": [["A", 2, 5, 10]]})
+
+    assert page["line_items"] == [{"item_name": "A", "item_quantity": 2, "item_rate": 5, "item_amount": 10}]
+
+
+def test_shared_batch_header_applies_to_pages_without_one():
+    data = CompactOutput.decode_pages({
+        "columns": ["item_amount", "item_name"],
+        "pages": [
+            {"page_no": "1", "rows": [[10, "A"]]},
+            {"page_no": "2", "columns": ["item_name", "item_amount"], "rows": [["B", 20]]},
+        ]
+    })
+
+    assert [page["line_items"] for page in data["pages"]] == [
+        [{"item_amount": 10, "item_name": "A"}], [{"item_name": "B", "item_amount": 20}]
+    ]
@@ -0,0 +1,82 @@
+import json
+from services.json_repair import JSONRepair
+from services.ocr_backends import OCRBackend
+from services.ocr_service import OCRService
+from services.page_cache import PageCache
+
+
+class ScriptedBackend(OCRBackend):
+    """Returns canned responses in order"""
+
+    name = "scripted"
+
+    def __init__(self, responses):
+        super().__init__("scripted-model")
+        self.responses = list(responses)
+        self.prompts = []
+
+    def generate(self, prompt, image=None):
+        self.prompts.append(prompt)
+        return self.responses.pop(0)
+
+
+def item(name, amount):
+    return {"item_name": name, "item_quantity": 1, "item_rate": amount, "item_amount": amount}
+
+
+def test_truncated_output_keeps_complete_items():
+    text = json.dumps({"page_type": "Pharmacy", "line_items": [item("Paracetamol 500 mg", 20), item("ORS", 35)]})
+    data, truncated = JSONRepair.loads(text[:text.index("ORS") + 12])
+
+    assert truncated
+    assert data["line_items"] == [item("Paracetamol 500 mg", 20)]
+
+
+def test_truncated_inside_a_number_drops_that_item():
+    data, truncated = JSONRepair.loads('{"line_items": [{"item_name": "A", "item_amount": 10}, {"item_name": "B", "item_amount": 1')
+
+    assert truncated
+    assert data["line_items"] == [{"item_name": "A", "item_amount": 10}]
+
+
+def test_missing_comma_between_items():
+    data, _ = JSONRepair.loads('{"line_items": [{"item_name": "A", "item_amount": 1} {"item_name": "B", "item_amount": 2}]}')
+
+    assert [entry["item_name"] for entry in data["line_items"]] == ["A", "B"]
+
+
+def test_missing_comma_between_members():
+    data, _ = JSONRepair.loads('{"line_items": [{"item_name": "A" "item_amount": 1 "item_rate": 1}]}')
+
+    assert data["line_items"] == [{"item_name": "A", "item_amount": 1, "item_rate": 1}]
+
+
+def test_trailing_commas_and_currency_amounts():
+    data, _ = JSONRepair.loads('```json\n{"line_items": [{"item_name": "Room", "item_amount": ₹1,500.00,},],}\n```')
+    normalized = JSONRepair.normalize_extraction(data)
+
+    assert normalized["line_items"][0]["item_amount"] == 1500.0
+
+
+def test_zero_item_salvage_is_a_failure():
+    assert OCRService.repair_json('{"page_type": "Bill Detail", "line_items": [{"item_name": "A", "item_am') is None
+
+
+def test_zero_item_salvage_falls_through_to_requery():
+    valid = json.dumps({"page_type": "Bill Detail", "line_items": [item("A", 5)]})
+    backend = ScriptedBackend(['{"page_type": "Bill Detail", "line_items": [{"item_name": "A", "item_am', valid])
+    data = OCRService(backend=backend).extract_bill_data(None)
+
+    assert len(backend.prompts) == 2
+    assert data["line_items"] == [item("A", 5)]
+
+
+def test_cut_off_salvage_is_flagged_and_not_cached():
+    text = json.dumps({"page_type": "Pharmacy", "line_items": [item("Paracetamol 500 mg", 20), item("ORS", 35)]})
+    data = OCRService(backend=ScriptedBackend([text[:text.index("ORS") + 12]])).extract_bill_data(None)
+
+    assert data["truncated"]
+    assert data["line_items"] == [item("Paracetamol 500 mg", 20)]
+    cache = PageCache()
+    cache.set("page", data)
+    assert cache.get("page") is None
@@ -0,0 +1,87 @@
+import pytest
+from services import ocr_scheduler
+from services.ocr_scheduler import AdaptiveConcurrencyLimiter, TokenBucket
+
+
+class FakeClock:
+    """Stands in for time.monotonic/time.sleep so waits are measured, not slept"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ocr_scheduler.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(ocr_scheduler.time, "sleep", clock.sleep)
+    return clock
+
+
+def test_bucket_serves_burst_then_waits_for_refill(clock):
+    bucket = TokenBucket(per_minute=60, burst_seconds=2)  # 1 token/s, capacity 2
+    bucket.acquire(1, deadline=clock.now + 10)
+    bucket.acquire(1, deadline=clock.now + 10)
+    assert clock.slept == []
+
+    bucket.acquire(1, deadline=clock.now + 10)
+    assert clock.slept == [pytest.approx(1.0)]
+
+
+def test_bucket_refills_while_idle_up_to_capacity(clock):
+    bucket = TokenBucket(per_minute=60, burst_seconds=2)
+    bucket.acquire(2, deadline=clock.now + 10)
+    clock.now += 60
+    bucket.acquire(2, deadline=clock.now + 10)
+    assert clock.slept == []
+    assert bucket.tokens == pytest.approx(0.0)
+
+
+def test_bucket_refuses_wait_past_deadline(clock):
+    bucket = TokenBucket(per_minute=60, burst_seconds=1)
+    bucket.acquire(1, deadline=clock.now + 10)
+    with pytest.raises(TimeoutError):
+        bucket.acquire(1, deadline=clock.now + 0.5)
+    # The refused reservation is handed back
+    assert bucket.tokens == pytest.approx(0.0)
+
+
+def test_limiter_halves_once_per_round_trip_after_429(clock):
+    limiter = AdaptiveConcurrencyLimiter(min_limit=1, max_limit=16, initial_limit=8, target_latency=20)
+    started = clock.now
+    for _ in range(3):
+        limiter.acquire(deadline=clock.now + 1)
+    clock.now += 1
+
+    limiter.release(started, latency=1, outcome="overload")
+    assert limiter.limit == 4
+    # Calls already in flight before the cut don't cut again
+    limiter.release(started, latency=1, outcome="overload")
+    assert limiter.limit == 4
+
+    clock.now += 1
+    limiter.acquire(deadline=clock.now + 1)
+    limiter.release(clock.now, latency=1, outcome="overload")
+    assert limiter.limit == 2
+
+
+def test_limiter_grows_additively_on_fast_successes(clock):
+    limiter = AdaptiveConcurrencyLimiter(min_limit=1, max_limit=16, initial_limit=4, target_latency=20)
+    for _ in range(4):
+        limiter.acquire(deadline=clock.now + 1)
+        limiter.release(clock.now, latency=1, outcome="success")
+    assert 4.9 < limiter.limit < 5.0
+
+    # Slow calls hold the limit where it is
+    limit = limiter.limit
+    limiter.acquire(deadline=clock.now + 1)
+    limiter.release(clock.now, latency=30, outcome="success")
+    assert limiter.limit == limit
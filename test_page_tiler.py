@@ -0,0 +1,91 @@
+from PIL import Image, ImageDraw, ImageFont
+from services.document_processor import DocumentProcessor
+from services.page_tiler import Band, PageTiler
+
+
+def item(name, amount):
+    return {"item_name": name, "item_amount": amount}
+
+
+def result(*items, total=0):
+    return {"page_type": "Bill Detail", "line_items": list(items), "actual_bill_total": total}
+
+
+def receipt(width=1200, height=7200, lines=150):
+    image = Image.new("RGB", (width, height), "white")
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=30)
+    for line in range(lines):
+        draw.text((60, 40 + line * (height - 80) // lines), f"Item {line} ........ 5.00", fill="black", font=font)
+    return image
+
+
+def test_same_item_tolerates_ocr_noise_but_not_other_amounts():
+    assert PageTiler.same_item(item("Paracetamol 500mg Tab", "₹20.00"), item("Paracetamol 500 mg Tab.", 20))
+    assert not PageTiler.same_item(item("Paracetamol 500mg Tab", 20), item("Paracetamol 500mg Tab", 40))
+    assert not PageTiler.same_item(item("Paracetamol", 20), item("Ceftriaxone", 20))
+
+
+def test_row_read_in_both_bands_is_kept_once():
+    bands = [Band(0, 1100), Band(1000, 2000, overlap_lines=2)]
+    merged, duplicates = PageTiler.merge(bands, [
+        result(item("Consultation", 500), item("ECG", 300)),
+        result(item("ECG", 300), item("X-Ray Chest", 450), total=1250),
+    ])
+
+    assert duplicates == 1
+    assert [entry["item_name"] for entry in merged["line_items"]] == ["Consultation", "ECG", "X-Ray Chest"]
+    assert merged["extracted_total"] == 1250
+    assert merged["actual_bill_total"] == 1250
+
+
+def test_genuinely_repeated_rows_outside_the_overlap_are_kept():
+    # The same charge billed on consecutive days, far from the cut
+    bands = [Band(0, 1100), Band(1000, 2000, overlap_lines=1)]
+    merged, duplicates = PageTiler.merge(bands, [
+        result(item("Room Rent", 1500), item("Room Rent", 1500), item("Nursing", 200)),
+        result(item("Room Rent", 1500), item("Room Rent", 1500)),
+    ])
+
+    assert duplicates == 0
+    assert len(merged["line_items"]) == 5
+
+
+def test_repeated_rows_in_the_overlap_only_drop_what_the_overlap_holds():
+    bands = [Band(0, 1100), Band(1000, 2000, overlap_lines=1)]
+    merged, duplicates = PageTiler.merge(bands, [
+        result(item("Room Rent", 1500), item("Room Rent", 1500)),
+        result(item("Room Rent", 1500), item("Room Rent", 1500)),
+    ])
+
+    assert duplicates == 1
+    assert len(merged["line_items"]) == 3
+
+
+def test_failed_band_is_reported_and_not_matched_against():
+    bands = [Band(0, 1100), Band(1000, 2000, overlap_lines=2), Band(1900, 3000, overlap_lines=2)]
+    merged, duplicates = PageTiler.merge(bands, [
+        result(item("A", 1)),
+        {"line_items": [], "error": "429"},
+        result(item("A", 1)),
+    ])
+
+    assert duplicates == 0
+    assert "band 2: 429" in merged["error"]
+    assert len(merged["line_items"]) == 2
+
+
+def test_ordinary_paper_is_not_split_by_aspect():
+    legal = receipt(850, 1400, lines=30)
+    assert PageTiler().plan(legal) == []
+
+
+def test_tall_page_bands_keep_more_width_than_the_whole_page():
+    page = receipt()
+    bands = PageTiler().plan(page)
+
+    assert len(bands) >= 3
+    assert bands[0].top == 0 and bands[-1].bottom == page.height
+    whole = DocumentProcessor.preprocess_image(page.copy(), (2048, 2048))
+    band = DocumentProcessor.preprocess_image(PageTiler.crop(page, bands[0]), (2048, 2048))
+    assert band.width > 2 * whole.width
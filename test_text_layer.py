@@ -0,0 +1,68 @@
+from services.text_layer import TextLayerExtractor
+
+
+def row(y, *cells):
+    """Words of one line: (x, text) cells, 6 pt per character, 10 pt tall"""
+    words = []
+    for x, text in cells:
+        for token in text.split():
+            words.append((x, y, x + 6 * len(token), y + 10, token))
+            x += 6 * len(token) + 4
+    return words
+
+
+def page(*lines):
+    return [word for line in lines for word in line]
+
+
+def names(ocr_data):
+    return [item["item_name"] for item in ocr_data["line_items"]]
+
+
+def test_header_names_keep_doses_and_sizes():
+    words = page(
+        row(100, (40, "S.No"), (80, "Description"), (300, "Qty"), (360, "Rate"), (430, "Amount")),
+        row(120, (40, "1"), (80, "Paracetamol 500 mg Tab"), (300, "10"), (360, "2.50"), (430, "25.00")),
+        row(140, (40, "2"), (80, "Inj. Ceftriaxone 1 g"), (300, "2"), (360, "85.00"), (430, "170.00")),
+        row(160, (40, "3"), (80, "Room Rent (2 days)"), (300, "2"), (360, "1500.00"), (430, "3000.00")),
+        row(190, (80, "Total"), (430, "3195.00")),
+    )
+    ocr_data = TextLayerExtractor.parse_page(words)
+
+    assert names(ocr_data) == ["Paracetamol 500 mg Tab", "Inj. Ceftriaxone 1 g", "Room Rent (2 days)"]
+    assert [(item["item_quantity"], item["item_rate"], item["item_amount"]) for item in ocr_data["line_items"]] == [
+        (10, 2.5, 25.0), (2, 85.0, 170.0), (2, 1500.0, 3000.0)
+    ]
+    assert ocr_data["actual_bill_total"] == 3195.0
+
+
+def test_headerless_names_end_at_trailing_figures():
+    words = page(
+        row(120, (80, "Paracetamol 500 mg Tab"), (300, "10"), (360, "2.50"), (430, "25.00")),
+        row(140, (80, "Inj. Ceftriaxone 1 g"), (300, "2"), (360, "85.00"), (430, "170.00")),
+        row(160, (80, "Syringe 5 ml"), (300, "4"), (360, "12.00"), (430, "48.00")),
+        row(190, (80, "Total"), (430, "243.00")),
+    )
+    ocr_data = TextLayerExtractor.parse_page(words)
+
+    assert names(ocr_data) == ["Paracetamol 500 mg Tab", "Inj. Ceftriaxone 1 g", "Syringe 5 ml"]
+    assert ocr_data["line_items"][2]["item_quantity"] == 4
+    assert ocr_data["line_items"][2]["item_rate"] == 12.0
+
+
+def test_items_named_like_summary_rows_are_kept():
+    lines = (
+        row(100, (80, "Description"), (300, "Qty"), (360, "Rate"), (430, "Amount")),
+        row(120, (80, "Total Bilirubin"), (300, "1"), (360, "350.00"), (430, "350.00")),
+        row(140, (80, "Total Cholesterol"), (300, "1"), (360, "400.00"), (430, "400.00")),
+        row(160, (80, "Balance Test"), (300, "1"), (360, "600.00"), (430, "600.00")),
+        row(180, (80, "Advance Life Support"), (300, "1"), (360, "2500.00"), (430, "2500.00")),
+        row(200, (80, "Less: Advance"), (430, "1000.00")),
+    )
+    ocr_data = TextLayerExtractor.parse_page(page(*lines, row(230, (80, "Total"), (430, "3850.00"))))
+
+    assert names(ocr_data) == ["Total Bilirubin", "Total Cholesterol", "Balance Test", "Advance Life Support"]
+    assert ocr_data["actual_bill_total"] == 3850.0
+
+    # A printed total the rows don't reconcile with sends the page to OCR
+    assert TextLayerExtractor.parse_page(page(*lines, row(230, (80, "Total"), (430, "4850.00")))) is None